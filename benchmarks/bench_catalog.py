@@ -0,0 +1,156 @@
+"""
+Rows/sec of the catalog compiler against the former groupby/iterrows path,
+on synthetic Shopify export CSVs.
+
+Usage: python -m benchmarks.bench_catalog [rows ...]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from services.catalog import CATALOG_COLUMNS, compile_catalog
+
+DEFAULT_ROWS = [10_000, 100_000]
+
+# like a Shopify export: 3 variant rows and 1 image-only row per product
+VARIANTS_PER_PRODUCT = 3
+ROWS_PER_PRODUCT = VARIANTS_PER_PRODUCT + 1
+
+
+def write_export_csv(path: str, rows: int):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=CATALOG_COLUMNS)
+        writer.writeheader()
+        for index in range(rows):
+            product, position = divmod(index, ROWS_PER_PRODUCT)
+            row = dict.fromkeys(CATALOG_COLUMNS, "")
+            row["Handle"] = f"product-{product}"
+            row["Image Src"] = f"https://cdn.example.com/{product}/{position}.jpg"
+            if position == 0:
+                row.update(
+                    {
+                        "Title": f"Product {product}",
+                        "Body (HTML)": f"<p>Description of product {product}</p>",
+                        "Vendor": "Vendor",
+                        "Type": "Type",
+                        "Tags": "summer, sale, new",
+                        "Option1 Name": "Size",
+                    }
+                )
+            if position < VARIANTS_PER_PRODUCT:
+                row.update(
+                    {
+                        "Option1 Value": ["S", "M", "L"][position],
+                        "Variant SKU": f"SKU-{product}-{position}",
+                        "Variant Price": "19.90",
+                        "Variant Requires Shipping": "true",
+                        "Variant Taxable": "true",
+                        "Variant Inventory Tracker": "shopify",
+                        "Variant Inventory Policy": "deny",
+                        "Variant Grams": "250",
+                    }
+                )
+            writer.writerow(row)
+
+
+def legacy_compile(csv_file_path: str) -> list[dict]:
+    """
+    The grouping and payload building `upload_products_from_csv` used before
+    the catalog compiler, kept here as the baseline.
+    """
+    df = pd.read_csv(csv_file_path).fillna(value="")
+    unique = lambda x: x.unique().tolist()  # NOQA: E731
+    grouped_df = (
+        df.groupby("Handle")
+        .aggregate(
+            {
+                "Title": "first",
+                "Body (HTML)": "first",
+                "Vendor": "first",
+                "Type": "first",
+                "Tags": list,
+                "Option1 Name": "first",
+                "Option1 Value": unique,
+                "Option2 Name": "first",
+                "Option2 Value": unique,
+                "Option3 Name": "first",
+                "Option3 Value": unique,
+                "Variant SKU": unique,
+                "Variant Price": list,
+                "Variant Requires Shipping": list,
+                "Variant Taxable": list,
+                "Variant Inventory Tracker": list,
+                "Variant Inventory Policy": list,
+                "Variant Grams": list,
+                "Image Src": list,
+                "Variant Image": list,
+            }
+        )
+        .reset_index()
+    )
+
+    products = []
+    for _, row in grouped_df.iterrows():
+        options = []
+        for i in range(1, 4):
+            option_name = row.get(f"Option{i} Name", "")
+            option_value = row.get(f"Option{i} Value", "")
+            if option_name and all(option_value):
+                options.append(
+                    {
+                        "name": option_name,
+                        "position": len(options) + 1,
+                        "values": [{"name": v} for v in option_value],
+                    }
+                )
+        products.append(
+            {
+                "product": {
+                    "title": row["Title"],
+                    "descriptionHtml": row["Body (HTML)"],
+                    "vendor": row["Vendor"],
+                    "productType": row["Type"],
+                    "tags": [tag.strip() for tag in row["Tags"] if tag.strip()],
+                    "productOptions": options,
+                },
+                "media": [
+                    {"originalSource": img, "mediaContentType": "IMAGE"}
+                    for img in [*row["Image Src"], *row["Variant Image"]]
+                    if img
+                ],
+            }
+        )
+
+    return products
+
+
+def measure(compile_function, csv_file_path: str) -> float:
+    started_at = time.perf_counter()
+    compile_function(csv_file_path)
+    return time.perf_counter() - started_at
+
+
+def main(rows_list: list[int]):
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in rows_list:
+            csv_file_path = os.path.join(folder, f"export_{rows}.csv")
+            write_export_csv(csv_file_path, rows)
+
+            for name, compile_function in [
+                ("legacy", legacy_compile),
+                ("compiler", compile_catalog),
+            ]:
+                elapsed = measure(compile_function, csv_file_path)
+                print(
+                    f"{rows:>8} rows  {name:<9} {elapsed:8.3f}s "
+                    f"{rows / elapsed:>12,.0f} rows/sec"
+                )
+
+
+if __name__ == "__main__":
+    main([int(rows) for rows in sys.argv[1:]] or DEFAULT_ROWS)
@@ -1,6 +1,8 @@
 import os
 
 from services.automation.core import automation_main
+from services.automation.driver_pool import close_driver_pool, get_driver_pool
+from services.automation.mailbox import close_mailbox_watcher, get_mailbox_watcher
 from services.trello.endpoints import (
     get_board_lists,
     get_card_description,
@@ -10,6 +12,17 @@ from services.trello.endpoints import (
 
 
 def main():
+    # browsers start and the mailbox connects while the cards are fetched
+    get_driver_pool().start()
+    get_mailbox_watcher()
+    try:
+        process_cards()
+    finally:
+        close_driver_pool()
+        close_mailbox_watcher()
+
+
+def process_cards():
     lists = get_board_lists(os.getenv("TRELLO_BOARD_ID"))
     new_items_list = next(
         filter(lambda x: "NOVA SOLICITAÇÃO" in x["name"], lists), None
@@ -33,6 +46,8 @@ def main():
             password=user_data.password,
             card_id=card["id"],
             trello_lists=lists,
+            store_name=user_data.store_name,
+            colors=user_data.colors,
         )
 
 
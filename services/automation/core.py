@@ -1,12 +1,14 @@
-import json
+import asyncio
+import os
 import pathlib
 import typing
 
 from dotenv import load_dotenv
-from httpx import Client
 from selenium.common import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
 
 from services.automation.auth import login
+from services.automation.driver_pool import get_driver_pool
 from services.automation.exceptions import (
     GoogleVinculationException,
     NonExistentAccountException,
@@ -20,23 +22,164 @@ from services.automation.utils import (
     download_theme_access,
     get_custom_app_api_key,
     get_theme_access_password_from_email,
-    initialize_driver,
 )
-from services.graphql.admin_api import graphql_request
-from services.s_collections import publish_collections, upload_collections
-from services.s_products import publish_products, upload_products_from_csv
-from services.s_theme import get_theme_id, upload_shopify_theme
+from services.automation.waits import report_step_timings, timed_step
+from services.catalog_cache import Catalog, load_catalog, stream_catalog
+from services.graphql.client import close_store_clients, get_store_client
+from services.product_pipeline import async_upload_and_publish_products
+from services.s_collections import (
+    async_assign_collection_products,
+    async_upload_collections,
+)
+from services.s_media import async_upload_media, attach_media, catalog_media_sources
+from services.s_publications import ONLINE_STORE_PUBLICATION, async_get_publication_id
+from services.s_sync import async_sync_collections, async_sync_products
+from services.s_theme import async_upload_shopify_theme, get_theme_id
+from services.theme_build import build_theme
+from services.theme_deploy import async_deploy_theme, async_write_theme_file
+from services.theme_settings import SETTINGS_DATA, render_settings_data
 from services.trello.endpoints import move_card_to_list
 
 load_dotenv()
 
 
+async def upload_catalog(
+    store_url: str,
+    access_token: str,
+    catalog: Catalog,
+    publication_name: str = ONLINE_STORE_PUBLICATION,
+) -> bool:
+    """
+    Uploads and publishes the collections and products of a country catalog.
+    All stages run on the same event loop, sharing the store's async client.
+    Unless CATALOG_SYNC is "false", only what the store is missing is created
+    (see `services.s_sync`), so re-runs do not duplicate the catalog.
+    Returns False when the store has no publication named `publication_name`.
+    """
+    sync = os.getenv("CATALOG_SYNC", "true").lower() == "true"
+    upload_collections = async_sync_collections if sync else async_upload_collections
+    upload_products = async_sync_products if sync else async_upload_and_publish_products
+
+    # === PUBLICATIONS ===
+    publication_id = await async_get_publication_id(
+        store_url, access_token, publication_name
+    )
+    if not publication_id:
+        print(f"{publication_name} publication not found.")
+        return False
+
+    # === COLLECTIONS ===
+    # each collection is published as soon as it is created
+    await upload_collections(
+        store_url=store_url,
+        access_token=access_token,
+        collections=catalog.collections,
+        publication_ids=[publication_id],
+    )
+
+    # === MEDIA ===
+    products = catalog.products
+    if not isinstance(products, list):
+        # a streamed catalog is uploaded as it is read, its images with it
+        print("Streamed catalog: images are attached from their sources.")
+    elif os.getenv("STAGED_MEDIA", "true").lower() == "true":
+        file_ids = await async_upload_media(
+            store_url,
+            access_token,
+            catalog_media_sources(products),
+            optimize=os.getenv("OPTIMIZE_IMAGES", "false").lower() == "true",
+        )
+        products = attach_media(products, file_ids)
+
+    # === PRODUCTS ===
+    # products are published while later ones are still being created
+    await upload_products(
+        store_url,
+        access_token,
+        products=products,
+        publication_ids=[publication_id],
+        mode=os.getenv("PRODUCT_UPLOAD_MODE", "create"),
+    )
+
+    # automated collections fill themselves, manual ones list handles
+    await async_assign_collection_products(store_url, access_token, catalog.collections)
+
+    return True
+
+
+async def upload_theme(
+    store_url: str,
+    access_token: str,
+    theme_id: str,
+    folder_path: pathlib.Path,
+    store_name: str | None = None,
+    colors: list[str] | None = None,
+) -> bool:
+    """
+    Deploys a theme with its settings_data.json rendered for the customer
+    (see `services.theme_settings`), so the settings are written once, by the
+    deploy, without reading them back from the store. Unless
+    NATIVE_THEME_DEPLOY is "false", only the changed files are uploaded (see
+    `services.theme_deploy`); otherwise the Shopify CLI pushes the theme and
+    the settings are written afterwards.
+    """
+    settings_data = render_settings_data(folder_path, store_name, colors)
+
+    if os.getenv("NATIVE_THEME_DEPLOY", "true").lower() == "true":
+        return await async_deploy_theme(
+            store_url,
+            access_token,
+            theme_id,
+            folder_path,
+            overrides={SETTINGS_DATA: settings_data} if settings_data else None,
+        )
+
+    uploaded = await async_upload_shopify_theme(
+        theme_id=theme_id,
+        folder_path=folder_path,
+        store_url=store_url,
+        password=access_token,
+    )
+    if uploaded and settings_data:
+        return await async_write_theme_file(
+            store_url, access_token, theme_id, SETTINGS_DATA, settings_data
+        )
+    return uploaded
+
+
+async def upload_store(
+    store_url: str,
+    access_token: str,
+    catalog: Catalog,
+    theme_id: str,
+    theme_folder: pathlib.Path,
+    store_name: str | None = None,
+    colors: list[str] | None = None,
+) -> tuple[bool, bool]:
+    """
+    Uploads the catalog and the personalized theme of a store concurrently.
+    Returns:
+        tuple[bool, bool]: Whether the catalog and the theme were uploaded.
+    """
+    try:
+        return await asyncio.gather(
+            upload_catalog(store_url, access_token, catalog),
+            upload_theme(
+                store_url, access_token, theme_id, theme_folder, store_name, colors
+            ),
+        )
+    finally:
+        await get_store_client(store_url, access_token).aclose()
+
+
 def automation_main(
     country: typing.Literal["es", "it"],
     username: str,
     password: str,
     card_id: str,
     trello_lists: typing.List,
+    store_name: str | None = None,
+    colors: typing.List[str] | None = None,
 ):
     if not country or country not in ["es", "it"]:
         raise ValueError("Country must be either 'es' (Spain) or 'it' (Italy).")
@@ -50,25 +193,67 @@ def automation_main(
         case "es":
             csv_file_path = assets_folder_path / "100_spanish_products.csv"
             theme_folder = assets_folder_path / "Tema_Espanha"
-            with open(assets_folder_path / "spanish_collections.json", "r") as file:
-                collections = json.load(file)
+            collections_file_path = assets_folder_path / "spanish_collections.json"
         case "it":
             csv_file_path = assets_folder_path / "italian_products.csv"
             theme_folder = assets_folder_path / "Tema_Italia"
-            with open(assets_folder_path / "italian_collections.json", "r") as file:
-                collections = json.load(file)
-
-    driver = initialize_driver()
-
+            collections_file_path = assets_folder_path / "italian_collections.json"
+
+    if os.getenv("CATALOG_STREAM", "false").lower() == "true":
+        # compiled chunk by chunk while the products are uploaded
+        catalog = stream_catalog(csv_file_path, collections_file_path)
+    else:
+        # compiled once per catalog version, later runs load it from the cache
+        catalog = load_catalog(csv_file_path, collections_file_path)
+    # built and validated once per theme version, every store deploys the build
+    if os.getenv("THEME_BUILD", "true").lower() == "true":
+        theme_folder = build_theme(theme_folder)
+
+    # a warm browser from the pool, logged out and given back afterwards
+    with get_driver_pool().driver() as driver:
+        try:
+            automate_store(
+                driver,
+                username=username,
+                password=password,
+                card_id=card_id,
+                trello_lists=trello_lists,
+                catalog=catalog,
+                theme_folder=theme_folder,
+                store_name=store_name,
+                colors=colors,
+            )
+        finally:
+            # every early exit of the card leaves the store's clients open
+            close_store_clients()
+            report_step_timings()
+
+
+def automate_store(
+    driver: WebDriver,
+    username: str,
+    password: str,
+    card_id: str,
+    trello_lists: typing.List,
+    catalog: Catalog,
+    theme_folder: pathlib.Path,
+    store_name: str | None = None,
+    colors: typing.List[str] | None = None,
+):
+    """
+    Sets up the store of a card in the browser, then uploads its catalog and
+    theme. The browser is given back to the pool and the store's HTTP clients
+    are closed by the caller, whatever the outcome.
+    """
     go_to_shopify_login_page(driver)
 
     try:
-        login(driver, username=username, password=password)
+        with timed_step("login", 15.0):
+            login(driver, username=username, password=password)
     except WebDriverException as e:
         # TODO : CHANGE TO LOGGER
         # TODO CHANGE CARD POSITION IN TRELLO
         print(f"Login failed: {e}")
-        driver.quit()
         return
     except NonExistentAccountException:
         print("The account does not exist. Needed to create a new account.")
@@ -82,7 +267,6 @@ def automation_main(
                 None,
             )["id"],
         )
-        driver.quit()
         return
     except GoogleVinculationException:
         print("Google account linkage is required. Cannot proceed with automation.")
@@ -96,7 +280,6 @@ def automation_main(
                 None,
             )["id"],
         )
-        driver.quit()
         return
     except TwoFactorAuthException:
         print("Two-factor authentication is required. Cannot proceed with automation.")
@@ -110,10 +293,10 @@ def automation_main(
                 None,
             )["id"],
         )
-        driver.quit()
         return
 
-    success, old_handler = download_theme_access(driver)
+    with timed_step("theme access app", 15.0):
+        success, old_handler = download_theme_access(driver)
 
     store_url = (
         f"{driver.current_url.replace('https://', '').split('/')[2]}.myshopify.com"
@@ -123,7 +306,6 @@ def automation_main(
         print(
             "Failed to download theme access. Please check your credentials and try again."
         )
-        driver.quit()
         return
 
     success = create_theme_access_password(driver)
@@ -132,7 +314,6 @@ def automation_main(
         print(
             "Failed to retrieve theme access password. Please check your credentials."
         )
-        driver.quit()
         return
 
     theme_access_password = get_theme_access_password_from_email(driver, store_url)
@@ -141,85 +322,48 @@ def automation_main(
         print(
             "Failed to retrieve theme access password from email. Please check your email settings."
         )
-        driver.quit()
         return
 
     driver.close()
     driver.switch_to.window(old_handler)
 
-    custom_app_api_key = get_custom_app_api_key(driver=driver)
+    with timed_step("custom app API key", 30.0):
+        custom_app_api_key = get_custom_app_api_key(driver=driver)
 
     if not custom_app_api_key:
         print(
             "Failed to retrieve the custom app API key. Please check your credentials."
         )
-        driver.quit()
         return
 
-    theme_id = get_theme_id(store_url, theme_access_password)
+    theme_id = get_theme_id(store_url, theme_access_password, custom_app_api_key)
 
     if not theme_id:
         print("Theme ID could not be retrieved. Exiting upload process.")
-        driver.quit()
         return
 
-    # === PUBLICATIONS ===
-    with Client() as client:
-        publications = graphql_request(
-            store_url=store_url,
-            access_token=custom_app_api_key,
-            query="{publications(first: 2) { edges { node { id name } } } }",
-            variables=None,
-            client=client,
+    # the theme is personalized and deployed while the catalog uploads
+    with timed_step("catalog and theme upload", 600.0):
+        catalog_uploaded, theme_uploaded = asyncio.run(
+            upload_store(
+                store_url=store_url,
+                access_token=custom_app_api_key,
+                catalog=catalog,
+                theme_id=theme_id,
+                theme_folder=theme_folder,
+                store_name=store_name,
+                colors=colors,
+            )
         )
 
-    for publication in publications["data"]["publications"]["edges"]:
-        print(publication)
-        if publication["node"]["name"] != "Online Store":
-            continue
-
-        online_store_publication_id = publication["node"]["id"]
-        break
-
-    if not online_store_publication_id:
+    if not catalog_uploaded:
         print("Online Store publication not found. Exiting upload process.")
-        driver.quit()
         return
 
-    # === COLLECTIONS ===
-    collections_id = upload_collections(
-        store_url=store_url,
-        access_token=custom_app_api_key,
-        collections=collections,
-    )
-
-    publish_collections(
-        store_url=store_url,
-        access_token=custom_app_api_key,
-        collection_ids=collections_id,
-        publication_id=online_store_publication_id,
-    )
-
-    # === PRODUCTS ===
-    products_id = upload_products_from_csv(
-        store_url,
-        custom_app_api_key,
-        csv_file_path=csv_file_path,
-    )
-
-    publish_products(
-        store_url=store_url,
-        access_token=custom_app_api_key,
-        product_ids=products_id,
-        publication_id=online_store_publication_id,
-    )
-
-    upload_shopify_theme(
-        theme_id=theme_id,
-        folder_path=theme_folder,
-        store_url=store_url,
-        password=custom_app_api_key,
-    )
+    if not theme_uploaded:
+        print("Failed to deploy the theme or its settings. Exiting upload process.")
+        return
 
-    # keep browser alive
-    input("Press Enter to close the browser...")
+    # keep the browser alive to inspect it, when it has a window
+    if not get_driver_pool().headless:
+        input("Press Enter to close the browser...")
@@ -0,0 +1,241 @@
+import concurrent.futures
+import contextlib
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+import psutil
+from dotenv import load_dotenv
+from selenium.common import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from services.automation.utils import initialize_driver
+from services.automation.waits import block_resources
+
+load_dotenv()
+
+# browsers kept launched and waiting for a card
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "1"))
+# cards handled by a browser before it is replaced
+DRIVER_MAX_USES = int(os.getenv("DRIVER_MAX_USES", "10"))
+# resident memory of a browser, in MB, past which it is replaced
+DRIVER_MAX_MEMORY_MB = int(os.getenv("DRIVER_MAX_MEMORY_MB", "1500"))
+DRIVER_HEADLESS = os.getenv("DRIVER_HEADLESS", "true").lower() == "true"
+# seconds to wait for a browser to launch
+DRIVER_LAUNCH_TIMEOUT = 120.0
+
+# origins whose storage is cleared between two cards
+SHOPIFY_ORIGINS = [
+    "https://accounts.shopify.com",
+    "https://admin.shopify.com",
+    "https://apps.shopify.com",
+]
+
+
+def browser_memory_mb(driver: WebDriver) -> float:
+    """
+    Resident memory of every Chrome process of a driver, in MB.
+    """
+    try:
+        service = psutil.Process(driver.service.process.pid)
+        processes = service.children(recursive=True)
+        return sum(process.memory_info().rss for process in processes) / 2**20
+    except (psutil.Error, AttributeError):
+        return 0.0
+
+
+class DriverPool:
+    """
+    Chrome instances launched ahead of the cards that need them.
+
+    Each browser runs headless (unless DRIVER_HEADLESS is "false") in its own
+    temporary profile, with images blocked and the fonts, media and trackers
+    of BLOCKED_URL_PATTERNS blocked in each tab (see `block_resources`). A
+    released browser is logged out and reused; after DRIVER_MAX_USES cards,
+    past DRIVER_MAX_MEMORY_MB or when it crashed, it is quit, its profile
+    deleted and a new one launched in the background.
+    """
+
+    def __init__(
+        self,
+        size: int = DRIVER_POOL_SIZE,
+        max_uses: int = DRIVER_MAX_USES,
+        max_memory_mb: int = DRIVER_MAX_MEMORY_MB,
+        headless: bool = DRIVER_HEADLESS,
+    ):
+        self.size = max(size, 1)
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.headless = headless
+
+        # launched browsers, or the error that prevented a launch
+        self._idle: queue.Queue[WebDriver | Exception] = queue.Queue()
+        self._executor = concurrent.futures.ThreadPoolExecutor(self.size)
+        self._uses: dict[WebDriver, int] = {}
+        self._profiles: dict[WebDriver, str] = {}
+        self._launched = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Launch browsers in the background until the pool is full.
+        """
+        if self._closed:
+            return
+        with self._lock:
+            missing = self.size - self._launched
+            self._launched += missing
+        for _ in range(missing):
+            self._executor.submit(self._launch)
+
+    def _launch(self):
+        profile_dir = tempfile.mkdtemp(prefix="chrome-profile-")
+        try:
+            driver = initialize_driver(
+                headless=self.headless,
+                profile_dir=profile_dir,
+                block_images=True,
+                network_log=True,
+            )
+            block_resources(driver)
+        except Exception as e:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            with self._lock:
+                self._launched -= 1
+            self._idle.put(e)
+            return
+
+        with self._lock:
+            self._uses[driver] = 0
+            self._profiles[driver] = profile_dir
+        self._idle.put(driver)
+
+    def acquire(self) -> WebDriver:
+        """
+        Take a browser from the pool, waiting for one to be launched if needed.
+        :return: Selenium WebDriver instance
+        """
+        if self._closed:
+            raise RuntimeError("The driver pool is closed.")
+
+        self.start()
+        driver = self._idle.get(timeout=DRIVER_LAUNCH_TIMEOUT)
+        if isinstance(driver, Exception):
+            raise driver
+        return driver
+
+    def release(self, driver: WebDriver):
+        """
+        Give a browser back to the pool, which resets or replaces it.
+        :param driver: Selenium WebDriver instance taken with `acquire`
+        """
+        with self._lock:
+            self._uses[driver] += 1
+            worn_out = self._uses[driver] >= self.max_uses
+
+        if (
+            not self._closed
+            and not worn_out
+            and browser_memory_mb(driver) < self.max_memory_mb
+            and self._reset(driver)
+        ):
+            self._idle.put(driver)
+            return
+
+        self._retire(driver)
+        if not self._closed:
+            self.start()
+
+    @contextlib.contextmanager
+    def driver(self):
+        """
+        Borrow a browser for the duration of a `with` block.
+        """
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def _reset(self, driver: WebDriver) -> bool:
+        """
+        Close every tab but one and clear the session of the last card.
+        :return: False if the browser is unusable
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.get("about:blank")
+
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            for origin in SHOPIFY_ORIGINS:
+                driver.execute_cdp_cmd(
+                    "Storage.clearDataForOrigin",
+                    {"origin": origin, "storageTypes": "all"},
+                )
+            block_resources(driver)
+            # drop the network events the last card left unread
+            driver.get_log("performance")
+        except WebDriverException:
+            return False
+        return True
+
+    def _retire(self, driver: WebDriver):
+        with self._lock:
+            self._uses.pop(driver, None)
+            profile_dir = self._profiles.pop(driver, None)
+            self._launched -= 1
+
+        with contextlib.suppress(WebDriverException):
+            driver.quit()
+        if profile_dir:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+    def close(self):
+        """
+        Quit every idle browser. Browsers still in use are quit on release.
+        """
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if not isinstance(driver, Exception):
+                self._retire(driver)
+
+
+_driver_pool: DriverPool | None = None
+_driver_pool_lock = threading.Lock()
+
+
+def get_driver_pool() -> DriverPool:
+    """
+    Returns the process-wide driver pool, creating it on first use.
+    """
+    global _driver_pool
+
+    with _driver_pool_lock:
+        if _driver_pool is None or _driver_pool._closed:
+            _driver_pool = DriverPool()
+        return _driver_pool
+
+
+def close_driver_pool():
+    """
+    Quits the browsers of the process-wide driver pool and forgets it.
+    """
+    global _driver_pool
+
+    with _driver_pool_lock:
+        driver_pool, _driver_pool = _driver_pool, None
+
+    if driver_pool is not None:
+        driver_pool.close()
@@ -0,0 +1,379 @@
+import base64
+import email
+import email.policy
+import html
+import imaplib
+import itertools
+import quopri
+import re
+import select
+import socket
+import ssl
+import threading
+import time
+
+from services.automation.auth import conn_gmail_imap
+
+# seconds of history searched for emails that arrived before their store waited
+EMAIL_LOOKBACK = 600.0
+# servers drop IDLE after 30 minutes, it is restarted well before
+IDLE_TIMEOUT = 300.0
+# seconds between two connection attempts
+RECONNECT_DELAY = 5.0
+
+LINK_TAG_RE = re.compile(
+    r'<a\s[^>]*?href="([^"]+)"[^>]*>(?:(?!</a>).)*?Get password', re.DOTALL
+)
+UID_RE = re.compile(rb"UID (\d+)")
+
+
+class _Waiter:
+    def __init__(self, key: str, since: float):
+        self.key = key
+        self.since = since
+        self.link: str | None = None
+        self.event = threading.Event()
+
+
+def _join_response(data: list) -> bytes:
+    """
+    Rebuild a raw FETCH response from imaplib's items, literals included.
+    """
+    return b"".join(
+        item[0] + b"\r\n" + item[1] if isinstance(item, tuple) else item
+        for item in data
+        if item is not None
+    )
+
+
+def _parse_list(data: bytes, position: int = 0) -> tuple[list, int]:
+    """
+    Parse the parenthesized list starting at `position`, e.g. a BODYSTRUCTURE.
+    """
+    items = []
+    position += 1
+    while position < len(data):
+        char = data[position : position + 1]
+        if char == b")":
+            return items, position + 1
+        if char == b"(":
+            item, position = _parse_list(data, position)
+            items.append(item)
+        elif char == b'"':
+            end = position + 1
+            while data[end : end + 1] != b'"':
+                end += 2 if data[end : end + 1] == b"\\" else 1
+            items.append(data[position + 1 : end].replace(b'\\"', b'"').decode())
+            position = end + 1
+        elif char == b"{":
+            end = data.index(b"}", position)
+            size = int(data[position + 1 : end])
+            start = end + 3  # "}\r\n"
+            items.append(data[start : start + size].decode(errors="replace"))
+            position = start + size
+        elif char.isspace():
+            position += 1
+        else:
+            end = position
+            while end < len(data) and data[end : end + 1] not in b" ()":
+                end += 1
+            atom = data[position:end].decode()
+            items.append(None if atom.upper() == "NIL" else atom)
+            position = end
+    return items, position
+
+
+def find_text_part(
+    structure: list, section: str = ""
+) -> tuple[str, str, str, str] | None:
+    """
+    Find the HTML part of a message, or its plain text part, in its BODYSTRUCTURE.
+    :return: Section, transfer encoding, charset and subtype of the part
+    """
+    if structure and isinstance(structure[0], list):
+        # the parts come first, then the multipart subtype and parameters
+        parts = list(
+            itertools.takewhile(lambda part: isinstance(part, list), structure)
+        )
+        found = [
+            find_text_part(part, f"{section}.{index}" if section else str(index))
+            for index, part in enumerate(parts, start=1)
+        ]
+        found = [part for part in found if part]
+        html_parts = [part for part in found if part[3] == "html"]
+        return (html_parts or found or [None])[0]
+
+    if str(structure[0]).lower() != "text":
+        return None
+    params = structure[2] or []
+    charsets = [
+        value
+        for name, value in zip(params[::2], params[1::2])
+        if name.lower() == "charset"
+    ]
+    return (
+        section or "1",
+        (structure[5] or "7bit").lower(),
+        charsets[0] if charsets else "utf-8",
+        str(structure[1]).lower(),
+    )
+
+
+def decode_part(content: bytes, encoding: str, charset: str) -> str:
+    if encoding == "quoted-printable":
+        content = quopri.decodestring(content)
+    elif encoding == "base64":
+        content = base64.b64decode(content)
+    try:
+        return content.decode(charset, errors="replace")
+    except LookupError:
+        return content.decode("utf-8", errors="replace")
+
+
+def _has_buffered_data(imap: imaplib.IMAP4) -> bool:
+    """
+    Whether a response is waiting in imaplib's buffered file, or decrypted in
+    the TLS layer, where `select` on the socket cannot see it.
+    """
+    timeout = imap.sock.gettimeout()
+    imap.sock.setblocking(False)
+    try:
+        # returns the buffer as is, or makes one read that cannot block
+        return bool(imap.file.peek())
+    except (ssl.SSLWantReadError, BlockingIOError):
+        return False
+    finally:
+        imap.sock.settimeout(timeout)
+
+
+class MailboxWatcher(threading.Thread):
+    """
+    One IMAP connection shared by every store waiting for an email.
+
+    The watcher idles on the inbox (IMAP IDLE) and is woken up by the server
+    as soon as a message arrives. Only the messages after the last UID seen
+    are searched, their subject is read, and for the subjects a store waits
+    for, only the HTML (or text) part is fetched and decoded, without marking
+    the message as read.
+    """
+
+    def __init__(self):
+        super().__init__(name="mailbox-watcher", daemon=True)
+        self._imap: imaplib.IMAP4_SSL | None = None
+        self._last_uid = 0
+        # (uid, subject, internal date) of the recent messages
+        self._recent: list[tuple[bytes, str, float]] = []
+        self._waiters: list[_Waiter] = []
+        # recent messages about a store that carry no link
+        self._without_link: set[bytes] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._tag = 0
+        # written to interrupt IDLE when a store starts waiting
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+
+    def wait_for_link(
+        self, key: str, timeout: float, since: float | None = None
+    ) -> str | None:
+        """
+        Wait for the theme access link of an email whose subject contains `key`.
+        :param key: Text of the subject, e.g. the store URL
+        :param timeout: Seconds to wait at most
+        :param since: Ignore the emails received before, EMAIL_LOOKBACK ago by default
+        :return: The link, None if no email came in time
+        """
+        waiter = _Waiter(key, since or time.time() - EMAIL_LOOKBACK)
+        with self._lock:
+            self._waiters.append(waiter)
+        self._wakeup()
+
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return waiter.link
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup()
+
+    def _wakeup(self):
+        self._wakeup_writer.send(b"\0")
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self._connect()
+                while not self._stopped.is_set():
+                    self._fetch_new_messages()
+                    self._dispatch()
+                    self._idle()
+            except (imaplib.IMAP4.error, OSError) as e:
+                print(f"Mailbox connection lost: {e}")
+                self._stopped.wait(RECONNECT_DELAY)
+            finally:
+                self._disconnect()
+
+    def _connect(self):
+        self._imap = conn_gmail_imap()
+        if self._imap is None:
+            raise imaplib.IMAP4.error("Failed to connect to the mailbox.")
+
+        if not self._last_uid:
+            # the last messages may already be what a store is about to wait for
+            since = time.strftime(
+                "%d-%b-%Y", time.gmtime(time.time() - EMAIL_LOOKBACK - 86400)
+            )
+            status, data = self._imap.uid("SEARCH", None, "SINCE", since)
+            uids = data[0].split() if status == "OK" else []
+            self._read_headers(uids)
+
+    def _disconnect(self):
+        imap, self._imap = self._imap, None
+        if imap is not None:
+            try:
+                imap.logout()
+            except (imaplib.IMAP4.error, OSError):
+                pass
+
+    def _fetch_new_messages(self):
+        status, data = self._imap.uid("SEARCH", None, "UID", f"{self._last_uid + 1}:*")
+        if status != "OK":
+            return
+        # "n:*" always matches the last message, even when it is older than n
+        uids = [uid for uid in data[0].split() if int(uid) > self._last_uid]
+        self._read_headers(uids)
+
+    def _read_headers(self, uids: list[bytes]):
+        if not uids:
+            return
+
+        status, data = self._imap.uid(
+            "FETCH",
+            b",".join(uids),
+            "(UID INTERNALDATE BODY.PEEK[HEADER.FIELDS (SUBJECT)])",
+        )
+        if status != "OK":
+            return
+
+        horizon = time.time() - EMAIL_LOOKBACK
+        for item in data:
+            if not isinstance(item, tuple) or not (match := UID_RE.search(item[0])):
+                continue
+            internal_date = imaplib.Internaldate2tuple(item[0])
+            received_at = time.mktime(internal_date) if internal_date else time.time()
+            message = email.message_from_bytes(item[1], policy=email.policy.default)
+            self._recent.append((match.group(1), str(message["subject"]), received_at))
+            self._last_uid = max(self._last_uid, int(match.group(1)))
+
+        self._recent = [entry for entry in self._recent if entry[2] >= horizon]
+        self._without_link &= {uid for uid, _, _ in self._recent}
+
+    def _dispatch(self):
+        with self._lock:
+            waiters = list(self._waiters)
+
+        for waiter in waiters:
+            matches = [
+                uid
+                for uid, subject, received_at in self._recent
+                if waiter.key in subject
+                and received_at >= waiter.since
+                and uid not in self._without_link
+            ]
+            # the latest email about the store that carries a link
+            link = None
+            for uid in reversed(matches):
+                if link := self._read_link(uid):
+                    break
+                self._without_link.add(uid)
+
+            if link:
+                waiter.link = link
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                waiter.event.set()
+
+    def _read_link(self, uid: bytes) -> str | None:
+        status, data = self._imap.uid("FETCH", uid, "(BODYSTRUCTURE)")
+        if status != "OK" or not data or data[0] is None:
+            return None
+        response = _join_response(data)
+        start = response.index(b"BODYSTRUCTURE") + len(b"BODYSTRUCTURE ")
+        part = find_text_part(_parse_list(response, start)[0])
+        if part is None:
+            return None
+
+        section, encoding, charset, _ = part
+        status, data = self._imap.uid("FETCH", uid, f"(BODY.PEEK[{section}])")
+        if status != "OK" or not isinstance(data[0], tuple):
+            return None
+
+        match = LINK_TAG_RE.search(decode_part(data[0][1], encoding, charset))
+        return html.unescape(match.group(1)) if match else None
+
+    def _idle(self):
+        """
+        Wait in IDLE until a message arrives, a store starts waiting, or IDLE_TIMEOUT.
+        """
+        imap = self._imap
+        self._tag += 1
+        tag = f"IDLE{self._tag}".encode()
+        imap.send(tag + b" IDLE\r\n")
+        if not imap.readline().startswith(b"+"):
+            raise imaplib.IMAP4.error("The server refused IDLE.")
+
+        deadline = time.monotonic() + IDLE_TIMEOUT
+        while (remaining := deadline - time.monotonic()) > 0:
+            # lines already read from the socket never make it readable again
+            if not _has_buffered_data(imap):
+                readable, _, _ = select.select(
+                    [imap.sock, self._wakeup_reader], [], [], remaining
+                )
+                if self._wakeup_reader in readable:
+                    self._wakeup_reader.recv(1024)
+                    break
+                if imap.sock not in readable:
+                    continue
+            line = imap.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed during IDLE.")
+            if b"EXISTS" in line:
+                break
+
+        imap.send(b"DONE\r\n")
+        while not (line := imap.readline()).startswith(tag):
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed during IDLE.")
+
+
+_mailbox_watcher: MailboxWatcher | None = None
+_mailbox_watcher_lock = threading.Lock()
+
+
+def get_mailbox_watcher() -> MailboxWatcher:
+    """
+    Returns the process-wide mailbox watcher, starting it on first use.
+    """
+    global _mailbox_watcher
+
+    with _mailbox_watcher_lock:
+        if _mailbox_watcher is None:
+            _mailbox_watcher = MailboxWatcher()
+            _mailbox_watcher.start()
+        return _mailbox_watcher
+
+
+def close_mailbox_watcher():
+    """
+    Stops the process-wide mailbox watcher and closes its connection.
+    """
+    global _mailbox_watcher
+
+    with _mailbox_watcher_lock:
+        mailbox_watcher, _mailbox_watcher = _mailbox_watcher, None
+
+    if mailbox_watcher is not None:
+        mailbox_watcher.stop()
+        mailbox_watcher.join()
@@ -1,5 +1,16 @@
 from selenium.webdriver.remote.webdriver import WebDriver
 
+from services.automation.waits import block_resources
+
+
+def switch_to_new_tab(driver: WebDriver):
+    """
+    Switch to the last opened tab and block its unneeded requests.
+    :param driver: Selenium WebDriver instance
+    """
+    driver.switch_to.window(driver.window_handles[-1])
+    block_resources(driver)
+
 
 def go_to_shopify_login_page(driver):
     driver.get("https://admin.shopify.com/login?errorHint=no_cookie_auth_token")
@@ -32,6 +43,6 @@ def open_theme_access_download_page(driver: WebDriver) -> str:
         "window.open('https://apps.shopify.com/theme-access', '_blank');"
     )
 
-    driver.switch_to.window(driver.window_handles[-1])
+    switch_to_new_tab(driver)
 
     return handler
@@ -1,8 +1,4 @@
-import contextlib
-import imaplib
 import os
-import re
-import time
 
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
@@ -15,14 +11,52 @@ from selenium.webdriver.support.ui import Select, WebDriverWait
 from services.automation.navigation import (
     open_create_app_page,
     open_theme_access_download_page,
+    switch_to_new_tab,
 )
-
-LINK_TAG_RE = re.compile(r'<a href=3D"([^"]+)"[^>]*>.*Get password.*</a>', re.DOTALL)
-
-
-def initialize_driver():
+from services.automation.waits import settle_network, timed_step
+
+# seconds to wait for the theme access email, and expected to
+EMAIL_TIMEOUT = 60.0
+EMAIL_BUDGET = 15.0
+# seconds to wait for a page to settle, and expected to
+STEP_TIMEOUT = 30.0
+STEP_BUDGET = 5.0
+SHORT_STEP_BUDGET = 1.0
+
+
+def initialize_driver(
+    headless: bool = False,
+    profile_dir: str | None = None,
+    block_images: bool = False,
+    network_log: bool = False,
+) -> WebDriver:
+    """
+    Start a Chrome instance.
+    :param headless: Whether to run Chrome without a window
+    :param profile_dir: Profile directory of the instance, a temporary one by default
+    :param block_images: Whether to skip loading images in every tab
+    :param network_log: Whether to record the CDP network events, see `wait_for_network_idle`
+    :return: Selenium WebDriver instance
+    """
     options = webdriver.ChromeOptions()
     options.add_argument("--no-sandbox")
+    if headless:
+        options.add_argument("--headless=new")
+        # headless windows are small, the admin would switch to its mobile layout
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-dev-shm-usage")
+    if profile_dir:
+        options.add_argument(f"--user-data-dir={profile_dir}")
+    if block_images:
+        options.add_experimental_option(
+            "prefs", {"profile.managed_default_content_settings.images": 2}
+        )
+    if network_log:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        options.add_experimental_option(
+            "perfLoggingPrefs", {"enableNetwork": True, "enablePage": False}
+        )
     driver = webdriver.Chrome(options=options)
     return driver
 
@@ -76,10 +110,10 @@ def download_theme_access(driver: WebDriver) -> tuple[bool, str]:
 
     # if downloaded, just go to the new tab
     if install_btn.text.strip().lower() in ["open", "abrir"]:
-        driver.switch_to.window(driver.window_handles[-1])
+        switch_to_new_tab(driver)
         return True, old_handler
 
-    driver.switch_to.window(driver.window_handles[-1])
+    switch_to_new_tab(driver)
 
     # click to install
     WebDriverWait(driver, 15).until(
@@ -152,76 +186,42 @@ def get_theme_access_password_from_email(driver: WebDriver, store_url: str) -> s
     :return: Theme access password as a string
     """
 
-    from services.automation.auth import conn_gmail_imap
-
-    # wait for the email to arrive
-    time.sleep(15)
+    from services.automation.mailbox import get_mailbox_watcher
 
-    mailbox = conn_gmail_imap()
+    # the shared watcher hands over the link as soon as the email arrives
+    with timed_step("theme access email", EMAIL_BUDGET):
+        href_link = get_mailbox_watcher().wait_for_link(store_url, EMAIL_TIMEOUT)
 
-    if not mailbox:
-        print("Failed to connect to the mailbox.")
+    if not href_link:
+        print("No theme access link found in the email.")
         return ""
 
-    with contextlib.closing(mailbox) as imap:
-        try:
-            # Search for the email with the theme access password
-            status, messages = imap.search(
-                None,
-                f'SUBJECT "{store_url}"',
-            )
-
-            if status != "OK":
-                print("No messages found.")
-                return ""
-
-            latest_email_id = messages[0].split()[-1]
+    driver.execute_script("window.open(arguments[0], '_blank');", href_link)
 
-            # Fetch email body
-            status, msg_data = imap.fetch(latest_email_id, "(RFC822)")
-            if status != "OK":
-                print("Failed to fetch email.")
-                return ""
+    # Wait for the new tab to open and switch to it
+    WebDriverWait(driver, 10).until(lambda d: len(d.window_handles) > 1)
 
-            email_body = msg_data[0][1].decode("utf-8")
-            href_link = LINK_TAG_RE.search(email_body).group(1)
+    switch_to_new_tab(driver)
 
-            if not href_link:
-                print("No theme access link found in the email.")
-                return ""
-
-            # replace line breaks
-            href_link = href_link.replace("\n", "").replace("=\r", "")
-
-            driver.execute_script(f"window.open('{href_link}', '_blank');")
-
-            # Wait for the new tab to open and switch to it
-            WebDriverWait(driver, 10).until(lambda d: len(d.window_handles) > 1)
-
-            driver.switch_to.window(driver.window_handles[-1])
+    WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located(
+            (
+                By.XPATH,
+                "//div[@class='Polaris-LegacyStack__Item_yiyol']//button[@type='button']",
+            )
+        )
+    ).click()
 
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//div[@class='Polaris-LegacyStack__Item_yiyol']//button[@type='button']",
-                    )
-                )
-            ).click()
-
-            # Get the theme access token from the page
-            token_element = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//div[contains(@class, 'Polaris-TextField_1spwi')]//input",
-                    )
-                )
+    # Get the theme access token from the page
+    token_element = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located(
+            (
+                By.XPATH,
+                "//div[contains(@class, 'Polaris-TextField_1spwi')]//input",
             )
-            return token_element.get_attribute("value")
-        except imaplib.IMAP4.error as e:
-            print(f"IMAP error: {e}")
-            return ""
+        )
+    )
+    return token_element.get_attribute("value")
 
 
 def enable_custom_dev_mode(driver: WebDriver) -> bool:
@@ -367,12 +367,9 @@ def get_custom_app_api_key(driver: WebDriver) -> str:
     :return: Custom app API key as a string
     """
 
-    SLEEP_TIME = 5
-    SHORT_SLEEP_TIME = 1
-
     old_handler = open_create_app_page(driver)
 
-    driver.switch_to.window(driver.window_handles[-1])
+    switch_to_new_tab(driver)
 
     try:
         enable_custom_dev_mode(driver)
@@ -398,9 +395,9 @@ def get_custom_app_api_key(driver: WebDriver) -> str:
 
     cred_url = "/".join([*driver.current_url.split("/")[:-2], "api_credentials"])
 
-    # wait to ensure the page will be correctly loaded when redirect
-    # (button to install will appear)
-    time.sleep(SLEEP_TIME)
+    # the install button only appears once the permissions are saved
+    with timed_step("app permissions saved", STEP_BUDGET) as notes:
+        settle_network(driver, STEP_BUDGET, notes)
     driver.get(cred_url)
 
     # click to install app
@@ -429,17 +426,23 @@ def get_custom_app_api_key(driver: WebDriver) -> str:
         )
     ).click()
 
-    # wait app installation
-    time.sleep(SLEEP_TIME)
-
     api_key_section_xpath = (
         "//div[@class='Polaris-Layout']//div[@class='Polaris-LegacyStack__Item']"
         "//div[@class='Polaris-Connected']"
     )
 
+    # wait app installation: the modal closes and the installation requests end
+    with timed_step("app installed", STEP_BUDGET) as notes:
+        WebDriverWait(driver, STEP_TIMEOUT).until(
+            EC.invisibility_of_element_located(
+                (By.XPATH, "//div[@class='Polaris-Modal-Dialog__Modal']")
+            )
+        )
+        settle_network(driver, STEP_BUDGET, notes)
+
     # reveal API key
-    WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located(
+    WebDriverWait(driver, STEP_TIMEOUT).until(
+        EC.element_to_be_clickable(
             (
                 By.XPATH,
                 f"{api_key_section_xpath}//button[contains(@class, 'Polaris-Button') and @type='button']",
@@ -447,21 +450,22 @@ def get_custom_app_api_key(driver: WebDriver) -> str:
         )
     ).click()
 
-    time.sleep(SHORT_SLEEP_TIME)
-
-    # get the API key
-    api_key = (
-        WebDriverWait(driver, 10)
-        .until(
-            EC.presence_of_element_located(
-                (
-                    By.XPATH,
-                    f"{api_key_section_xpath}//input[contains(@class, 'Polaris-TextField__Input')]",
-                )
+    # get the API key, once the revealed value is filled in
+    api_key_input = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located(
+            (
+                By.XPATH,
+                f"{api_key_section_xpath}//input[contains(@class, 'Polaris-TextField__Input')]",
             )
         )
-        .get_attribute("value")
     )
+    with timed_step("API key revealed", SHORT_STEP_BUDGET):
+        try:
+            api_key = WebDriverWait(driver, 10).until(
+                lambda _: api_key_input.get_attribute("value")
+            )
+        except TimeoutException:
+            api_key = ""
 
     if not api_key:
         print("Failed to retrieve the API key.")
@@ -0,0 +1,195 @@
+import contextlib
+import json
+import os
+import time
+
+from selenium.common import WebDriverException
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+# seconds without network or DOM activity after which a page is settled
+NETWORK_IDLE_TIME = float(os.getenv("NETWORK_IDLE_TIME", "0.5"))
+DOM_QUIET_TIME = float(os.getenv("DOM_QUIET_TIME", "0.3"))
+# requests allowed to stay open on an idle page, e.g. long polling
+NETWORK_IDLE_MAX_INFLIGHT = 2
+POLL_INTERVAL = 0.1
+
+# requests the automation never needs: images, fonts, media and trackers.
+# Fonts and media are matched by their extension, see `block_resources`
+BLOCKED_URL_PATTERNS = [
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.webp",
+    "*.avif",
+    "*.ico",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.mp4",
+    "*.webm",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*connect.facebook.net*",
+    "*hotjar.com*",
+    "*monorail-edge.shopifysvc.com*",
+    *filter(None, os.getenv("DRIVER_BLOCKED_URLS", "").split(",")),
+]
+
+# resolves once the DOM did not change for arguments[0] ms, or after arguments[1] ms
+DOM_QUIET_SCRIPT = """
+const [quiet, timeout, done] = [arguments[0], arguments[1], arguments[arguments.length - 1]];
+let timer = setTimeout(() => finish(true), quiet);
+const deadline = setTimeout(() => finish(false), timeout);
+const observer = new MutationObserver(() => {
+    clearTimeout(timer);
+    timer = setTimeout(() => finish(true), quiet);
+});
+function finish(quieted) {
+    observer.disconnect();
+    clearTimeout(timer);
+    clearTimeout(deadline);
+    done(quieted);
+}
+observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+"""
+
+# (step, seconds, budget, notes) of the steps timed since the last report
+step_timings: list[tuple[str, float, float, list[str]]] = []
+
+
+@contextlib.contextmanager
+def timed_step(name: str, budget: float):
+    """
+    Time a step of the browser flow and report it when it exceeds its budget.
+    :param name: Name of the step in the reports
+    :param budget: Seconds the step is expected to take
+    :return: A list of notes reported with the step, e.g. waits that gave up
+    """
+    started_at = time.monotonic()
+    notes = []
+    try:
+        yield notes
+    finally:
+        elapsed = time.monotonic() - started_at
+        step_timings.append((name, elapsed, budget, notes))
+        if elapsed > budget:
+            print(
+                f"Slow step '{name}': {elapsed:.1f}s (budget {budget:.1f}s)."
+                + "".join(f" {note}" for note in notes)
+            )
+
+
+def report_step_timings():
+    """
+    Print the time taken by each step timed since the last report.
+    """
+    for name, elapsed, budget, notes in step_timings:
+        flag = " SLOW" if elapsed > budget else ""
+        details = "".join(f" - {note}" for note in notes)
+        print(f"{name}: {elapsed:.1f}s / {budget:.1f}s{flag}{details}")
+    step_timings.clear()
+
+
+def block_resources(driver: WebDriver):
+    """
+    Block the requests of BLOCKED_URL_PATTERNS in the current tab.
+
+    `Network.setBlockedURLs` matches URL patterns, not resource types, and only
+    applies to the tab it is sent to: call it again in every new tab, see
+    `switch_to_new_tab`. Images are also blocked browser-wide by
+    `initialize_driver(block_images=True)`. `Fetch.enable` could match resource
+    types, but it pauses each request until a `Fetch.requestPaused` listener
+    answers it, and `execute_cdp_cmd` cannot listen to CDP events.
+    :param driver: Selenium WebDriver instance
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
+
+def wait_for_dom_quiet(
+    driver: WebDriver, quiet: float = DOM_QUIET_TIME, timeout: float = 10
+) -> bool:
+    """
+    Wait until the current document stops changing, observed with a MutationObserver.
+    :param driver: Selenium WebDriver instance
+    :param quiet: Seconds without mutations for the DOM to count as settled
+    :param timeout: Seconds to wait at most, within the driver's script timeout
+    :return: True if the DOM settled, False on timeout
+    """
+    return bool(
+        driver.execute_async_script(
+            DOM_QUIET_SCRIPT, int(quiet * 1000), int(timeout * 1000)
+        )
+    )
+
+
+def wait_for_network_idle(
+    driver: WebDriver, idle_time: float = NETWORK_IDLE_TIME, timeout: float = 10
+):
+    """
+    Wait until the browser has had at most NETWORK_IDLE_MAX_INFLIGHT requests
+    in flight for `idle_time` seconds, following the CDP network events of
+    the performance log. Falls back to waiting for the DOM to settle when the
+    driver has no performance log.
+    :param driver: Selenium WebDriver instance
+    :param idle_time: Seconds of network quiet
+    :param timeout: Seconds to wait at most
+    :raises TimeoutException: When the network is still busy after `timeout`
+    """
+    deadline = time.monotonic() + timeout
+    last_activity = time.monotonic()
+    inflight = set()
+
+    while True:
+        try:
+            entries = driver.get_log("performance")
+        except WebDriverException:
+            wait_for_dom_quiet(driver, timeout=timeout)
+            return
+
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            method = message["method"]
+            if method == "Network.requestWillBeSent":
+                inflight.add(message["params"]["requestId"])
+            elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+                inflight.discard(message["params"]["requestId"])
+            else:
+                continue
+            last_activity = time.monotonic()
+
+        now = time.monotonic()
+        if len(inflight) <= NETWORK_IDLE_MAX_INFLIGHT and (
+            now - last_activity >= idle_time
+        ):
+            return
+        if now >= deadline:
+            raise TimeoutException(
+                f"Network still busy after {timeout}s ({len(inflight)} requests)."
+            )
+        time.sleep(POLL_INTERVAL)
+
+
+def settle_network(
+    driver: WebDriver, timeout: float, notes: list[str] | None = None
+) -> bool:
+    """
+    Best-effort `wait_for_network_idle`: pages that keep requests open (long
+    polling, beacons) never go idle, so giving up is only noted and the
+    element waits that follow decide whether the flow can go on.
+    :param driver: Selenium WebDriver instance
+    :param timeout: Seconds to wait at most
+    :param notes: Notes of the current `timed_step`, told when the wait gave up
+    :return: True if the network went idle
+    """
+    try:
+        wait_for_network_idle(driver, timeout=timeout)
+    except TimeoutException as e:
+        if notes is not None:
+            notes.append(e.msg)
+        return False
+    return True
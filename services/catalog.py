@@ -0,0 +1,253 @@
+import os
+import typing
+
+import numpy as np
+import pandas as pd
+
+PRODUCT_COLUMNS = ["Title", "Body (HTML)", "Vendor", "Type"]
+OPTION_COLUMNS = [(f"Option{i} Name", f"Option{i} Value") for i in range(1, 4)]
+VARIANT_COLUMNS = [
+    "Variant SKU",
+    "Variant Price",
+    "Variant Requires Shipping",
+    "Variant Taxable",
+    "Variant Inventory Tracker",
+    "Variant Inventory Policy",
+    "Variant Grams",
+    "Image Src",
+    "Variant Image",
+]
+CATALOG_COLUMNS = [
+    "Handle",
+    "Tags",
+    *PRODUCT_COLUMNS,
+    *[column for pair in OPTION_COLUMNS for column in pair],
+    *VARIANT_COLUMNS,
+]
+
+# rows parsed at a time when streaming a catalog
+CATALOG_CHUNK_SIZE = int(os.getenv("CATALOG_CHUNK_SIZE", "5000"))
+
+DEFAULT_OPTION = {"name": "Title", "position": 1, "values": [{"name": "Default Title"}]}
+DEFAULT_OPTION_VALUE = {"optionName": "Title", "name": "Default Title"}
+
+
+def read_catalog_csv(csv_file_path: str, **kwargs) -> pd.DataFrame:
+    """
+    Reads the columns of a Shopify products CSV the catalog needs, as text.
+    Keyword arguments are forwarded to `pd.read_csv` (e.g. `chunksize`).
+    """
+    return pd.read_csv(
+        csv_file_path,
+        dtype=str,
+        keep_default_na=False,
+        usecols=lambda column: column in CATALOG_COLUMNS,
+        **kwargs,
+    )
+
+
+def _column(df: pd.DataFrame, name: str) -> np.ndarray:
+    if name not in df:
+        return np.full(len(df), "", dtype=object)
+    return df[name].str.strip().to_numpy(dtype=object)
+
+
+def _split_column(df: pd.DataFrame, name: str) -> np.ndarray:
+    if name not in df:
+        return np.empty(len(df), dtype=object)
+    return df[name].str.split(",").to_numpy(dtype=object)
+
+
+def _bool_column(df: pd.DataFrame, name: str) -> np.ndarray:
+    if name not in df:
+        return np.zeros(len(df), dtype=bool)
+    return df[name].str.strip().str.lower().isin(["true", "1", "yes"]).to_numpy()
+
+
+def _unique(values) -> list:
+    return [value for value in dict.fromkeys(values) if value]
+
+
+def compile_frame(df: pd.DataFrame) -> list[dict]:
+    """
+    Compiles the rows of a Shopify products CSV into ready-to-send payloads.
+
+    Rows are grouped by Handle (Title when the CSV has no Handle column), in
+    order of first appearance. Column cleaning is vectorized over the whole
+    frame; each product then only slices the prepared arrays.
+    Args:
+        df (pd.DataFrame): The CSV rows, read with `read_catalog_csv`.
+    Returns:
+        list[dict]: For every product its "handle", "title", the "product"
+            and "media" variables of `productCreate` and the "set" input of
+            `productSet`.
+    """
+    if df.empty:
+        return []
+
+    key_column = "Handle" if "Handle" in df else "Title"
+    codes, _ = pd.factorize(df[key_column], sort=False)
+    order = np.argsort(codes, kind="stable")
+    df = df.iloc[order].reset_index(drop=True)
+    codes = codes[order]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(df)]
+
+    keys = _column(df, key_column)
+    product_fields = {name: _column(df, name) for name in PRODUCT_COLUMNS}
+    tags = _split_column(df, "Tags")
+    images = _column(df, "Image Src")
+    variant_images = _column(df, "Variant Image")
+
+    option_names = [_column(df, name) for name, _ in OPTION_COLUMNS]
+    option_values = [_column(df, value) for _, value in OPTION_COLUMNS]
+    # image-only rows of a Shopify export carry no option values
+    is_variant = np.logical_or.reduce([values != "" for values in option_values])
+
+    skus = _column(df, "Variant SKU")
+    prices = _column(df, "Variant Price")
+    policies = np.char.upper(_column(df, "Variant Inventory Policy").astype(str))
+    tracked = _column(df, "Variant Inventory Tracker") != ""
+    requires_shipping = _bool_column(df, "Variant Requires Shipping")
+    taxable = _bool_column(df, "Variant Taxable")
+    grams = pd.to_numeric(
+        pd.Series(_column(df, "Variant Grams")), errors="coerce"
+    ).to_numpy()
+
+    catalog = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        rows = np.arange(start, end)
+        variant_rows = rows[is_variant[start:end]]
+
+        options = []
+        options_values = []
+        for names, values in zip(option_names, option_values):
+            name = names[start]
+            if not name or not len(variant_rows):
+                continue
+            options_values.append(values)
+            options.append(
+                {
+                    "name": name,
+                    "position": len(options) + 1,
+                    "values": [{"name": v} for v in _unique(values[variant_rows])],
+                }
+            )
+        if not options:
+            variant_rows = rows[:1]
+
+        product_tags = _unique(
+            tag.strip() for cell in tags[start:end] for tag in cell or []
+        )
+        product_images = _unique([*images[start:end], *variant_images[start:end]])
+
+        product = {
+            "title": product_fields["Title"][start],
+            "descriptionHtml": product_fields["Body (HTML)"][start],
+            "vendor": product_fields["Vendor"][start],
+            "productType": product_fields["Type"][start],
+            "tags": product_tags,
+            "productOptions": options or [DEFAULT_OPTION],
+        }
+        if key_column == "Handle":
+            product["handle"] = keys[start]
+
+        variants = []
+        for row in variant_rows.tolist():
+            variant = {
+                "optionValues": [
+                    {"optionName": option["name"], "name": values[row]}
+                    for option, values in zip(options, options_values)
+                ]
+                or [DEFAULT_OPTION_VALUE],
+                "inventoryItem": {
+                    "tracked": bool(tracked[row]),
+                    "requiresShipping": bool(requires_shipping[row]),
+                },
+                "taxable": bool(taxable[row]),
+            }
+            if prices[row]:
+                variant["price"] = prices[row]
+            if skus[row]:
+                variant["inventoryItem"]["sku"] = skus[row]
+            if policies[row]:
+                variant["inventoryPolicy"] = str(policies[row])
+            if not np.isnan(grams[row]):
+                variant["inventoryItem"]["measurement"] = {
+                    "weight": {"value": float(grams[row]), "unit": "GRAMS"}
+                }
+            if variant_images[row]:
+                variant["file"] = {
+                    "originalSource": variant_images[row],
+                    "contentType": "IMAGE",
+                }
+            variants.append(variant)
+
+        catalog.append(
+            {
+                "handle": keys[start],
+                "title": product["title"],
+                "product": product,
+                "media": [
+                    {"originalSource": img, "mediaContentType": "IMAGE"}
+                    for img in product_images
+                ],
+                "set": {
+                    **product,
+                    "variants": variants,
+                    "files": [
+                        {"originalSource": img, "contentType": "IMAGE"}
+                        for img in product_images
+                    ],
+                },
+            }
+        )
+
+    return catalog
+
+
+def compile_catalog(csv_file_path: str) -> list[dict]:
+    """
+    Reads and compiles a Shopify products CSV.
+    Args:
+        csv_file_path (str): The path to the CSV file.
+    Returns:
+        list[dict]: The compiled products, see `compile_frame`.
+    """
+    return compile_frame(read_catalog_csv(csv_file_path))
+
+
+def iter_catalog(
+    csv_file_path: str, chunksize: int = CATALOG_CHUNK_SIZE
+) -> typing.Iterator[dict]:
+    """
+    Reads and compiles a Shopify products CSV in chunks, yielding each
+    product as soon as all of its rows were read.
+
+    Shopify exports keep the rows of a product together, so only the rows of
+    the last product of a chunk are carried over to the next one; memory stays
+    bounded by the chunk size. Rows of a product split apart in the file are
+    uploaded as separate products, unlike with `compile_catalog`.
+    Args:
+        csv_file_path (str): The path to the CSV file.
+        chunksize (int): The number of rows parsed at a time.
+    Returns:
+        Iterator[dict]: The compiled products, see `compile_frame`.
+    """
+    carry = None
+    for chunk in read_catalog_csv(csv_file_path, chunksize=chunksize):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        key_column = "Handle" if "Handle" in chunk else "Title"
+        keys = chunk[key_column].to_numpy()
+        # the last product may continue in the next chunk
+        others = np.flatnonzero(keys != keys[-1])
+        last = int(others[-1]) + 1 if len(others) else 0
+
+        carry = chunk.iloc[last:]
+        yield from compile_frame(chunk.iloc[:last])
+
+    if carry is not None:
+        yield from compile_frame(carry)
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import pickle
+import tempfile
+import typing
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CATALOG_CACHE_DIR = pathlib.Path(
+    os.getenv(
+        "CATALOG_CACHE_DIR",
+        pathlib.Path(__file__).parent.parent / ".cache" / "catalog",
+    )
+)
+
+# bump whenever the output of services.catalog changes
+CATALOG_CACHE_VERSION = 1
+
+
+class Catalog(typing.NamedTuple):
+    # a list, or an iterator for a catalog streamed by `stream_catalog`
+    products: typing.Iterable[dict]
+    collections: list[dict]
+
+
+def catalog_key(*file_paths: str | os.PathLike | None) -> str:
+    """
+    Hashes the content of the catalog source files into a cache key.
+    """
+    digest = hashlib.sha256(f"v{CATALOG_CACHE_VERSION}".encode())
+    for file_path in file_paths:
+        if file_path is None:
+            digest.update(b"\0")
+            continue
+        with open(file_path, "rb") as file:
+            digest.update(hashlib.file_digest(file, "sha256").digest())
+    return digest.hexdigest()
+
+
+def _read_cache(cache_path: pathlib.Path) -> Catalog | None:
+    try:
+        with open(cache_path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return Catalog(*pickle.loads(data))
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError, TypeError) as e:
+        print(f"Ignoring unreadable catalog cache {cache_path}: {e}")
+        return None
+
+
+def _write_cache(cache_path: pathlib.Path, catalog: Catalog):
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # write then rename, so concurrent runs never read a partial file
+    with tempfile.NamedTemporaryFile(dir=cache_path.parent, delete=False) as file:
+        pickle.dump(tuple(catalog), file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(file.name, cache_path)
+
+
+def load_catalog(
+    csv_file_path: str | os.PathLike,
+    collections_file_path: str | os.PathLike | None = None,
+) -> Catalog:
+    """
+    Returns the compiled products and collections of a country catalog.
+    The compiled catalog is cached on disk under a hash of its source files;
+    on a hit it is loaded from a memory-mapped pickle without pandas.
+    Args:
+        csv_file_path (str | os.PathLike): The products CSV.
+        collections_file_path (str | os.PathLike | None): The collections JSON.
+    Returns:
+        Catalog: The compiled products and the collections.
+    """
+    cache_path = CATALOG_CACHE_DIR / (
+        catalog_key(csv_file_path, collections_file_path) + ".pickle"
+    )
+
+    if cache_path.exists() and (catalog := _read_cache(cache_path)):
+        return catalog
+
+    # imported here so cache hits never pay for importing pandas
+    from services.catalog import compile_catalog
+
+    collections = []
+    if collections_file_path is not None:
+        with open(collections_file_path, "r") as file:
+            collections = json.load(file)
+
+    catalog = Catalog(compile_catalog(csv_file_path), collections)
+    _write_cache(cache_path, catalog)
+    return catalog
+
+
+def stream_catalog(
+    csv_file_path: str | os.PathLike,
+    collections_file_path: str | os.PathLike | None = None,
+) -> Catalog:
+    """
+    Returns a country catalog whose products are compiled while they are
+    read, chunk by chunk (see `services.catalog.iter_catalog`), bypassing the
+    cache. The products can only be iterated once.
+    Args:
+        csv_file_path (str | os.PathLike): The products CSV.
+        collections_file_path (str | os.PathLike | None): The collections JSON.
+    Returns:
+        Catalog: The streamed products and the collections.
+    """
+    # imported here so cache hits never pay for importing pandas
+    from services.catalog import iter_catalog
+
+    collections = []
+    if collections_file_path is not None:
+        with open(collections_file_path, "r") as file:
+            collections = json.load(file)
+
+    return Catalog(iter_catalog(csv_file_path), collections)
@@ -1,19 +1,48 @@
+import asyncio
+import contextlib
+import json
 import os
+import time
 
-import httpx
 from dotenv import load_dotenv
-from httpx import Client
+from httpx import AsyncClient, Client
+
+from services.graphql.client import (  # NOQA: F401
+    API_VERSION,
+    BASE_URL,
+    HEADERS,
+    get_store_client,
+)
+from services.graphql.throttle import (
+    MAX_THROTTLE_RETRIES,
+    ThrottledError,
+    get_bucket,
+    is_throttled,
+)
 
 load_dotenv()
 
-API_VERSION = os.getenv("API_VERSION")
+# fixed number of GraphQL requests in flight per store on the async client,
+# 0 lets it follow the restore rate learned from the store's cost bucket
+MAX_CONCURRENT_REQUESTS = int(os.getenv("GRAPHQL_MAX_CONCURRENCY", "0"))
 
-HEADERS = {
-    "X-Shopify-Access-Token": "",
-    "Content-Type": "application/json; charset=utf-8",
-}
 
-BASE_URL = "https://{SHOP_NAME}/admin/api/{API_VERSION}"
+def get_max_concurrency(store_url: str) -> int:
+    """
+    Returns the number of requests to keep in flight for a store:
+    GRAPHQL_MAX_CONCURRENCY when set, otherwise tuned from its learned cost bucket.
+    """
+    if MAX_CONCURRENT_REQUESTS:
+        return MAX_CONCURRENT_REQUESTS
+
+    return get_bucket(store_url).concurrency()
+
+
+def _graphql_payload(query: str, variables: dict | None) -> dict:
+    payload = {"query": query}
+    if variables:
+        payload["variables"] = variables
+    return payload
 
 
 def graphql_request(
@@ -22,24 +51,101 @@ def graphql_request(
     access_token: str,
     query: str,
     variables: dict | None = None,
+    estimated_cost: float | None = None,
 ):
     if not store_url or not access_token:
         raise ValueError("Shop name and access token must be provided.")
 
-    HEADERS["X-Shopify-Access-Token"] = access_token
+    payload = _graphql_payload(query, variables)
+    bucket = get_bucket(store_url)
 
-    payload = {"query": query}
-    if variables:
-        payload["variables"] = variables
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        cost = bucket.estimate(query, estimated_cost)
+        if delay := bucket.reserve(cost):
+            time.sleep(delay)
+
+        data = {}
+        try:
+            response = client.post(
+                f"{BASE_URL}/graphql.json".format(
+                    SHOP_NAME=store_url, API_VERSION=API_VERSION
+                ),
+                headers={**HEADERS, "X-Shopify-Access-Token": access_token},
+                json=payload,
+                timeout=None,
+            )
+            response.raise_for_status()
+            data = response.json()
+        finally:
+            bucket.settle(query, cost, data.get("extensions", {}).get("cost"))
+
+        if not is_throttled(data):
+            return data
+
+        print(f"Request throttled by {store_url} (attempt {attempt + 1}).")
+
+    raise ThrottledError(store_url, data)
 
-    response = client.post(
-        f"{BASE_URL}/graphql.json".format(SHOP_NAME=store_url, API_VERSION=API_VERSION),
-        headers=HEADERS,
-        json=payload,
-        timeout=None,
-    )
-    response.raise_for_status()
-    return response.json()
+
+async def async_graphql_request(
+    client: AsyncClient,
+    store_url: str,
+    access_token: str,
+    query: str,
+    variables: dict | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+    estimated_cost: float | None = None,
+):
+    """
+    Async counterpart of `graphql_request`.
+    Args:
+        client (AsyncClient): The async HTTP client to send the request with.
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        query (str): The GraphQL query or mutation.
+        variables (dict | None): The variables of the query.
+        semaphore (asyncio.Semaphore | None): Bounds the number of requests in flight.
+        estimated_cost (float | None): Cost to book until the query's cost is learned.
+    Returns:
+        dict: The decoded GraphQL response.
+    Raises:
+        ThrottledError: When the request is still throttled after
+            MAX_THROTTLE_RETRIES retries.
+    """
+    if not store_url or not access_token:
+        raise ValueError("Shop name and access token must be provided.")
+
+    payload = _graphql_payload(query, variables)
+    bucket = get_bucket(store_url)
+
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        # wait for the bucket before taking a slot so waiting requests hold none
+        cost = bucket.estimate(query, estimated_cost)
+        if delay := bucket.reserve(cost):
+            await asyncio.sleep(delay)
+
+        data = {}
+        try:
+            async with semaphore or contextlib.nullcontext():
+                response = await client.post(
+                    f"{BASE_URL}/graphql.json".format(
+                        SHOP_NAME=store_url, API_VERSION=API_VERSION
+                    ),
+                    headers={**HEADERS, "X-Shopify-Access-Token": access_token},
+                    json=payload,
+                    timeout=None,
+                )
+            response.raise_for_status()
+            data = response.json()
+        finally:
+            bucket.settle(query, cost, data.get("extensions", {}).get("cost"))
+
+        if not is_throttled(data):
+            return data
+
+        print(f"Request throttled by {store_url} (attempt {attempt + 1}).")
+
+    raise ThrottledError(store_url, data)
 
 
 def update_theme_data(
@@ -48,17 +154,13 @@ def update_theme_data(
     if not shop_name or not access_token or not theme_id:
         raise ValueError("Shop name, access token, and theme ID must be provided.")
 
-    HEADERS["X-Shopify-Access-Token"] = access_token
-
-    response = httpx.put(
-        f"{BASE_URL}/themes/{theme_id}/assets.json".format(
-            SHOP_NAME=shop_name, API_VERSION=API_VERSION
-        ),
-        headers=HEADERS,
+    response = get_store_client(shop_name, access_token).client.put(
+        f"/themes/{theme_id}/assets.json",
         json={
             "asset": {
                 "key": "config/settings_data.json",
-                "value": settings_data,
+                # the asset value is the file content, not a JSON object
+                "value": json.dumps(settings_data),
             }
         },
     )
@@ -70,13 +172,8 @@ def get_settings_data_content(shop_name: str, access_token: str, theme_id: str)
     if not shop_name or not access_token or not theme_id:
         raise ValueError("Shop name, access token, and theme ID must be provided.")
 
-    HEADERS["X-Shopify-Access-Token"] = access_token
-
-    response = httpx.get(
-        f"{BASE_URL}/themes/{theme_id}/assets.json".format(
-            SHOP_NAME=shop_name, API_VERSION=API_VERSION
-        ),
-        headers=HEADERS,
+    response = get_store_client(shop_name, access_token).client.get(
+        f"/themes/{theme_id}/assets.json",
         params={"asset[key]": "config/settings_data.json"},
     )
     response.raise_for_status()
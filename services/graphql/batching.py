@@ -0,0 +1,211 @@
+import asyncio
+import os
+import typing
+
+from httpx import AsyncClient, Client
+
+from services.graphql.admin_api import async_graphql_request, graphql_request
+from services.graphql.throttle import DEFAULT_QUERY_COST, get_bucket
+
+# Shopify rejects any single query whose requested cost is above this
+MAX_SINGLE_QUERY_COST = 1000
+MAX_BATCH_SIZE = int(os.getenv("GRAPHQL_MAX_BATCH_SIZE", "50"))
+MAX_BATCH_RETRIES = 2
+
+
+class BatchedMutation(typing.NamedTuple):
+    """
+    A mutation that can be packed several times into one GraphQL document.
+    """
+
+    # name of the mutation field, e.g. "productPublish"
+    field: str
+    # argument name -> GraphQL type, e.g. {"input": "ProductPublishInput!"}
+    arguments: dict[str, str]
+    # selection set requested for every aliased field, must include userErrors
+    selection: str
+
+
+# per-item cost learned from the responses of each batched mutation
+_item_costs: dict[str, float] = {}
+
+
+def get_batch_size(store_url: str, mutation: BatchedMutation) -> int:
+    """
+    Returns how many items of `mutation` fit in one document without going
+    over the single query cost ceiling or the store's bucket size.
+    """
+    item_cost = _item_costs.get(mutation.field, DEFAULT_QUERY_COST)
+    ceiling = min(MAX_SINGLE_QUERY_COST, get_bucket(store_url).maximum_available)
+    return max(1, min(MAX_BATCH_SIZE, int(ceiling // item_cost)))
+
+
+def build_batch_document(
+    mutation: BatchedMutation, items: list[dict]
+) -> tuple[str, dict]:
+    """
+    Packs one aliased mutation field per item into a single document.
+    Args:
+        mutation (BatchedMutation): The mutation to repeat.
+        items (list[dict]): The arguments of every mutation, by argument name.
+    Returns:
+        tuple[str, dict]: The GraphQL document and its variables.
+    """
+    definitions = []
+    fields = []
+    variables = {}
+    for i, item in enumerate(items):
+        arguments = []
+        for name, graphql_type in mutation.arguments.items():
+            definitions.append(f"${name}{i}: {graphql_type}")
+            arguments.append(f"{name}: ${name}{i}")
+            variables[f"{name}{i}"] = item[name]
+        fields.append(
+            f"m{i}: {mutation.field}({', '.join(arguments)}) {{ {mutation.selection} }}"
+        )
+
+    query = (
+        f"mutation batch{mutation.field[0].upper()}{mutation.field[1:]}"
+        f"({', '.join(definitions)}) {{ {' '.join(fields)} }}"
+    )
+    return query, variables
+
+
+def parse_batch_response(
+    mutation: BatchedMutation, size: int, data: dict
+) -> list[tuple[dict | None, list]]:
+    """
+    Fans the aliased fields of a batch response back out to its items.
+    Returns:
+        list[tuple[dict | None, list]]: For every item, its payload when the
+            mutation succeeded and the errors reported for it.
+    """
+    cost = (data.get("extensions") or {}).get("cost") or {}
+    if cost.get("requestedQueryCost"):
+        _item_costs[mutation.field] = cost["requestedQueryCost"] / size
+
+    results = []
+    payloads = data.get("data") or {}
+    for i in range(size):
+        payload = payloads.get(f"m{i}")
+        if not payload:
+            results.append((None, data.get("errors") or ["No data returned"]))
+        elif payload.get("userErrors"):
+            results.append((None, payload["userErrors"]))
+        else:
+            results.append((payload, []))
+
+    return results
+
+
+def _chunks(pending: list[int], size: int) -> typing.Iterator[list[int]]:
+    for start in range(0, len(pending), size):
+        yield pending[start : start + size]
+
+
+def run_batched_mutations(
+    client: Client,
+    store_url: str,
+    access_token: str,
+    mutation: BatchedMutation,
+    items: list[dict],
+) -> list[dict | None]:
+    """
+    Runs `mutation` for every item, packing them into aliased batches.
+    Only the items that failed are retried, up to MAX_BATCH_RETRIES times.
+    Args:
+        client (Client): The HTTP client.
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        mutation (BatchedMutation): The mutation to run.
+        items (list[dict]): The arguments of every mutation.
+    Returns:
+        list[dict | None]: The payload of every item, None for failed ones.
+    """
+    results: list[dict | None] = [None] * len(items)
+    pending = list(range(len(items)))
+
+    for attempt in range(MAX_BATCH_RETRIES + 1):
+        failed = []
+        errors = {}
+        for batch in _chunks(pending, get_batch_size(store_url, mutation)):
+            query, variables = build_batch_document(mutation, [items[i] for i in batch])
+            data = graphql_request(
+                client,
+                store_url,
+                access_token,
+                query,
+                variables,
+                estimated_cost=len(batch) * DEFAULT_QUERY_COST,
+            )
+            for i, (payload, item_errors) in zip(
+                batch, parse_batch_response(mutation, len(batch), data)
+            ):
+                results[i] = payload
+                if payload is None:
+                    failed.append(i)
+                    errors[i] = item_errors
+
+        if not failed:
+            break
+
+        pending = failed
+        if attempt < MAX_BATCH_RETRIES:
+            print(f"{len(failed)} {mutation.field} mutations failed, retrying.")
+
+    for i in failed:
+        print(f"{mutation.field} failed for {items[i]}: {errors[i]}")
+
+    return results
+
+
+async def async_run_batched_mutations(
+    client: AsyncClient,
+    store_url: str,
+    access_token: str,
+    mutation: BatchedMutation,
+    items: list[dict],
+    semaphore: asyncio.Semaphore | None = None,
+) -> list[dict | None]:
+    """
+    Async counterpart of `run_batched_mutations`, sending batches concurrently.
+    """
+    results: list[dict | None] = [None] * len(items)
+    pending = list(range(len(items)))
+
+    async def run_batch(batch: list[int]) -> list[tuple[dict | None, list]]:
+        query, variables = build_batch_document(mutation, [items[i] for i in batch])
+        data = await async_graphql_request(
+            client,
+            store_url,
+            access_token,
+            query,
+            variables,
+            semaphore=semaphore,
+            estimated_cost=len(batch) * DEFAULT_QUERY_COST,
+        )
+        return parse_batch_response(mutation, len(batch), data)
+
+    for attempt in range(MAX_BATCH_RETRIES + 1):
+        failed = []
+        errors = {}
+        batches = list(_chunks(pending, get_batch_size(store_url, mutation)))
+        responses = await asyncio.gather(*(run_batch(batch) for batch in batches))
+        for batch, parsed in zip(batches, responses):
+            for i, (payload, item_errors) in zip(batch, parsed):
+                results[i] = payload
+                if payload is None:
+                    failed.append(i)
+                    errors[i] = item_errors
+
+        if not failed:
+            break
+
+        pending = failed
+        if attempt < MAX_BATCH_RETRIES:
+            print(f"{len(failed)} {mutation.field} mutations failed, retrying.")
+
+    for i in failed:
+        print(f"{mutation.field} failed for {items[i]}: {errors[i]}")
+
+    return results
@@ -0,0 +1,188 @@
+import json
+import os
+import time
+import typing
+
+from httpx import Client
+
+from services.graphql.admin_api import graphql_request
+from services.graphql.client import get_http_client
+from services.graphql.queries import (
+    BULK_OPERATION_RUN_MUTATION_QUERY,
+    BULK_OPERATION_RUN_QUERY_QUERY,
+    CURRENT_BULK_OPERATION_QUERY,
+    STAGED_UPLOADS_CREATE_QUERY,
+)
+
+BULK_POLL_MIN_INTERVAL = 1.0
+BULK_POLL_MAX_INTERVAL = 30.0
+BULK_POLL_TIMEOUT = float(os.getenv("BULK_OPERATION_TIMEOUT", "3600"))
+
+BULK_FINISHED_STATUSES = {"COMPLETED", "FAILED", "CANCELED", "EXPIRED"}
+
+
+def stage_bulk_upload(
+    client: Client, store_url: str, access_token: str, file_path: str
+) -> str:
+    """
+    Uploads a JSONL file of mutation variables to Shopify's staged storage.
+    Args:
+        client (Client): The HTTP client.
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        file_path (str): The path to the JSONL file.
+    Returns:
+        str: The staged upload path to pass to `bulkOperationRunMutation`.
+    """
+    data = graphql_request(
+        client,
+        store_url,
+        access_token,
+        STAGED_UPLOADS_CREATE_QUERY,
+        {
+            "input": [
+                {
+                    "resource": "BULK_MUTATION_VARIABLES",
+                    "filename": os.path.basename(file_path),
+                    "mimeType": "text/jsonl",
+                    "httpMethod": "POST",
+                }
+            ]
+        },
+    )
+    staged = (data.get("data") or {}).get("stagedUploadsCreate") or {}
+    if not staged.get("stagedTargets") or staged.get("userErrors"):
+        print(f"Failed to stage bulk upload. Response: {data}")
+        raise ValueError("Staged upload creation failed")
+
+    target = staged["stagedTargets"][0]
+    parameters = {param["name"]: param["value"] for param in target["parameters"]}
+
+    # the staged target is not Shopify, it must not receive the store headers
+    with open(file_path, "rb") as file:
+        response = get_http_client().post(
+            target["url"],
+            data=parameters,
+            files={"file": (os.path.basename(file_path), file, "text/jsonl")},
+            timeout=None,
+        )
+    response.raise_for_status()
+
+    return parameters["key"]
+
+
+def run_bulk_mutation(
+    client: Client,
+    store_url: str,
+    access_token: str,
+    mutation: str,
+    staged_upload_path: str,
+) -> str:
+    """
+    Starts a bulk operation running `mutation` once per staged JSONL line.
+    Returns:
+        str: The ID of the bulk operation.
+    """
+    data = graphql_request(
+        client,
+        store_url,
+        access_token,
+        BULK_OPERATION_RUN_MUTATION_QUERY,
+        {"mutation": mutation, "stagedUploadPath": staged_upload_path},
+    )
+    result = (data.get("data") or {}).get("bulkOperationRunMutation") or {}
+    if not result.get("bulkOperation") or result.get("userErrors"):
+        print(f"Failed to start bulk operation. Response: {data}")
+        raise ValueError("Bulk operation failed to start")
+
+    return result["bulkOperation"]["id"]
+
+
+def run_bulk_query(
+    client: Client, store_url: str, access_token: str, query: str
+) -> str:
+    """
+    Starts a bulk operation exporting the result of `query` as JSONL.
+    Returns:
+        str: The ID of the bulk operation.
+    """
+    data = graphql_request(
+        client,
+        store_url,
+        access_token,
+        BULK_OPERATION_RUN_QUERY_QUERY,
+        {"query": query},
+    )
+    result = (data.get("data") or {}).get("bulkOperationRunQuery") or {}
+    if not result.get("bulkOperation") or result.get("userErrors"):
+        print(f"Failed to start bulk query. Response: {data}")
+        raise ValueError("Bulk operation failed to start")
+
+    return result["bulkOperation"]["id"]
+
+
+def wait_for_bulk_operation(
+    client: Client,
+    store_url: str,
+    access_token: str,
+    operation_id: str,
+    operation_type: typing.Literal["MUTATION", "QUERY"] = "MUTATION",
+    expected_count: int | None = None,
+) -> dict:
+    """
+    Polls `currentBulkOperation` until the operation finishes.
+    The interval adapts to the observed progress: with `expected_count` it
+    aims at half of the predicted remaining time, otherwise it backs off
+    exponentially, always within the poll interval bounds.
+    Returns:
+        dict: The finished bulk operation.
+    """
+    started_at = time.monotonic()
+    interval = BULK_POLL_MIN_INTERVAL
+
+    while time.monotonic() - started_at < BULK_POLL_TIMEOUT:
+        data = graphql_request(
+            client,
+            store_url,
+            access_token,
+            CURRENT_BULK_OPERATION_QUERY,
+            {"type": operation_type},
+        )
+        operation = (data.get("data") or {}).get("currentBulkOperation")
+        if not operation or operation["id"] != operation_id:
+            print(f"Bulk operation {operation_id} not found. Response: {data}")
+            raise ValueError("Bulk operation lost")
+
+        if operation["status"] in BULK_FINISHED_STATUSES:
+            if operation["status"] != "COMPLETED":
+                print(f"Bulk operation {operation_id} ended as {operation}")
+                raise ValueError("Bulk operation did not complete")
+            return operation
+
+        elapsed = time.monotonic() - started_at
+        done = int(operation.get("objectCount") or 0)
+        if expected_count and done:
+            remaining = (expected_count - done) * elapsed / done
+            interval = remaining / 2
+        else:
+            interval *= 1.5
+        interval = min(max(interval, BULK_POLL_MIN_INTERVAL), BULK_POLL_MAX_INTERVAL)
+
+        print(f"Bulk operation {operation['status']}: {done} objects processed.")
+        time.sleep(interval)
+
+    raise TimeoutError(f"Bulk operation {operation_id} did not finish in time.")
+
+
+def iter_bulk_results(url: str) -> typing.Iterator[dict]:
+    """
+    Streams the JSONL result file of a bulk operation, one object per line.
+    """
+    if not url:
+        return
+
+    with get_http_client().stream("GET", url, timeout=None) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
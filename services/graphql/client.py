@@ -0,0 +1,149 @@
+import asyncio
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+from httpx import AsyncClient, Client
+
+load_dotenv()
+
+API_VERSION = os.getenv("API_VERSION")
+
+HEADERS = {
+    "X-Shopify-Access-Token": "",
+    "Content-Type": "application/json; charset=utf-8",
+}
+
+BASE_URL = "https://{SHOP_NAME}/admin/api/{API_VERSION}"
+
+# connections kept per store, HTTP/2 multiplexes many requests on each of them
+MAX_CONNECTIONS = int(os.getenv("SHOPIFY_MAX_CONNECTIONS", "10"))
+KEEPALIVE_EXPIRY = 60.0
+
+
+class ShopifyStoreClient:
+    """
+    Long-lived, pooled HTTP/2 clients bound to one store.
+
+    Each store owns its base URL, headers and connection limits, so nothing
+    is shared between stores or threads and connections (and their TLS
+    sessions) are reused by every stage of the pipeline. The async client is
+    bound to the event loop it was created on and is recreated for a new one.
+    """
+
+    def __init__(self, store_url: str, access_token: str):
+        if not store_url or not access_token:
+            raise ValueError("Shop name and access token must be provided.")
+
+        self.store_url = store_url
+        self.access_token = access_token
+        self.base_url = BASE_URL.format(SHOP_NAME=store_url, API_VERSION=API_VERSION)
+        self.headers = {**HEADERS, "X-Shopify-Access-Token": access_token}
+        self.limits = httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+
+        self._client: Client | None = None
+        self._async_client: AsyncClient | None = None
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Client:
+        with self._lock:
+            if self._client is None:
+                self._client = Client(
+                    http2=True,
+                    base_url=self.base_url,
+                    headers=self.headers,
+                    limits=self.limits,
+                    timeout=None,
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async_client is None or self._async_loop is not loop:
+                self._async_client = AsyncClient(
+                    http2=True,
+                    base_url=self.base_url,
+                    headers=self.headers,
+                    limits=self.limits,
+                    timeout=None,
+                )
+                self._async_loop = loop
+            return self._async_client
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        """
+        Closes the async client, when it belongs to the running event loop.
+        """
+        with self._lock:
+            client, self._async_client = self._async_client, None
+            loop, self._async_loop = self._async_loop, None
+        if client is not None and loop is asyncio.get_running_loop():
+            await client.aclose()
+
+
+_store_clients: dict[str, ShopifyStoreClient] = {}
+_store_clients_lock = threading.Lock()
+
+_http_client: Client | None = None
+
+
+def get_store_client(store_url: str, access_token: str) -> ShopifyStoreClient:
+    """
+    Returns the registered client of a store, creating it on first use or
+    when the store's access token changed.
+    """
+    with _store_clients_lock:
+        store_client = _store_clients.get(store_url)
+        if store_client is None or store_client.access_token != access_token:
+            if store_client is not None:
+                store_client.close()
+            store_client = ShopifyStoreClient(store_url, access_token)
+            _store_clients[store_url] = store_client
+        return store_client
+
+
+def get_http_client() -> Client:
+    """
+    Returns a shared pooled client without Shopify credentials, for requests
+    to third-party hosts such as staged upload targets and bulk result files.
+    """
+    global _http_client
+
+    with _store_clients_lock:
+        if _http_client is None:
+            _http_client = Client(http2=True, timeout=None)
+        return _http_client
+
+
+def close_store_clients():
+    """
+    Closes the sync clients of every registered store and forgets them.
+    Async clients are closed with `ShopifyStoreClient.aclose` in their own loop.
+    """
+    global _http_client
+
+    with _store_clients_lock:
+        store_clients = list(_store_clients.values())
+        _store_clients.clear()
+        http_client, _http_client = _http_client, None
+
+    for store_client in store_clients:
+        store_client.close()
+
+    if http_client is not None:
+        http_client.close()
@@ -0,0 +1,127 @@
+import asyncio
+import typing
+
+from httpx import AsyncClient
+
+from services.graphql.admin_api import async_graphql_request
+from services.graphql.batching import MAX_SINGLE_QUERY_COST
+from services.graphql.throttle import get_bucket
+
+MAX_PAGE_SIZE = 250
+MIN_PAGE_SIZE = 10
+
+# assumed cost of one node until a response reports the query's real cost
+DEFAULT_NODE_COST = 1.0
+
+
+def get_page_size(store_url: str, node_cost: float = DEFAULT_NODE_COST) -> int:
+    """
+    Sizes the next page to what the store's bucket can pay without waiting,
+    within the page size bounds and the single query cost ceiling.
+    """
+    budget = min(get_bucket(store_url).budget(), MAX_SINGLE_QUERY_COST)
+    return int(min(MAX_PAGE_SIZE, max(MIN_PAGE_SIZE, budget // node_cost)))
+
+
+async def iter_connection(
+    client: AsyncClient,
+    store_url: str,
+    access_token: str,
+    query: str,
+    connection: str,
+    variables: dict | None = None,
+    page_size: int | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+) -> typing.AsyncIterator[dict]:
+    """
+    Iterates over the nodes of an Admin API connection, page after page.
+
+    The query must take `$first: Int!` and `$after: String` and select
+    `nodes` (or `edges { node }`) and `pageInfo { hasNextPage endCursor }`
+    of the connection. The next page is requested while the caller handles
+    the current one; unless `page_size` is given, each page is sized from the
+    bucket's remaining budget and the per-node cost of the previous page.
+    Args:
+        client (AsyncClient): The async HTTP client to send the requests with.
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        query (str): The GraphQL query of the connection.
+        connection (str): Dotted path of the connection in the response data,
+            e.g. "products" or "collection.products".
+        variables (dict | None): Other variables of the query.
+        page_size (int | None): A fixed number of nodes per page.
+        semaphore (asyncio.Semaphore | None): Bounds the number of requests in flight.
+    Returns:
+        AsyncIterator[dict]: The nodes of the connection.
+    """
+    node_cost = DEFAULT_NODE_COST
+
+    async def fetch_page(after: str | None) -> tuple[int, dict, dict]:
+        first = page_size or get_page_size(store_url, node_cost)
+        data = await async_graphql_request(
+            client,
+            store_url,
+            access_token,
+            query,
+            {**(variables or {}), "first": first, "after": after},
+            semaphore=semaphore,
+            estimated_cost=first * node_cost,
+        )
+        page = data.get("data")
+        for field in connection.split("."):
+            page = (page or {}).get(field)
+        if page is None:
+            print(f"Failed to fetch {connection}. Response: {data}")
+            raise ValueError("Connection query failed")
+
+        return first, page, data.get("extensions", {}).get("cost") or {}
+
+    next_page = asyncio.create_task(fetch_page(None))
+    try:
+        while next_page is not None:
+            first, page, cost = await next_page
+            next_page = None
+
+            if cost.get("requestedQueryCost"):
+                node_cost = max(float(cost["requestedQueryCost"]) / first, 0.01)
+
+            if page["pageInfo"]["hasNextPage"]:
+                next_page = asyncio.create_task(
+                    fetch_page(page["pageInfo"]["endCursor"])
+                )
+
+            if "nodes" in page:
+                nodes = page["nodes"]
+            else:
+                nodes = [edge["node"] for edge in page["edges"]]
+            for node in nodes:
+                yield node
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+
+
+async def fetch_connection(
+    client: AsyncClient,
+    store_url: str,
+    access_token: str,
+    query: str,
+    connection: str,
+    variables: dict | None = None,
+    page_size: int | None = None,
+) -> list[dict]:
+    """
+    Returns every node of a connection, see `iter_connection`.
+    """
+    return [
+        node
+        async for node in iter_connection(
+            client,
+            store_url,
+            access_token,
+            query,
+            connection,
+            variables=variables,
+            page_size=page_size,
+        )
+    ]
@@ -1,3 +1,5 @@
+from services.graphql.batching import BatchedMutation
+
 # === COLLECTION QUERIES ===
 CREATE_COLLECTION_QUERY = (
     "mutation createCollectionMetafields($input: CollectionInput!) {"
@@ -54,6 +56,46 @@ BULK_CREATE_VARIANTS_QUERY = (
     "}"
 )
 
+PRODUCT_SET_QUERY = (
+    "mutation productSet($input: ProductSetInput!, $synchronous: Boolean!) {"
+    "  productSet(input: $input, synchronous: $synchronous) {"
+    "    product {"
+    "      id"
+    "      title"
+    "      variants(first: 250) { nodes { id title sku price selectedOptions { name value } } }"
+    "    }"
+    "    userErrors { field message code }"
+    "  }"
+    "}"
+)
+
+# === FILE QUERIES ===
+FILE_CREATE_QUERY = (
+    "mutation fileCreate($files: [FileCreateInput!]!) {"
+    "  fileCreate(files: $files) {"
+    "    files { id fileStatus }"
+    "    userErrors { field message code }"
+    "  }"
+    "}"
+)
+
+FILE_STATUS_QUERY = (
+    "query fileStatus($ids: [ID!]!) {"
+    "  nodes(ids: $ids) {"
+    "    ... on File { id fileStatus fileErrors { code message } }"
+    "  }"
+    "}"
+)
+
+FILE_UPDATE_QUERY = (
+    "mutation fileUpdate($files: [FileUpdateInput!]!) {"
+    "  fileUpdate(files: $files) {"
+    "    files { id }"
+    "    userErrors { field message code }"
+    "  }"
+    "}"
+)
+
 ADD_PRODUCT_COLLECTION_QUERY = (
     "mutation collectionAddProducts($collectionId: ID!, $productIds: [ID!]!) {"
     "  collectionAddProducts(collectionId: $collectionId, productIds: $productIds) {"
@@ -71,3 +113,159 @@ PUBLISH_PRODUCT_QUERY = (
     "  }"
     "}"
 )
+
+# === SNAPSHOT QUERIES ===
+PRODUCTS_SNAPSHOT_QUERY = (
+    "query productsSnapshot($first: Int!, $after: String) {"
+    "  products(first: $first, after: $after) {"
+    "    nodes { id handle title descriptionHtml vendor productType tags }"
+    "    pageInfo { hasNextPage endCursor }"
+    "  }"
+    "}"
+)
+
+COLLECTIONS_SNAPSHOT_QUERY = (
+    "query collectionsSnapshot($first: Int!, $after: String) {"
+    "  collections(first: $first, after: $after) {"
+    "    nodes { id title handle }"
+    "    pageInfo { hasNextPage endCursor }"
+    "  }"
+    "}"
+)
+
+PUBLICATIONS_QUERY = (
+    "query publications($first: Int!, $after: String) {"
+    "  publications(first: $first, after: $after) {"
+    "    nodes { id name }"
+    "    pageInfo { hasNextPage endCursor }"
+    "  }"
+    "}"
+)
+
+THEMES_QUERY = (
+    "query themes($first: Int!, $after: String, $roles: [ThemeRole!]) {"
+    "  themes(first: $first, after: $after, roles: $roles) {"
+    "    nodes { id name role }"
+    "    pageInfo { hasNextPage endCursor }"
+    "  }"
+    "}"
+)
+
+# bulk operation queries, nested connections are exported as child lines
+PRODUCTS_BULK_QUERY = (
+    "{ products { edges { node {"
+    "  id handle title descriptionHtml vendor productType tags status updatedAt"
+    "  variants { edges { node {"
+    "    id sku title price inventoryPolicy selectedOptions { name value }"
+    "  } } }"
+    "} } } }"
+)
+
+COLLECTIONS_BULK_QUERY = (
+    "{ collections { edges { node { id handle title updatedAt } } } }"
+)
+
+PUBLICATIONS_BULK_QUERY = "{ publications { edges { node { id name } } } }"
+
+# === THEME QUERIES ===
+THEME_FILES_QUERY = (
+    "query themeFiles($id: ID!, $first: Int!, $after: String) {"
+    "  theme(id: $id) {"
+    "    files(first: $first, after: $after) {"
+    "      nodes { filename checksumMd5 size }"
+    "      pageInfo { hasNextPage endCursor }"
+    "    }"
+    "  }"
+    "}"
+)
+
+THEME_FILES_UPSERT_QUERY = (
+    "mutation themeFilesUpsert($themeId: ID!, $files: [OnlineStoreThemeFilesUpsertFileInput!]!) {"
+    "  themeFilesUpsert(themeId: $themeId, files: $files) {"
+    "    upsertedThemeFiles { filename }"
+    "    job { id }"
+    "    userErrors { filename code message }"
+    "  }"
+    "}"
+)
+
+THEME_FILES_DELETE_QUERY = (
+    "mutation themeFilesDelete($themeId: ID!, $files: [String!]!) {"
+    "  themeFilesDelete(themeId: $themeId, files: $files) {"
+    "    deletedThemeFiles { filename }"
+    "    userErrors { filename code message }"
+    "  }"
+    "}"
+)
+
+THEME_PUBLISH_QUERY = (
+    "mutation themePublish($id: ID!) {"
+    "  themePublish(id: $id) {"
+    "    theme { id role }"
+    "    userErrors { field message }"
+    "  }"
+    "}"
+)
+
+JOB_QUERY = "query job($id: ID!) { job(id: $id) { id done } }"
+
+# === BULK OPERATION QUERIES ===
+STAGED_UPLOADS_CREATE_QUERY = (
+    "mutation stagedUploadsCreate($input: [StagedUploadInput!]!) {"
+    "  stagedUploadsCreate(input: $input) {"
+    "    stagedTargets { url resourceUrl parameters { name value } }"
+    "    userErrors { field message }"
+    "  }"
+    "}"
+)
+
+BULK_OPERATION_RUN_MUTATION_QUERY = (
+    "mutation bulkOperationRunMutation($mutation: String!, $stagedUploadPath: String!) {"
+    "  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $stagedUploadPath) {"
+    "    bulkOperation { id status }"
+    "    userErrors { field message }"
+    "  }"
+    "}"
+)
+
+BULK_OPERATION_RUN_QUERY_QUERY = (
+    "mutation bulkOperationRunQuery($query: String!) {"
+    "  bulkOperationRunQuery(query: $query) {"
+    "    bulkOperation { id status }"
+    "    userErrors { field message }"
+    "  }"
+    "}"
+)
+
+CURRENT_BULK_OPERATION_QUERY = (
+    "query currentBulkOperation($type: BulkOperationType!) {"
+    "  currentBulkOperation(type: $type) {"
+    "    id status errorCode objectCount url partialDataUrl"
+    "  }"
+    "}"
+)
+
+# === BATCHED MUTATIONS ===
+PUBLISH_PRODUCT_MUTATION = BatchedMutation(
+    field="productPublish",
+    arguments={"input": "ProductPublishInput!"},
+    selection="product { id title } userErrors { field message }",
+)
+
+PUBLISH_COLLECTION_MUTATION = BatchedMutation(
+    field="collectionPublish",
+    arguments={"input": "CollectionPublishInput!"},
+    selection="collection { id title } userErrors { field message }",
+)
+
+ADD_PRODUCTS_COLLECTION_MUTATION = BatchedMutation(
+    field="collectionAddProducts",
+    arguments={"collectionId": "ID!", "productIds": "[ID!]!"},
+    selection="collection { id title } userErrors { field message }",
+)
+
+UPDATE_PRODUCT_MUTATION = BatchedMutation(
+    field="productUpdate",
+    arguments={"product": "ProductUpdateInput!"},
+    selection="product { id handle } userErrors { field message }",
+)
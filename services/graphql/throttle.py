@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+# assumed until the first response of a store reports its real bucket
+DEFAULT_BUCKET_SIZE = 1000.0
+DEFAULT_RESTORE_RATE = 50.0
+
+# base cost of a mutation, used for queries whose cost was never observed
+DEFAULT_QUERY_COST = 10.0
+
+MAX_THROTTLE_RETRIES = int(os.getenv("GRAPHQL_MAX_THROTTLE_RETRIES", "5"))
+MAX_CONCURRENCY = int(os.getenv("GRAPHQL_MAX_CONCURRENCY_CAP", "32"))
+
+
+class ThrottledError(ValueError):
+    """
+    A request still throttled after MAX_THROTTLE_RETRIES retries.
+    """
+
+    def __init__(self, store_url: str, data: dict):
+        self.store_url = store_url
+        # the cost and throttleStatus reported by the last response
+        self.cost = (data.get("extensions") or {}).get("cost") or {}
+        throttle_status = self.cost.get("throttleStatus") or {}
+        super().__init__(
+            f"Request to {store_url} still throttled after "
+            f"{MAX_THROTTLE_RETRIES} retries (requested cost "
+            f"{self.cost.get('requestedQueryCost')}, throttle status "
+            f"{throttle_status})."
+        )
+
+
+class CostBucket:
+    """
+    Client-side mirror of the leaky bucket Shopify keeps for a store.
+
+    Requests book their estimated cost before being sent; when the bucket
+    cannot cover it the caller is told how long to wait for it to refill.
+    Every response reconciles the estimate with the `extensions.cost` field,
+    so the bucket size, restore rate and per-query costs are learned from
+    the store itself (standard and Plus stores have different buckets).
+    """
+
+    def __init__(self):
+        self.maximum_available = DEFAULT_BUCKET_SIZE
+        self.restore_rate = DEFAULT_RESTORE_RATE
+        self.available = DEFAULT_BUCKET_SIZE
+        # points booked by requests that did not get their response yet
+        self.reserved = 0.0
+        self.updated_at = time.monotonic()
+        self.query_costs: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(
+            self.maximum_available,
+            self.available + (now - self.updated_at) * self.restore_rate,
+        )
+        self.updated_at = now
+
+    def estimate(self, query: str, default: float | None = None) -> float:
+        """
+        Returns the expected cost of a query, learned from previous responses.
+        """
+        return self.query_costs.get(query, default or DEFAULT_QUERY_COST)
+
+    def reserve(self, cost: float) -> float:
+        """
+        Books `cost` points from the bucket.
+        Args:
+            cost (float): The estimated cost of the request.
+        Returns:
+            float: Seconds to wait before sending the request.
+        """
+        with self._lock:
+            self._refill()
+            self.available -= cost
+            self.reserved += cost
+            if self.available >= 0:
+                return 0.0
+
+            return -self.available / self.restore_rate
+
+    def settle(self, query: str, reserved: float, cost: dict | None):
+        """
+        Reconciles a reservation with the `extensions.cost` of its response.
+        Args:
+            query (str): The query that was sent.
+            reserved (float): The cost booked for it by `reserve`.
+            cost (dict | None): The `extensions.cost` field of the response.
+        """
+        with self._lock:
+            self._refill()
+            self.reserved -= reserved
+
+            if not cost:
+                return
+
+            if cost.get("requestedQueryCost") is not None:
+                self.query_costs[query] = float(cost["requestedQueryCost"])
+
+            # throttled requests are not charged, others refund the difference
+            actual = cost.get("actualQueryCost")
+            self.available += reserved - (actual or 0)
+
+            status = cost.get("throttleStatus")
+            if status:
+                self.maximum_available = float(status["maximumAvailable"])
+                self.restore_rate = float(status["restoreRate"])
+                # the store is the source of truth, minus what is still booked
+                self.available = float(status["currentlyAvailable"]) - self.reserved
+
+    def budget(self) -> float:
+        """
+        Returns the points available right now, net of booked requests.
+        """
+        with self._lock:
+            self._refill()
+            return self.available
+
+    def concurrency(self, cost: float = DEFAULT_QUERY_COST) -> int:
+        """
+        Returns how many requests of `cost` the restore rate sustains per second.
+        """
+        return max(1, min(MAX_CONCURRENCY, int(self.restore_rate // cost)))
+
+
+_buckets: dict[str, CostBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(store_url: str) -> CostBucket:
+    """
+    Returns the cost bucket of a store, creating it on first use.
+    """
+    with _buckets_lock:
+        if store_url not in _buckets:
+            _buckets[store_url] = CostBucket()
+        return _buckets[store_url]
+
+
+def is_throttled(data: dict) -> bool:
+    """
+    Checks whether a GraphQL response was rejected with a THROTTLED error.
+    """
+    return any(
+        (error.get("extensions") or {}).get("code") == "THROTTLED"
+        for error in data.get("errors") or []
+    )
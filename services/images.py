@@ -0,0 +1,179 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import os
+import pathlib
+import tempfile
+import typing
+
+import httpx
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+
+load_dotenv()
+
+IMAGE_CACHE_DIR = pathlib.Path(
+    os.getenv(
+        "IMAGE_CACHE_DIR",
+        pathlib.Path(__file__).parent.parent / ".cache" / "images",
+    )
+)
+
+# concurrent downloads of remote catalog images
+MAX_IMAGE_DOWNLOADS = int(os.getenv("MAX_IMAGE_DOWNLOADS", "16"))
+
+IMAGE_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg", "PNG": "png"}
+
+
+class ImageSettings(typing.NamedTuple):
+    # output format, one of IMAGE_EXTENSIONS
+    format: str = os.getenv("IMAGE_FORMAT", "WEBP").upper()
+    quality: int = int(os.getenv("IMAGE_QUALITY", "82"))
+    # longest side in pixels, larger images are scaled down
+    max_size: int = int(os.getenv("IMAGE_MAX_SIZE", "2048"))
+
+    def key(self) -> str:
+        return f"{self.format}-q{self.quality}-{self.max_size}"
+
+
+def transcode_image(source_path: str, output_path: str, settings: ImageSettings) -> str:
+    """
+    Resizes and re-encodes one image. Runs in the worker processes.
+    Returns:
+        str: The path of the transcoded image.
+    """
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(
+            (settings.max_size, settings.max_size), Image.Resampling.LANCZOS
+        )
+
+        if settings.format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+
+        options = {"quality": settings.quality}
+        if settings.format == "JPEG":
+            options.update(optimize=True, progressive=True)
+        elif settings.format == "WEBP":
+            options.update(method=6)
+        elif settings.format == "PNG":
+            options = {"optimize": True}
+
+        # write then rename, so a crash never leaves a truncated cached image
+        output_dir = os.path.dirname(output_path)
+        with tempfile.NamedTemporaryFile(dir=output_dir, delete=False) as file:
+            try:
+                image.save(file, format=settings.format, **options)
+            except Exception:
+                os.remove(file.name)
+                raise
+        os.replace(file.name, output_path)
+
+    return output_path
+
+
+async def _download_images(urls: list[str]) -> dict[str, str]:
+    """
+    Downloads remote images into the cache, once per URL.
+    """
+    sources_dir = IMAGE_CACHE_DIR / "sources"
+    sources_dir.mkdir(parents=True, exist_ok=True)
+    semaphore = asyncio.Semaphore(MAX_IMAGE_DOWNLOADS)
+
+    async def download(url: str) -> tuple[str, str | None]:
+        path = sources_dir / hashlib.sha256(url.encode()).hexdigest()
+        if path.exists():
+            return url, str(path)
+
+        async with semaphore:
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                print(f"Failed to download image {url}: {e}")
+                return url, None
+
+        partial_path = path.with_suffix(".partial")
+        partial_path.write_bytes(response.content)
+        os.replace(partial_path, path)
+        return url, str(path)
+
+    async with httpx.AsyncClient(
+        http2=True, timeout=60.0, follow_redirects=True
+    ) as client:
+        downloads = await asyncio.gather(*(download(url) for url in urls))
+
+    return {url: path for url, path in downloads if path}
+
+
+async def async_optimize_images(
+    sources: list[str],
+    settings: ImageSettings | None = None,
+    max_workers: int | None = None,
+) -> dict[str, str]:
+    """
+    Resizes and re-encodes catalog images on a process pool.
+
+    Remote images are downloaded first. Outputs are cached on disk under the
+    hash of the source content and the settings, so every image is
+    transcoded once, whatever the number of stores or runs using it.
+    Args:
+        sources (list[str]): Image URLs or local file paths.
+        settings (ImageSettings | None): Output format, quality and size,
+            read from the environment by default.
+        max_workers (int | None): Worker processes, one per CPU by default.
+    Returns:
+        dict[str, str]: The optimized file of each source that could be
+            transcoded; the others should be uploaded as they are.
+    """
+    settings = settings or ImageSettings()
+    output_dir = IMAGE_CACHE_DIR / settings.key()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    remote = [
+        source for source in sources if source.startswith(("http://", "https://"))
+    ]
+    local_paths = await _download_images(remote)
+    for source in sources:
+        if source not in local_paths and os.path.isfile(source):
+            local_paths[source] = source
+
+    optimized = {}
+    pending = {}
+    for source, path in local_paths.items():
+        with open(path, "rb") as file:
+            digest = hashlib.file_digest(file, "sha256").hexdigest()
+        output_path = output_dir / f"{digest}.{IMAGE_EXTENSIONS[settings.format]}"
+        if output_path.exists():
+            optimized[source] = str(output_path)
+        else:
+            pending.setdefault(str(output_path), []).append((source, path))
+
+    print(
+        f"Images: {len(pending)} to transcode, "
+        f"{len(optimized)} already in the cache."
+    )
+
+    if not pending:
+        return optimized
+
+    loop = asyncio.get_running_loop()
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = {
+            output_path: loop.run_in_executor(
+                executor, transcode_image, sources_paths[0][1], output_path, settings
+            )
+            for output_path, sources_paths in pending.items()
+        }
+        for output_path, future in futures.items():
+            try:
+                await future
+            except Exception as e:
+                print(f"Failed to transcode {pending[output_path][0][0]}: {e}")
+                continue
+            for source, _ in pending[output_path]:
+                optimized[source] = output_path
+
+    return optimized
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import time
+import typing
+
+import httpx
+
+from services.graphql.admin_api import get_max_concurrency
+from services.graphql.batching import async_run_batched_mutations, get_batch_size
+from services.graphql.client import get_store_client
+from services.graphql.queries import PUBLISH_PRODUCT_MUTATION
+from services.s_products import (
+    UploadMode,
+    async_iter_products,
+    async_upload_product,
+    async_upload_product_set,
+)
+from services.store_state import (
+    PRODUCT,
+    get_published_ids,
+    get_resource_ids,
+    record_published,
+    record_resources,
+)
+
+# products waiting between two stages, per create worker
+PIPELINE_QUEUE_FACTOR = int(os.getenv("PIPELINE_QUEUE_FACTOR", "2"))
+PUBLISH_WORKERS = 2
+# seconds between two progress reports
+PROGRESS_INTERVAL = 10.0
+
+
+class StageCounter:
+    """
+    Throughput of one pipeline stage, from its first item to its last.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.failed = 0
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    def add(self, count: int = 1, failed: int = 0):
+        now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = now
+        self.finished_at = now
+        self.count += count
+        self.failed += failed
+
+    def rate(self) -> float:
+        if self.started_at is None or self.finished_at == self.started_at:
+            return 0.0
+        return self.count / (self.finished_at - self.started_at)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.count} done, {self.failed} failed, "
+            f"{self.rate():.1f}/s"
+        )
+
+
+async def async_upload_and_publish_products(
+    store_url: str,
+    access_token: str,
+    products: typing.Iterable[dict],
+    publication_ids: list[str],
+    max_concurrency: int | None = None,
+    mode: UploadMode = "create",
+) -> list[str]:
+    """
+    Creates and publishes products as a streaming pipeline.
+
+    Products flow compile -> create -> publish through bounded queues: the
+    create workers pull products while the catalog is still being read, and
+    every created product is handed to the publish workers, which send the
+    ready ones in aliased batches to all the publications. Full queues stall
+    the previous stage, so memory stays bounded and publishing finishes
+    shortly after the last create. Products and publications recorded in the
+    store state are not created or published again.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        products (Iterable[dict]): Products compiled by `services.catalog`,
+            e.g. streamed by `iter_catalog`, which is read in a worker thread.
+        publication_ids (list[str]): Publications to publish the products to.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+        mode (UploadMode): "set" creates each product with a single productSet.
+    Returns:
+        list[str]: The IDs of the products in the store, in catalog order.
+    """
+    max_concurrency = max_concurrency or get_max_concurrency(store_url)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    upload_product_async = (
+        async_upload_product_set if mode == "set" else async_upload_product
+    )
+
+    known_ids = get_resource_ids(store_url, PRODUCT)
+    published_ids = {
+        publication_id: get_published_ids(store_url, publication_id)
+        for publication_id in publication_ids
+    }
+
+    create_queue = asyncio.Queue(maxsize=max_concurrency * PIPELINE_QUEUE_FACTOR)
+    publish_queue = asyncio.Queue(maxsize=max_concurrency * PIPELINE_QUEUE_FACTOR)
+    counters = [
+        StageCounter("compile"),
+        StageCounter("create"),
+        StageCounter("publish"),
+    ]
+    compiled, created, published = counters
+    products_id: dict[int, str] = {}
+
+    async def compile_stage():
+        index = 0
+        async for product in async_iter_products(products):
+            compiled.add()
+            await create_queue.put((index, product))
+            index += 1
+        for _ in range(max_concurrency):
+            await create_queue.put(None)
+
+    async def create_stage():
+        while (item := await create_queue.get()) is not None:
+            index, product = item
+            product_id = known_ids.get(product["handle"])
+            if product_id is None:
+                try:
+                    result = await upload_product_async(
+                        client, store_url, access_token, product, semaphore
+                    )
+                except (ValueError, httpx.HTTPError) as e:
+                    # one rejected product must not cancel the other workers
+                    print(f"Failed to create product {product['title']}: {e}")
+                    created.add(0, failed=1)
+                    continue
+
+                product_id = result["product"]["id"]
+                record_resources(store_url, PRODUCT, [(product["handle"], product_id)])
+
+            created.add()
+            products_id[index] = product_id
+            await publish_queue.put(product_id)
+
+    async def publish_stage():
+        batch_size = get_batch_size(store_url, PUBLISH_PRODUCT_MUTATION)
+        finished = False
+        while not finished:
+            product_ids = []
+            # wait for one product, then take whatever else is ready
+            while len(product_ids) < batch_size:
+                if product_ids and publish_queue.empty():
+                    break
+                if (product_id := await publish_queue.get()) is None:
+                    finished = True
+                    break
+                product_ids.append(product_id)
+
+            if product_ids:
+                await publish_products(product_ids)
+
+    async def publish_products(product_ids: list[str]):
+        items = []
+        for product_id in product_ids:
+            pending = [
+                publication_id
+                for publication_id, published_to in published_ids.items()
+                if product_id not in published_to
+            ]
+            if pending:
+                items.append(
+                    {
+                        "input": {
+                            "id": product_id,
+                            "productPublications": [
+                                {"publicationId": publication_id}
+                                for publication_id in pending
+                            ],
+                        }
+                    }
+                )
+        if not items:
+            published.add(len(product_ids))
+            return
+
+        results = await async_run_batched_mutations(
+            client,
+            store_url,
+            access_token,
+            PUBLISH_PRODUCT_MUTATION,
+            items,
+            semaphore,
+        )
+        failed = 0
+        for item, result in zip(items, results):
+            product_id = item["input"]["id"]
+            if not result:
+                print(f"Failed to publish product {product_id}.")
+                failed += 1
+                continue
+            for publication in item["input"]["productPublications"]:
+                record_published(store_url, [product_id], publication["publicationId"])
+        published.add(len(product_ids) - failed, failed)
+
+    async def close_publish_stage(create_tasks: list[asyncio.Task]):
+        await asyncio.gather(*create_tasks)
+        for _ in range(PUBLISH_WORKERS):
+            await publish_queue.put(None)
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            print(" | ".join(str(counter) for counter in counters))
+
+    client = get_store_client(store_url, access_token).async_client
+    reporter = asyncio.create_task(report_progress())
+    try:
+        async with asyncio.TaskGroup() as group:
+            group.create_task(compile_stage())
+            create_tasks = [
+                group.create_task(create_stage()) for _ in range(max_concurrency)
+            ]
+            for _ in range(PUBLISH_WORKERS):
+                group.create_task(publish_stage())
+            group.create_task(close_publish_stage(create_tasks))
+    finally:
+        reporter.cancel()
+
+    for counter in counters:
+        print(counter)
+
+    return [products_id[index] for index in sorted(products_id)]
@@ -1,15 +1,104 @@
+import asyncio
+
 import httpx
 
-from services.graphql.admin_api import graphql_request
+from services.graphql.admin_api import (
+    async_graphql_request,
+    get_max_concurrency,
+    graphql_request,
+)
+from services.graphql.batching import (
+    async_run_batched_mutations,
+    run_batched_mutations,
+)
+from services.graphql.client import get_store_client
 from services.graphql.queries import (
     ADD_PRODUCT_COLLECTION_QUERY,
+    ADD_PRODUCTS_COLLECTION_MUTATION,
     CREATE_COLLECTION_QUERY,
+    PUBLISH_COLLECTION_MUTATION,
     PUBLISH_COLLECTION_QUERY,
 )
+from services.store_state import (
+    COLLECTION,
+    PRODUCT,
+    get_published_ids,
+    get_resource_ids,
+    record_published,
+    record_resources,
+)
+
+# collectionAddProducts accepts at most 250 product IDs per call
+MAX_COLLECTION_ADD_SIZE = 250
+
+# rule keys of the collections JSON -> CollectionRuleColumn
+RULE_COLUMNS = {
+    "tag": "TAG",
+    "type": "TYPE",
+    "product_type": "TYPE",
+    "vendor": "VENDOR",
+    "title": "TITLE",
+}
+
+
+def build_rule_set(collection: dict) -> dict | None:
+    """
+    Builds the `ruleSet` of an automated collection from its JSON entry.
+
+    Rules are given either in the API's shape or as shorthands:
+        {"name": "Sale", "rules": [{"tag": "sale", "vendor": "Acme"}]}
+        {"name": "Mugs", "rules": [
+            {"column": "type", "relation": "contains", "condition": "mug"}
+        ], "disjunctive": true}
+    Args:
+        collection (dict): An entry of the collections JSON.
+    Returns:
+        dict | None: The rule set, None for a manual collection.
+    Raises:
+        ValueError: When a rule in the API's shape has no condition.
+    """
+    rules = []
+    for rule in collection.get("rules") or []:
+        if "column" in rule:
+            if "condition" not in rule:
+                raise ValueError(
+                    f"Rule {rule} of collection '{collection.get('name')}' "
+                    "has no condition."
+                )
+            expanded = [rule]
+        else:
+            # a shorthand gives one rule per column, sharing its relation
+            relation = rule.get("relation", "equals")
+            expanded = [
+                {"column": column, "relation": relation, "condition": condition}
+                for column, condition in rule.items()
+                if column != "relation"
+            ]
+
+        for item in expanded:
+            rules.append(
+                {
+                    "column": RULE_COLUMNS.get(item["column"].lower(), item["column"]),
+                    "relation": item.get("relation", "equals").upper(),
+                    "condition": str(item["condition"]),
+                }
+            )
+
+    if not rules:
+        return None
+
+    return {
+        "appliedDisjunctively": bool(collection.get("disjunctive", False)),
+        "rules": rules,
+    }
 
 
 def create_collection(
-    client: httpx.Client, store_url: str, access_token: str, title: str
+    client: httpx.Client,
+    store_url: str,
+    access_token: str,
+    title: str,
+    rule_set: dict | None = None,
 ) -> str:
     """
     Creates a collection in the Shopify store.
@@ -17,8 +106,12 @@ def create_collection(
         store_url (str): The URL of the Shopify store.
         access_token (str): The access token for the Shopify store.
         title (str): The title of the collection.
+        rule_set (dict | None): Makes it an automated collection, whose
+            products Shopify matches itself. See `build_rule_set`.
     Returns:
         str: The ID of the created collection.
+    Raises:
+        ValueError: When Shopify rejected the collection, with its user errors.
     """
     if not store_url or not access_token or not title:
         raise ValueError("Shop URL, access token, and title must be provided.")
@@ -28,13 +121,48 @@ def create_collection(
         store_url,
         access_token,
         CREATE_COLLECTION_QUERY,
-        {"input": {"title": title}},
+        {"input": _collection_input(title, rule_set)},
     )
-    if not data.get("data"):
+    return _created_collection_id(data, title)
+
+
+def _created_collection_id(data: dict, title: str) -> str:
+    created = (data.get("data") or {}).get("collectionCreate") or {}
+    if not created.get("collection") or created.get("userErrors"):
         print(f"Failed to create collection '{title}'. Response: {data}")
-        raise ValueError("Collection creation failed")
+        errors = [error["message"] for error in created.get("userErrors") or []]
+        raise ValueError("; ".join(errors) or "Collection creation failed")
+
+    return created["collection"]["id"]
+
 
-    return data["data"]["collectionCreate"]["collection"]["id"]
+def _collection_input(title: str, rule_set: dict | None) -> dict:
+    collection_input = {"title": title}
+    if rule_set:
+        collection_input["ruleSet"] = rule_set
+    return collection_input
+
+
+async def async_create_collection(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    title: str,
+    semaphore: asyncio.Semaphore | None = None,
+    rule_set: dict | None = None,
+) -> str:
+    if not store_url or not access_token or not title:
+        raise ValueError("Shop URL, access token, and title must be provided.")
+
+    data = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        CREATE_COLLECTION_QUERY,
+        {"input": _collection_input(title, rule_set)},
+        semaphore=semaphore,
+    )
+    return _created_collection_id(data, title)
 
 
 def publish_collection(
@@ -59,6 +187,30 @@ def publish_collection(
     return data["data"]["collectionPublish"]["collection"]["id"]
 
 
+async def async_publish_collection(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    collection_id: str,
+    publication_id: str,
+    semaphore: asyncio.Semaphore | None = None,
+):
+    data = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        PUBLISH_COLLECTION_QUERY,
+        {
+            "input": {
+                "id": collection_id,
+                "collectionPublications": {"publicationId": publication_id},
+            }
+        },
+        semaphore=semaphore,
+    )
+    return data["data"]["collectionPublish"]["collection"]["id"]
+
+
 def add_product_to_collection(
     client: httpx.Client, store_url: str, access_token: str, product_id, collection_id
 ):
@@ -84,22 +236,31 @@ def upload_collections(
         list[str]: A list of collection IDs that were successfully created.
     """
     collections_id = []
+    known_ids = get_resource_ids(store_url, COLLECTION)
 
-    with httpx.Client() as client:
-        for collection in collections:
-            title = collection.get("name")
-            if not title:
-                print("Collection title is required.")
-                continue
+    client = get_store_client(store_url, access_token).client
+    for collection in collections:
+        title = collection.get("name")
+        if not title:
+            print("Collection title is required.")
+            continue
 
-            collection_id = create_collection(client, store_url, access_token, title)
+        if collection_id := known_ids.get(title):
+            collections_id.append(collection_id)
+            print(f"Collection '{title}' already created with ID: {collection_id}")
+            continue
 
-            if not collection_id:
-                print(f"Failed to create collection '{title}'.")
-                continue
+        try:
+            collection_id = create_collection(
+                client, store_url, access_token, title, build_rule_set(collection)
+            )
+        except ValueError as e:
+            print(f"Failed to create collection '{title}': {e}")
+            continue
 
-            collections_id.append(collection_id)
-            print(f"Collection '{title}' created with ID: {collection_id}")
+        record_resources(store_url, COLLECTION, [(title, collection_id)])
+        collections_id.append(collection_id)
+        print(f"Collection '{title}' created with ID: {collection_id}")
 
     return collections_id
 
@@ -108,7 +269,8 @@ def publish_collections(
     store_url: str, access_token: str, collection_ids: list[str], publication_id: str
 ) -> list[str]:
     """
-    Publishes a list of collections in the Shopify store.
+    Publishes a list of collections in the Shopify store, packing the
+    mutations into aliased batches.
     Args:
         store_url (str): The URL of the Shopify store.
         access_token (str): The access token for the Shopify store.
@@ -117,17 +279,317 @@ def publish_collections(
     Returns:
         list[str]: A list of published collection IDs.
     """
+    already_published = get_published_ids(store_url, publication_id)
+    pending_ids = [
+        collection_id
+        for collection_id in collection_ids
+        if collection_id not in already_published
+    ]
+    items = [
+        {
+            "input": {
+                "id": collection_id,
+                "collectionPublications": {"publicationId": publication_id},
+            }
+        }
+        for collection_id in pending_ids
+    ]
+
+    client = get_store_client(store_url, access_token).client
+    results = run_batched_mutations(
+        client, store_url, access_token, PUBLISH_COLLECTION_MUTATION, items
+    )
+
+    published_ids = _published_collection_ids(
+        store_url, publication_id, pending_ids, results
+    )
+    return [
+        collection_id
+        for collection_id in collection_ids
+        if collection_id in already_published
+    ] + published_ids
+
+
+def _published_collection_ids(
+    store_url: str,
+    publication_id: str,
+    collection_ids: list[str],
+    results: list[dict | None],
+) -> list[str]:
     published_collection_ids = []
-    with httpx.Client() as client:
-        for collection_id in collection_ids:
-            published_id = publish_collection(
-                client, store_url, access_token, collection_id, publication_id
-            )
+    for collection_id, result in zip(collection_ids, results):
+        if not result:
+            print(f"Failed to publish collection with ID {collection_id}.")
+            continue
 
-            if not published_id:
-                print(f"Failed to publish collection with ID {collection_id}.")
-                continue
-            published_collection_ids.append(published_id)
-            print(f"Collection with ID {collection_id} published successfully.")
+        published_collection_ids.append(result["collection"]["id"])
+        print(f"Collection with ID {collection_id} published successfully.")
 
+    record_published(store_url, published_collection_ids, publication_id)
     return published_collection_ids
+
+
+def add_products_to_collections(
+    store_url: str, access_token: str, assignments: list[tuple[str, str]]
+) -> int:
+    """
+    Adds products to manual collections. The products of each collection are
+    packed by up to 250 per `collectionAddProducts`, and those mutations into
+    aliased batches.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        assignments (list[tuple[str, str]]): (product ID, collection ID) pairs.
+    Returns:
+        int: The number of assignments that succeeded.
+    """
+    items = _collection_add_items(assignments)
+
+    client = get_store_client(store_url, access_token).client
+    results = run_batched_mutations(
+        client, store_url, access_token, ADD_PRODUCTS_COLLECTION_MUTATION, items
+    )
+
+    return _added_products_count(items, results)
+
+
+def _collection_add_items(assignments: list[tuple[str, str]]) -> list[dict]:
+    product_ids_by_collection: dict[str, list[str]] = {}
+    for product_id, collection_id in assignments:
+        product_ids_by_collection.setdefault(collection_id, []).append(product_id)
+
+    return [
+        {
+            "collectionId": collection_id,
+            "productIds": product_ids[start : start + MAX_COLLECTION_ADD_SIZE],
+        }
+        for collection_id, product_ids in product_ids_by_collection.items()
+        for start in range(0, len(product_ids), MAX_COLLECTION_ADD_SIZE)
+    ]
+
+
+def _added_products_count(items: list[dict], results: list[dict | None]) -> int:
+    added = 0
+    for item, result in zip(items, results):
+        if not result:
+            print(f"Failed to add products to collection {item['collectionId']}.")
+            continue
+        added += len(item["productIds"])
+
+    return added
+
+
+async def async_add_products_to_collections(
+    store_url: str,
+    access_token: str,
+    assignments: list[tuple[str, str]],
+    max_concurrency: int | None = None,
+) -> int:
+    """
+    Async counterpart of `add_products_to_collections`.
+    """
+    max_concurrency = max_concurrency or get_max_concurrency(store_url)
+    items = _collection_add_items(assignments)
+
+    client = get_store_client(store_url, access_token).async_client
+    results = await async_run_batched_mutations(
+        client,
+        store_url,
+        access_token,
+        ADD_PRODUCTS_COLLECTION_MUTATION,
+        items,
+        asyncio.Semaphore(max_concurrency),
+    )
+
+    return _added_products_count(items, results)
+
+
+async def async_assign_collection_products(
+    store_url: str, access_token: str, collections: list[dict]
+) -> int:
+    """
+    Adds the products listed by handle under "products" in the manual
+    collections of the collections JSON, resolving both IDs from the store
+    state. Automated collections (with "rules") are left to Shopify.
+    Returns:
+        int: The number of products added.
+    """
+    collection_ids = get_resource_ids(store_url, COLLECTION)
+    product_ids = get_resource_ids(store_url, PRODUCT)
+
+    assignments = [
+        (product_ids[handle], collection_ids[collection["name"]])
+        for collection in collections
+        if not collection.get("rules") and collection.get("name") in collection_ids
+        for handle in collection.get("products") or []
+        if handle in product_ids
+    ]
+    if not assignments:
+        return 0
+
+    return await async_add_products_to_collections(store_url, access_token, assignments)
+
+
+async def async_upload_collections(
+    store_url: str,
+    access_token: str,
+    collections: list[dict],
+    max_concurrency: int | None = None,
+    publication_ids: list[str] | None = None,
+) -> list[str]:
+    """
+    Uploads a list of collections to the Shopify store concurrently.
+
+    With `publication_ids`, each collection is published to all of them as
+    soon as it exists, in the same task, so creates and publishes overlap
+    under the rate limiter instead of running as two passes. Publications
+    already recorded in the store state are skipped.
+    Args:
+        store_url (str): The url of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        collections (list[dict]): A list of collections to upload.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+        publication_ids (list[str] | None): Publications to publish the
+            collections to.
+    Returns:
+        list[str]: A list of collection IDs that were successfully created.
+    """
+    max_concurrency = max_concurrency or get_max_concurrency(store_url)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    known_ids = get_resource_ids(store_url, COLLECTION)
+    published_ids = {
+        publication_id: get_published_ids(store_url, publication_id)
+        for publication_id in publication_ids or []
+    }
+
+    async def publish(title: str, collection_id: str):
+        pending = [
+            publication_id
+            for publication_id, published in published_ids.items()
+            if collection_id not in published
+        ]
+        if not pending:
+            return
+
+        data = await async_graphql_request(
+            client,
+            store_url,
+            access_token,
+            PUBLISH_COLLECTION_QUERY,
+            {
+                "input": {
+                    "id": collection_id,
+                    "collectionPublications": [
+                        {"publicationId": publication_id} for publication_id in pending
+                    ],
+                }
+            },
+            semaphore=semaphore,
+        )
+        result = (data.get("data") or {}).get("collectionPublish") or {}
+        if not result.get("collection") or result.get("userErrors"):
+            print(f"Failed to publish collection '{title}'. Response: {data}")
+            return
+
+        for publication_id in pending:
+            record_published(store_url, [collection_id], publication_id)
+        print(f"Collection '{title}' published to {len(pending)} publication(s).")
+
+    async def upload(collection: dict) -> str | None:
+        title = collection["name"]
+        if collection_id := known_ids.get(title):
+            print(f"Collection '{title}' already created with ID: {collection_id}")
+            await publish(title, collection_id)
+            return collection_id
+
+        try:
+            collection_id = await async_create_collection(
+                client,
+                store_url,
+                access_token,
+                title,
+                semaphore,
+                rule_set=build_rule_set(collection),
+            )
+        except ValueError as e:
+            # one invalid collection must not cancel the others
+            print(f"Failed to create collection '{title}': {e}")
+            return None
+
+        record_resources(store_url, COLLECTION, [(title, collection_id)])
+        print(f"Collection '{title}' created with ID: {collection_id}")
+        await publish(title, collection_id)
+        return collection_id
+
+    named_collections = []
+    for collection in collections:
+        if not collection.get("name"):
+            print("Collection title is required.")
+            continue
+        named_collections.append(collection)
+
+    client = get_store_client(store_url, access_token).async_client
+    collections_id = await asyncio.gather(
+        *(upload(collection) for collection in named_collections)
+    )
+
+    return [collection_id for collection_id in collections_id if collection_id]
+
+
+async def async_publish_collections(
+    store_url: str,
+    access_token: str,
+    collection_ids: list[str],
+    publication_id: str,
+    max_concurrency: int | None = None,
+) -> list[str]:
+    """
+    Publishes a list of collections in the Shopify store concurrently.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        collection_ids (list[str]): A list of collection IDs to publish.
+        publication_id (str): The ID of the publication to publish the collections to.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+    Returns:
+        list[str]: A list of published collection IDs.
+    """
+    max_concurrency = max_concurrency or get_max_concurrency(store_url)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    already_published = get_published_ids(store_url, publication_id)
+    pending_ids = [
+        collection_id
+        for collection_id in collection_ids
+        if collection_id not in already_published
+    ]
+    items = [
+        {
+            "input": {
+                "id": collection_id,
+                "collectionPublications": {"publicationId": publication_id},
+            }
+        }
+        for collection_id in pending_ids
+    ]
+
+    client = get_store_client(store_url, access_token).async_client
+    results = await async_run_batched_mutations(
+        client,
+        store_url,
+        access_token,
+        PUBLISH_COLLECTION_MUTATION,
+        items,
+        semaphore,
+    )
+
+    published_ids = _published_collection_ids(
+        store_url, publication_id, pending_ids, results
+    )
+    return [
+        collection_id
+        for collection_id in collection_ids
+        if collection_id in already_published
+    ] + published_ids
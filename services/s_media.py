@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import pathlib
+import time
+
+import httpx
+
+from services.graphql.admin_api import async_graphql_request, get_max_concurrency
+from services.graphql.client import get_store_client
+from services.graphql.queries import (
+    FILE_CREATE_QUERY,
+    FILE_STATUS_QUERY,
+    STAGED_UPLOADS_CREATE_QUERY,
+)
+from services.images import async_optimize_images
+from services.store_state import MEDIA, get_resource_ids, record_resources
+
+# fileCreate and stagedUploadsCreate accept at most 250 inputs per call
+MAX_FILES_PER_CALL = 250
+# seconds to wait for Shopify to process created files before giving up on them
+FILE_READY_TIMEOUT = float(os.getenv("FILE_READY_TIMEOUT", "120"))
+FILE_POLL_MIN_INTERVAL = 0.5
+FILE_POLL_MAX_INTERVAL = 5.0
+
+
+def is_remote(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+
+def media_key(source: str) -> str:
+    """
+    Returns the dedupe key of an image: its URL, or the hash of its content
+    for local files, so copies under different names are uploaded once.
+    """
+    if is_remote(source):
+        return source
+
+    with open(source, "rb") as file:
+        return "sha256:" + hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def catalog_media_sources(products: list[dict]) -> list[str]:
+    """
+    Returns every image referenced by the compiled products, once each.
+    """
+    sources = {}
+    for product in products:
+        for file in product["set"]["files"]:
+            sources[file["originalSource"]] = None
+        for variant in product["set"]["variants"]:
+            if "file" in variant:
+                sources[variant["file"]["originalSource"]] = None
+    return list(sources)
+
+
+async def _stage_local_files(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    file_paths: list[str],
+    semaphore: asyncio.Semaphore,
+) -> list[str | None]:
+    """
+    Uploads local images to Shopify's staged storage with concurrent PUTs.
+    Returns:
+        list[str | None]: The resource URL of each file, None when it failed.
+    """
+    data = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        STAGED_UPLOADS_CREATE_QUERY,
+        {
+            "input": [
+                {
+                    "resource": "IMAGE",
+                    "filename": os.path.basename(file_path),
+                    "mimeType": mimetypes.guess_type(file_path)[0] or "image/jpeg",
+                    "fileSize": str(os.path.getsize(file_path)),
+                    "httpMethod": "PUT",
+                }
+                for file_path in file_paths
+            ]
+        },
+        semaphore=semaphore,
+    )
+    staged = (data.get("data") or {}).get("stagedUploadsCreate") or {}
+    if not staged.get("stagedTargets") or staged.get("userErrors"):
+        print(f"Failed to stage media upload. Response: {data}")
+        raise ValueError("Staged upload creation failed")
+
+    # the staged targets are not Shopify, they must not receive the store headers
+    async with httpx.AsyncClient(http2=True, timeout=None) as storage_client:
+
+        async def put(file_path: str, target: dict) -> str | None:
+            headers = {param["name"]: param["value"] for param in target["parameters"]}
+            async with semaphore:
+                response = await storage_client.put(
+                    target["url"],
+                    content=pathlib.Path(file_path).read_bytes(),
+                    headers=headers,
+                )
+            if response.is_error:
+                print(f"Failed to upload {file_path}: {response.status_code}")
+                return None
+            return target["resourceUrl"]
+
+        return await asyncio.gather(
+            *(
+                put(file_path, target)
+                for file_path, target in zip(file_paths, staged["stagedTargets"])
+            )
+        )
+
+
+async def _create_files(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    sources: list[str],
+    semaphore: asyncio.Semaphore,
+) -> list[str | None]:
+    data = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        FILE_CREATE_QUERY,
+        {
+            "files": [
+                {"originalSource": source, "contentType": "IMAGE"} for source in sources
+            ]
+        },
+        semaphore=semaphore,
+    )
+    result = (data.get("data") or {}).get("fileCreate") or {}
+    if result.get("userErrors") or len(result.get("files") or []) != len(sources):
+        print(f"Failed to create files. Response: {data}")
+        return [None] * len(sources)
+
+    return [file["id"] for file in result["files"]]
+
+
+async def _wait_for_files(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    file_ids: list[str | None],
+    semaphore: asyncio.Semaphore,
+) -> list[str | None]:
+    """
+    Polls the status of created files until Shopify has processed them, as
+    products can only reference READY files.
+    Returns:
+        list[str | None]: The ID of each file, None when it failed or was
+            still not ready after FILE_READY_TIMEOUT.
+    """
+    pending = {file_id for file_id in file_ids if file_id}
+    ready = set()
+    deadline = time.monotonic() + FILE_READY_TIMEOUT
+    interval = FILE_POLL_MIN_INTERVAL
+
+    while pending:
+        data = await async_graphql_request(
+            client,
+            store_url,
+            access_token,
+            FILE_STATUS_QUERY,
+            {"ids": list(pending)},
+            semaphore=semaphore,
+        )
+        for node in (data.get("data") or {}).get("nodes") or []:
+            if not node or node["id"] not in pending:
+                continue
+            if node["fileStatus"] == "READY":
+                ready.add(node["id"])
+                pending.discard(node["id"])
+            elif node["fileStatus"] == "FAILED":
+                print(f"Shopify failed to process file {node['id']}: {node}")
+                pending.discard(node["id"])
+
+        if not pending:
+            break
+        if time.monotonic() >= deadline:
+            print(f"{len(pending)} files still not ready, using their sources.")
+            break
+        await asyncio.sleep(interval)
+        interval = min(interval * 1.5, FILE_POLL_MAX_INTERVAL)
+
+    return [file_id if file_id in ready else None for file_id in file_ids]
+
+
+async def async_upload_media(
+    store_url: str,
+    access_token: str,
+    sources: list[str],
+    max_concurrency: int | None = None,
+    optimize: bool = False,
+) -> dict[str, str]:
+    """
+    Registers images as Shopify files, each unique image only once.
+
+    Images are deduped by URL, local files by content hash, against each
+    other and against the media already recorded for the store. Local files
+    are uploaded through `stagedUploadsCreate`, then every new image is
+    registered with `fileCreate` and returned once Shopify reports it READY. With `optimize`, images are resized and
+    re-encoded first (see `services.images`) and their optimized copies are
+    uploaded instead.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        sources (list[str]): Image URLs or local file paths.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+        optimize (bool): Whether to upload optimized copies of the images.
+    Returns:
+        dict[str, str]: The file ID of each source that could be registered.
+    """
+    max_concurrency = max_concurrency or get_max_concurrency(store_url)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    known_ids = get_resource_ids(store_url, MEDIA)
+
+    # the file actually uploaded for each source
+    uploads = {source: source for source in sources}
+    if optimize:
+        uploads.update(await async_optimize_images(sources))
+
+    keys = {}
+    for source, upload in uploads.items():
+        if not is_remote(upload) and not os.path.isfile(upload):
+            print(f"Image {source} not found, skipping it.")
+            continue
+        keys[source] = media_key(upload)
+
+    # one source per unique image that is not registered yet
+    pending = {}
+    for source, key in keys.items():
+        if key not in known_ids:
+            pending.setdefault(key, uploads[source])
+    print(
+        f"Media: {len(pending)} to upload, "
+        f"{len(keys) - len(pending)} deduplicated or already uploaded."
+    )
+
+    client = get_store_client(store_url, access_token).async_client
+    chunks = [
+        list(pending.items())[start : start + MAX_FILES_PER_CALL]
+        for start in range(0, len(pending), MAX_FILES_PER_CALL)
+    ]
+
+    async def register(chunk: list[tuple[str, str]]):
+        sources = [source for _, source in chunk]
+        local = [source for source in sources if not is_remote(source)]
+        if local:
+            resource_urls = dict(
+                zip(
+                    local,
+                    await _stage_local_files(
+                        client, store_url, access_token, local, semaphore
+                    ),
+                )
+            )
+            sources = [resource_urls.get(source, source) for source in sources]
+            # local files whose upload failed have no resource URL
+            chunk = [
+                (key, source) for (key, _), source in zip(chunk, sources) if source
+            ]
+            sources = [source for _, source in chunk]
+
+        if not sources:
+            return
+
+        file_ids = await _create_files(
+            client, store_url, access_token, sources, semaphore
+        )
+        file_ids = await _wait_for_files(
+            client, store_url, access_token, file_ids, semaphore
+        )
+        created = [
+            (key, file_id) for (key, _), file_id in zip(chunk, file_ids) if file_id
+        ]
+        record_resources(store_url, MEDIA, created)
+        known_ids.update(created)
+
+    await asyncio.gather(*(register(chunk) for chunk in chunks))
+
+    return {source: known_ids[key] for source, key in keys.items() if key in known_ids}
+
+
+def attach_media(products: list[dict], file_ids: dict[str, str]) -> list[dict]:
+    """
+    Points compiled products at registered files instead of image URLs.
+    `productSet` inputs reference the files by ID; for `productCreate` the
+    files are listed under "file_ids" and attached after the product exists,
+    with their original media kept under "file_media" as a fallback. Images
+    without a file ID keep their original source.
+    Args:
+        products (list[dict]): Products compiled by `services.catalog`.
+        file_ids (dict[str, str]): File IDs by source, see `async_upload_media`.
+    Returns:
+        list[dict]: The products, updated in place.
+    """
+    for product in products:
+        product["set"]["files"] = [
+            (
+                {"id": file_ids[file["originalSource"]]}
+                if file["originalSource"] in file_ids
+                else file
+            )
+            for file in product["set"]["files"]
+        ]
+        for variant in product["set"]["variants"]:
+            source = variant.get("file", {}).get("originalSource")
+            if source in file_ids:
+                variant["file"] = {"id": file_ids[source]}
+
+        product["file_ids"] = [
+            file_ids[media["originalSource"]]
+            for media in product["media"]
+            if media["originalSource"] in file_ids
+        ]
+        # attached from their source instead if the references fail
+        product["file_media"] = [
+            media for media in product["media"] if media["originalSource"] in file_ids
+        ]
+        product["media"] = [
+            media
+            for media in product["media"]
+            if media["originalSource"] not in file_ids
+        ]
+
+    return products
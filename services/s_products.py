@@ -1,53 +1,258 @@
-from itertools import product
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import typing
 
 import httpx
-import pandas as pd
-from pandas.core.series import Series
 
-from services.graphql.admin_api import graphql_request
+from services.catalog_cache import load_catalog
+from services.graphql.admin_api import (
+    async_graphql_request,
+    get_max_concurrency,
+    graphql_request,
+)
+from services.graphql.batching import (
+    async_run_batched_mutations,
+    run_batched_mutations,
+)
+from services.graphql.bulk import (
+    iter_bulk_results,
+    run_bulk_mutation,
+    stage_bulk_upload,
+    wait_for_bulk_operation,
+)
+from services.graphql.client import get_store_client
 from services.graphql.queries import (  # NOQA: F401
     BULK_CREATE_VARIANTS_QUERY,
+    CREATE_PRODUCT_MEDIA_QUERY,
     CREATE_PRODUCT_QUERY,
+    FILE_UPDATE_QUERY,
+    PRODUCT_SET_QUERY,
+    PUBLISH_PRODUCT_MUTATION,
     PUBLISH_PRODUCT_QUERY,
 )
+from services.store_state import (
+    PRODUCT,
+    get_published_ids,
+    get_resource_ids,
+    record_published,
+    record_resources,
+)
 
+# "create" sends productCreate (+ productVariantsBulkCreate), "set" one productSet
+UploadMode = typing.Literal["create", "set"]
 
-def upload_product(
-    client: httpx.Client, store_url: str, access_token: str, row: Series
-) -> dict:
-    options = []
-    pos = 1
-    for i in range(1, 4):
-        option_name = row.get(f"Option{i} Name", "")
-        option_value = row.get(f"Option{i} Value", "")
-        if option_name and all(option_value):
-            options.append(
-                {
-                    "name": option_name,
-                    "position": pos,
-                    "values": [{"name": v} for v in option_value],
-                }
+# products pulled at once from a streamed catalog, off the event loop
+STREAM_BATCH_SIZE = 32
+
+
+async def async_iter_products(
+    products: typing.Iterable[dict],
+) -> typing.AsyncIterator[dict]:
+    """
+    Iterates compiled products on the event loop. Iterators, such as a
+    catalog streamed by `iter_catalog`, are advanced in a worker thread, so
+    parsing their next chunk does not stall the requests in flight.
+    """
+    if isinstance(products, typing.Sequence):
+        for product in products:
+            yield product
+        return
+
+    iterator = iter(products)
+    while batch := await asyncio.to_thread(
+        lambda: list(itertools.islice(iterator, STREAM_BATCH_SIZE))
+    ):
+        for product in batch:
+            yield product
+
+
+def build_variants_input(product_id: str, options: list[dict]) -> dict:
+    return {
+        "productId": product_id,
+        "variants": [
+            {"optionValues": [*combination]}
+            for i, combination in enumerate(
+                itertools.product(
+                    *[
+                        [{"optionName": opt["name"], **val} for val in opt["values"]]
+                        for opt in options
+                    ],
+                )
             )
-            pos += 1
-
-    # Build product input for GraphQL
-    product_input = {
-        "title": row["Title"],
-        "descriptionHtml": row["Body (HTML)"],
-        "vendor": row["Vendor"],
-        "productType": row["Type"],
-        "tags": [tag.strip() for tag in row.get("Tags", []) if tag.strip()],
-        "productOptions": options,
+            if i > 0
+        ],
     }
 
-    medias = [
-        {
-            "originalSource": img,
-            "mediaContentType": "IMAGE",
-        }
-        for img in [*row["Image Src"], *row["Variant Image"]]
-        if img
-    ]
+
+def build_file_references_input(product_id: str, file_ids: list[str]) -> dict:
+    return {
+        "files": [
+            {"id": file_id, "referencesToAdd": [product_id]} for file_id in file_ids
+        ]
+    }
+
+
+def upload_product_set(
+    client: httpx.Client, store_url: str, access_token: str, product: dict
+) -> dict:
+    """
+    Creates a product with its options, variants and media in one `productSet`.
+    Args:
+        product (dict): A product compiled by `services.catalog`.
+    Returns:
+        dict: The `productSet` payload.
+    """
+    result = graphql_request(
+        client,
+        store_url,
+        access_token,
+        PRODUCT_SET_QUERY,
+        {"input": product["set"], "synchronous": True},
+    )
+    if not ((result.get("data") or {}).get("productSet") or {}).get("product"):
+        print(f"Failed to set product '{product['title']}'. Response: {result}")
+        raise ValueError("Product creation failed")
+
+    return result["data"]["productSet"]
+
+
+async def async_upload_product_set(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    product: dict,
+    semaphore: asyncio.Semaphore | None = None,
+) -> dict:
+    result = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        PRODUCT_SET_QUERY,
+        {"input": product["set"], "synchronous": True},
+        semaphore=semaphore,
+    )
+    if not ((result.get("data") or {}).get("productSet") or {}).get("product"):
+        print(f"Failed to set product '{product['title']}'. Response: {result}")
+        raise ValueError("Product creation failed")
+
+    return result["data"]["productSet"]
+
+
+def _created_product(result: dict, product: dict) -> dict:
+    """
+    Returns the `productCreate` payload of a response.
+    Raises:
+        ValueError: When Shopify rejected the product, with its user errors.
+    """
+    created = (result.get("data") or {}).get("productCreate") or {}
+    if not created.get("product"):
+        print(f"Failed to create product '{product['title']}'. Response: {result}")
+        errors = [error["message"] for error in created.get("userErrors") or []]
+        raise ValueError("; ".join(errors) or "Product creation failed")
+
+    return created
+
+
+def _check_file_references(result: dict, product: dict) -> bool:
+    """
+    Reports a `fileUpdate` that did not attach the images of a product.
+    """
+    updated = (result.get("data") or {}).get("fileUpdate") or {}
+    if updated.get("userErrors") or len(updated.get("files") or []) != len(
+        product["file_ids"]
+    ):
+        print(f"Failed to attach images to '{product['title']}'. Response: {result}")
+        return False
+
+    return True
+
+
+def _check_product_media(result: dict, product: dict) -> bool:
+    created = (result.get("data") or {}).get("productCreateMedia") or {}
+    if created.get("mediaUserErrors") or not created.get("media"):
+        print(f"Failed to add images to '{product['title']}'. Response: {result}")
+        return False
+
+    return True
+
+
+def attach_files(
+    client: httpx.Client,
+    store_url: str,
+    access_token: str,
+    product_id: str,
+    product: dict,
+) -> bool:
+    """
+    Attaches the registered files of a product (see `services.s_media`),
+    falling back to creating its media from their original sources when
+    Shopify rejects the references.
+    Returns:
+        bool: Whether the product got its images.
+    """
+    result = graphql_request(
+        client,
+        store_url,
+        access_token,
+        FILE_UPDATE_QUERY,
+        build_file_references_input(product_id, product["file_ids"]),
+    )
+    if _check_file_references(result, product):
+        return True
+    if not product.get("file_media"):
+        return False
+
+    print(f"Adding the images of '{product['title']}' from their sources.")
+    result = graphql_request(
+        client,
+        store_url,
+        access_token,
+        CREATE_PRODUCT_MEDIA_QUERY,
+        {"productId": product_id, "media": product["file_media"]},
+    )
+    return _check_product_media(result, product)
+
+
+async def async_attach_files(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    product_id: str,
+    product: dict,
+    semaphore: asyncio.Semaphore | None = None,
+) -> bool:
+    result = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        FILE_UPDATE_QUERY,
+        build_file_references_input(product_id, product["file_ids"]),
+        semaphore=semaphore,
+    )
+    if _check_file_references(result, product):
+        return True
+    if not product.get("file_media"):
+        return False
+
+    print(f"Adding the images of '{product['title']}' from their sources.")
+    result = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        CREATE_PRODUCT_MEDIA_QUERY,
+        {"productId": product_id, "media": product["file_media"]},
+        semaphore=semaphore,
+    )
+    return _check_product_media(result, product)
+
+
+def upload_product(
+    client: httpx.Client, store_url: str, access_token: str, product: dict
+) -> dict:
+    options = product["product"]["productOptions"]
 
     # GraphQL mutation
     result = graphql_request(
@@ -55,118 +260,312 @@ def upload_product(
         store_url,
         access_token,
         CREATE_PRODUCT_QUERY,
-        {"product": product_input, "media": medias},
+        {"product": product["product"], "media": product["media"]},
     )
 
+    created = _created_product(result, product)
+    p_id = created["product"]["id"]
+
     if len(options) > 1:
-        p_id = result["data"]["productCreate"]["product"]["id"]
         graphql_request(
             client,
             store_url,
             access_token,
             BULK_CREATE_VARIANTS_QUERY,
-            {
-                "productId": p_id,
-                "variants": [
-                    {"optionValues": [*combination]}
-                    for i, combination in enumerate(
-                        product(
-                            *[
-                                [
-                                    {"optionName": opt["name"], **val}
-                                    for val in opt["values"]
-                                ]
-                                for opt in options
-                            ],
-                        )
-                    )
-                    if i > 0
-                ],
-            },
+            build_variants_input(p_id, options),
+        )
+
+    # images already registered as files by `services.s_media`
+    if product.get("file_ids"):
+        attach_files(client, store_url, access_token, p_id, product)
+
+    return created
+
+
+async def async_upload_product(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    product: dict,
+    semaphore: asyncio.Semaphore | None = None,
+) -> dict:
+    options = product["product"]["productOptions"]
+
+    result = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        CREATE_PRODUCT_QUERY,
+        {"product": product["product"], "media": product["media"]},
+        semaphore=semaphore,
+    )
+
+    created = _created_product(result, product)
+    p_id = created["product"]["id"]
+
+    if len(options) > 1:
+        await async_graphql_request(
+            client,
+            store_url,
+            access_token,
+            BULK_CREATE_VARIANTS_QUERY,
+            build_variants_input(p_id, options),
+            semaphore=semaphore,
+        )
+
+    # images already registered as files by `services.s_media`
+    if product.get("file_ids"):
+        await async_attach_files(
+            client, store_url, access_token, p_id, product, semaphore
         )
 
-    return result["data"]["productCreate"]
+    return created
+
+
+def upload_products(
+    store_url: str,
+    access_token: str,
+    products: typing.Iterable[dict],
+    mode: UploadMode = "create",
+) -> list[str]:
+    """
+    Uploads compiled products one after the other.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        products (Iterable[dict]): Products compiled by `services.catalog`,
+            consumed lazily so a streamed catalog is uploaded while it is read.
+        mode (UploadMode): "set" creates each product with a single productSet.
+    Returns:
+        list[str]: The IDs of the created products.
+    """
+    products_id = []
+    upload = upload_product_set if mode == "set" else upload_product
+    known_ids = get_resource_ids(store_url, PRODUCT)
+
+    client = get_store_client(store_url, access_token).client
+    for counter, product in enumerate(products, start=1):
+        if product_id := known_ids.get(product["handle"]):
+            print(f"Product {counter} already created: {product['title']}")
+            products_id.append(product_id)
+            continue
+
+        print(f"Uploading product {counter}: {product['title']}")
+        created = upload(client, store_url, access_token, product)
+        product_id = created["product"]["id"]
+        record_resources(store_url, PRODUCT, [(product["handle"], product_id)])
+        products_id.append(product_id)
+
+    return products_id
 
 
 def upload_products_from_csv(
-    store_url: str, access_token: str, csv_file_path: str
+    store_url: str,
+    access_token: str,
+    csv_file_path: str,
+    mode: UploadMode = "create",
+    stream: bool = False,
 ) -> list[str]:
-    products = []
+    if stream:
+        # imported here so cached catalogs never pay for importing pandas
+        from services.catalog import iter_catalog
 
-    df = pd.read_csv(csv_file_path).fillna(value="")
+        products = iter_catalog(csv_file_path)
+    else:
+        products = load_catalog(csv_file_path).products
+    return upload_products(store_url, access_token, products, mode)
 
-    try:
-        grouped_df = (
-            df.groupby("Handle")
-            .aggregate(
-                {
-                    "Title": "first",
-                    "Body (HTML)": "first",
-                    "Vendor": "first",
-                    "Type": "first",
-                    "Tags": list,
-                    "Option1 Name": "first",
-                    "Option1 Value": lambda x: x.unique().tolist(),
-                    "Option2 Name": "first",
-                    "Option2 Value": lambda x: x.unique().tolist(),
-                    "Option3 Name": "first",
-                    "Option3 Value": lambda x: x.unique().tolist(),
-                    "Variant SKU": lambda x: x.unique().tolist(),
-                    "Variant Price": list,
-                    "Variant Requires Shipping": list,
-                    "Variant Taxable": list,
-                    "Variant Inventory Tracker": list,
-                    "Variant Inventory Policy": list,
-                    "Variant Fulfillment Service": list,
-                    "Variant Grams": list,
-                    "Variant Weight Unit": list,
-                    "Image Src": list,
-                    "Variant Image": list,
-                }
-            )
-            .reset_index()
+
+async def async_upload_products(
+    store_url: str,
+    access_token: str,
+    products: typing.Iterable[dict],
+    max_concurrency: int | None = None,
+    mode: UploadMode = "create",
+) -> list[str]:
+    """
+    Uploads compiled products concurrently.
+    Products are pulled from `products` only while fewer than twice the
+    concurrency are in flight, so a streamed catalog starts uploading with
+    its first chunk and is never held in memory as a whole.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        products (Iterable[dict]): Products compiled by `services.catalog`.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+        mode (UploadMode): "set" creates each product with a single productSet.
+    Returns:
+        list[str]: The IDs of the created products, in catalog order.
+    """
+    max_concurrency = max_concurrency or get_max_concurrency(store_url)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    upload_product_async = (
+        async_upload_product_set if mode == "set" else async_upload_product
+    )
+
+    known_ids = get_resource_ids(store_url, PRODUCT)
+
+    async def upload(counter: int, product: dict) -> str:
+        if product_id := known_ids.get(product["handle"]):
+            print(f"Product {counter} already created: {product['title']}")
+            return product_id
+
+        print(f"Uploading product {counter}: {product['title']}")
+        created = await upload_product_async(
+            client, store_url, access_token, product, semaphore
         )
+        product_id = created["product"]["id"]
+        record_resources(store_url, PRODUCT, [(product["handle"], product_id)])
+        return product_id
 
-    except KeyError:
-        grouped_df = (
-            df.groupby("Title")
-            .aggregate(
-                {
-                    "Body (HTML)": "first",
-                    "Vendor": "first",
-                    "Type": "first",
-                    "Tags": list,
-                    "Option1 Name": "first",
-                    "Option1 Value": lambda x: x.unique().tolist(),
-                    "Option2 Name": "first",
-                    "Option2 Value": lambda x: x.unique().tolist(),
-                    "Option3 Name": "first",
-                    "Option3 Value": lambda x: x.unique().tolist(),
-                    "Variant SKU": lambda x: x.unique().tolist(),
-                    "Variant Price": list,
-                    "Variant Requires Shipping": list,
-                    "Variant Taxable": list,
-                    "Variant Inventory Tracker": list,
-                    "Variant Inventory Policy": list,
-                    "Variant Fulfillment Service": list,
-                    "Variant Grams": list,
-                    "Variant Weight Unit": list,
-                    "Image Src": list,
-                    "Variant Image": list,
-                }
+    client = get_store_client(store_url, access_token).async_client
+    tasks = []
+    pending = set()
+    counter = 0
+    async for product in async_iter_products(products):
+        counter += 1
+        if len(pending) >= 2 * max_concurrency:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
             )
-            .reset_index()
+            for task in done:
+                task.result()
+        task = asyncio.create_task(upload(counter, product))
+        tasks.append(task)
+        pending.add(task)
+
+    return await asyncio.gather(*tasks)
+
+
+async def async_upload_products_from_csv(
+    store_url: str,
+    access_token: str,
+    csv_file_path: str,
+    max_concurrency: int | None = None,
+    mode: UploadMode = "create",
+    stream: bool = False,
+) -> list[str]:
+    if stream:
+        # imported here so cached catalogs never pay for importing pandas
+        from services.catalog import iter_catalog
+
+        products = iter_catalog(csv_file_path)
+    else:
+        products = load_catalog(csv_file_path).products
+    return await async_upload_products(
+        store_url,
+        access_token,
+        products,
+        max_concurrency=max_concurrency,
+        mode=mode,
+    )
+
+
+def bulk_upload_products(
+    store_url: str, access_token: str, products: list[dict], mode: UploadMode = "create"
+) -> list[str]:
+    """
+    Uploads compiled products with a single bulk operation.
+    The catalog is written as mutation variables to a JSONL file, staged and
+    run by `bulkOperationRunMutation`. In "create" mode variants of products
+    with more than one option are created afterwards, as in `upload_product`;
+    in "set" mode each line is a complete `productSet`. Products recorded as
+    created in `services.store_state` are left out of the operation.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        products (list[dict]): Products compiled by `services.catalog`.
+        mode (UploadMode): The mutation each JSONL line runs.
+    Returns:
+        list[str]: The IDs of the created products, in catalog order.
+    """
+    known_ids = get_resource_ids(store_url, PRODUCT)
+    catalog = products
+    products = [product for product in catalog if product["handle"] not in known_ids]
+    if not products:
+        return [known_ids[product["handle"]] for product in catalog]
+
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".jsonl", encoding="utf-8", delete=False
+    ) as file:
+        for product in products:
+            if mode == "set":
+                variables = {"input": product["set"], "synchronous": True}
+            else:
+                variables = {"product": product["product"], "media": product["media"]}
+            json.dump(variables, file)
+            file.write("\n")
+
+    products_id = [None] * len(products)
+
+    try:
+        client = get_store_client(store_url, access_token).client
+        staged_upload_path = stage_bulk_upload(
+            client, store_url, access_token, file.name
         )
+        operation_id = run_bulk_mutation(
+            client,
+            store_url,
+            access_token,
+            PRODUCT_SET_QUERY if mode == "set" else CREATE_PRODUCT_QUERY,
+            staged_upload_path,
+        )
+        print(f"Bulk operation {operation_id} started.")
 
-    counter = 0
-    with httpx.Client() as client:
-        for _, row in grouped_df.iterrows():
-            counter += 1
-            print(f"Uploading product {counter}: {row['Title']}")
-            product = upload_product(client, store_url, access_token, row)
-            products.append(product["product"]["id"])
+        operation = wait_for_bulk_operation(
+            client,
+            store_url,
+            access_token,
+            operation_id,
+            expected_count=len(products),
+        )
+
+        for result in iter_bulk_results(operation["url"]):
+            line = result["__lineNumber"]
+            data = result.get("data") or {}
+            created = data.get("productSet") or data.get("productCreate") or {}
+            if not created.get("product"):
+                print(f"Failed to create product on line {line}: {result}")
+                continue
+            products_id[line] = created["product"]["id"]
 
-    return products
+        for p_id, product in zip(products_id, products):
+            if mode != "create" or not p_id:
+                continue
+
+            options = product["product"]["productOptions"]
+            if len(options) > 1:
+                graphql_request(
+                    client,
+                    store_url,
+                    access_token,
+                    BULK_CREATE_VARIANTS_QUERY,
+                    build_variants_input(p_id, options),
+                )
+            if product.get("file_ids"):
+                attach_files(client, store_url, access_token, p_id, product)
+    finally:
+        os.remove(file.name)
+
+    created_ids = {
+        product["handle"]: p_id for p_id, product in zip(products_id, products) if p_id
+    }
+    record_resources(store_url, PRODUCT, created_ids.items())
+
+    return [
+        known_ids.get(product["handle"]) or created_ids[product["handle"]]
+        for product in catalog
+        if product["handle"] in known_ids or product["handle"] in created_ids
+    ]
+
+
+def bulk_upload_products_from_csv(
+    store_url: str, access_token: str, csv_file_path: str, mode: UploadMode = "create"
+) -> list[str]:
+    return bulk_upload_products(
+        store_url, access_token, load_catalog(csv_file_path).products, mode
+    )
 
 
 def publish_product(
@@ -209,7 +608,8 @@ def publish_products(
     store_url: str, access_token: str, product_ids: list[str], publication_id: str
 ):
     """
-    Publishes multiple products to the specified publication.
+    Publishes multiple products to the specified publication, packing the
+    mutations into aliased batches.
     Args:
         store_url (str): The URL of the Shopify store.
         access_token (str): The access token for the Shopify store.
@@ -218,12 +618,129 @@ def publish_products(
     Returns:
         list[str]: A list of IDs of the published products.
     """
+    already_published = get_published_ids(store_url, publication_id)
+    pending_ids = [
+        product_id for product_id in product_ids if product_id not in already_published
+    ]
+    items = [
+        {
+            "input": {
+                "id": product_id,
+                "productPublications": [{"publicationId": publication_id}],
+            }
+        }
+        for product_id in pending_ids
+    ]
+
+    client = get_store_client(store_url, access_token).client
+    results = run_batched_mutations(
+        client, store_url, access_token, PUBLISH_PRODUCT_MUTATION, items
+    )
+
+    published_ids = _published_product_ids(
+        store_url, publication_id, pending_ids, results
+    )
+    return [
+        product_id for product_id in product_ids if product_id in already_published
+    ] + published_ids
+
+
+def _published_product_ids(
+    store_url: str,
+    publication_id: str,
+    product_ids: list[str],
+    results: list[dict | None],
+) -> list[str]:
     published_product_ids = []
-    with httpx.Client() as client:
-        for product_id in product_ids:
-            published_product_id = publish_product(
-                client, store_url, access_token, product_id, publication_id
-            )
-            print(f"Product {product_id} published with ID: {published_product_id}")
-            published_product_ids.append(published_product_id)
+    for product_id, result in zip(product_ids, results):
+        if not result:
+            print(f"Failed to publish product {product_id}.")
+            continue
+
+        published_product_id = result["product"]["id"]
+        print(f"Product {product_id} published with ID: {published_product_id}")
+        published_product_ids.append(published_product_id)
+
+    record_published(store_url, published_product_ids, publication_id)
     return published_product_ids
+
+
+async def async_publish_product(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    product_id: str,
+    publication_id: str,
+    semaphore: asyncio.Semaphore | None = None,
+) -> str:
+    data = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        PUBLISH_PRODUCT_QUERY,
+        {
+            "input": {
+                "id": product_id,
+                "productPublications": [{"publicationId": publication_id}],
+            }
+        },
+        semaphore=semaphore,
+    )
+    if not data.get("data"):
+        print(f"Failed to publish product {product_id}. Response: {data}")
+        raise ValueError("Publishing failed")
+
+    return data["data"]["productPublish"]["product"]["id"]
+
+
+async def async_publish_products(
+    store_url: str,
+    access_token: str,
+    product_ids: list[str],
+    publication_id: str,
+    max_concurrency: int | None = None,
+) -> list[str]:
+    """
+    Publishes multiple products concurrently to the specified publication.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        product_ids (list[str]): A list of product IDs to publish.
+        publication_id (str): The ID of the publication to publish to.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+    Returns:
+        list[str]: A list of IDs of the published products.
+    """
+    max_concurrency = max_concurrency or get_max_concurrency(store_url)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    already_published = get_published_ids(store_url, publication_id)
+    pending_ids = [
+        product_id for product_id in product_ids if product_id not in already_published
+    ]
+    items = [
+        {
+            "input": {
+                "id": product_id,
+                "productPublications": [{"publicationId": publication_id}],
+            }
+        }
+        for product_id in pending_ids
+    ]
+
+    client = get_store_client(store_url, access_token).async_client
+    results = await async_run_batched_mutations(
+        client,
+        store_url,
+        access_token,
+        PUBLISH_PRODUCT_MUTATION,
+        items,
+        semaphore,
+    )
+
+    published_ids = _published_product_ids(
+        store_url, publication_id, pending_ids, results
+    )
+    return [
+        product_id for product_id in product_ids if product_id in already_published
+    ] + published_ids
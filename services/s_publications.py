@@ -0,0 +1,32 @@
+import contextlib
+
+from services.graphql.client import get_store_client
+from services.graphql.pagination import iter_connection
+from services.graphql.queries import PUBLICATIONS_QUERY
+
+ONLINE_STORE_PUBLICATION = "Online Store"
+
+
+async def async_get_publication_id(
+    store_url: str, access_token: str, name: str = ONLINE_STORE_PUBLICATION
+) -> str | None:
+    """
+    Finds a publication (sales channel) of the store by name.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        name (str): The name of the publication.
+    Returns:
+        str | None: The ID of the publication, None if the store has none.
+    """
+    client = get_store_client(store_url, access_token).async_client
+    async with contextlib.aclosing(
+        iter_connection(
+            client, store_url, access_token, PUBLICATIONS_QUERY, "publications"
+        )
+    ) as publications:
+        async for publication in publications:
+            if publication["name"] == name:
+                return publication["id"]
+
+    return None
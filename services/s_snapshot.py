@@ -0,0 +1,219 @@
+import json
+import os
+import pathlib
+import sqlite3
+import time
+import typing
+
+from dotenv import load_dotenv
+
+from services.graphql.bulk import (
+    iter_bulk_results,
+    run_bulk_query,
+    wait_for_bulk_operation,
+)
+from services.graphql.client import get_store_client
+from services.graphql.queries import (
+    COLLECTIONS_BULK_QUERY,
+    PRODUCTS_BULK_QUERY,
+    PUBLICATIONS_BULK_QUERY,
+)
+
+load_dotenv()
+
+SNAPSHOT_DIR = pathlib.Path(
+    os.getenv(
+        "SNAPSHOT_DIR",
+        pathlib.Path(__file__).parent.parent / ".cache" / "snapshots",
+    )
+)
+
+# rows written per executemany while the export streams in
+SNAPSHOT_WRITE_BATCH = 1000
+
+SNAPSHOT_SCHEMA = """
+CREATE TABLE snapshot (store_url TEXT, exported_at REAL);
+CREATE TABLE products (
+    id TEXT PRIMARY KEY,
+    handle TEXT,
+    title TEXT,
+    vendor TEXT,
+    product_type TEXT,
+    status TEXT,
+    updated_at TEXT,
+    data TEXT
+);
+CREATE TABLE variants (
+    id TEXT PRIMARY KEY,
+    product_id TEXT,
+    sku TEXT,
+    title TEXT,
+    price TEXT,
+    data TEXT
+);
+CREATE TABLE collections (
+    id TEXT PRIMARY KEY,
+    handle TEXT,
+    title TEXT,
+    updated_at TEXT,
+    data TEXT
+);
+CREATE TABLE publications (id TEXT PRIMARY KEY, name TEXT, data TEXT);
+CREATE INDEX products_handle ON products (handle);
+CREATE INDEX variants_product_id ON variants (product_id);
+CREATE INDEX variants_sku ON variants (sku);
+CREATE INDEX collections_handle ON collections (handle);
+CREATE INDEX collections_title ON collections (title);
+"""
+
+# resource type of the GID -> (table, columns read from the JSONL object)
+SNAPSHOT_TABLES = {
+    "Product": (
+        "products",
+        {
+            "id": "id",
+            "handle": "handle",
+            "title": "title",
+            "vendor": "vendor",
+            "product_type": "productType",
+            "status": "status",
+            "updated_at": "updatedAt",
+        },
+    ),
+    "ProductVariant": (
+        "variants",
+        {
+            "id": "id",
+            "product_id": "__parentId",
+            "sku": "sku",
+            "title": "title",
+            "price": "price",
+        },
+    ),
+    "Collection": (
+        "collections",
+        {"id": "id", "handle": "handle", "title": "title", "updated_at": "updatedAt"},
+    ),
+    "Publication": ("publications", {"id": "id", "name": "name"}),
+}
+
+
+def get_snapshot_path(store_url: str) -> pathlib.Path:
+    return SNAPSHOT_DIR / f"{store_url}.sqlite"
+
+
+def _insert_statement(table: str, columns: typing.Iterable[str]) -> str:
+    columns = [*columns, "data"]
+    return (
+        f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+
+
+def write_snapshot_rows(
+    connection: sqlite3.Connection, objects: typing.Iterable[dict]
+) -> int:
+    """
+    Writes bulk operation objects into the snapshot tables in batches, so
+    the export is never held in memory.
+    Args:
+        connection (sqlite3.Connection): The snapshot database.
+        objects (Iterable[dict]): Objects of a bulk operation JSONL result.
+    Returns:
+        int: The number of objects written.
+    """
+    pending: dict[str, list[tuple]] = {}
+    written = 0
+
+    def flush():
+        for resource, rows in pending.items():
+            table, columns = SNAPSHOT_TABLES[resource]
+            connection.executemany(_insert_statement(table, columns), rows)
+        pending.clear()
+
+    for obj in objects:
+        # gid://shopify/ProductVariant/1 -> ProductVariant
+        resource = obj.get("id", "").removeprefix("gid://shopify/").split("/")[0]
+        if resource not in SNAPSHOT_TABLES:
+            continue
+
+        _, columns = SNAPSHOT_TABLES[resource]
+        pending.setdefault(resource, []).append(
+            (*(obj.get(key) for key in columns.values()), json.dumps(obj))
+        )
+        written += 1
+        if written % SNAPSHOT_WRITE_BATCH == 0:
+            flush()
+
+    flush()
+    return written
+
+
+def export_store_snapshot(
+    store_url: str, access_token: str, snapshot_path: str | None = None
+) -> pathlib.Path:
+    """
+    Exports the store's products, variants, collections and publications
+    into a local SQLite snapshot indexed by ID and handle.
+
+    Each resource is exported with `bulkOperationRunQuery` and its JSONL
+    result is streamed line by line into the database, so a store of any
+    size costs a handful of requests. The snapshot replaces the previous one
+    only once it is complete.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        snapshot_path (str | None): Where to write the snapshot, under
+            SNAPSHOT_DIR by default.
+    Returns:
+        pathlib.Path: The path of the snapshot database.
+    """
+    snapshot_path = pathlib.Path(snapshot_path or get_snapshot_path(store_url))
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = snapshot_path.with_suffix(".partial")
+    partial_path.unlink(missing_ok=True)
+
+    client = get_store_client(store_url, access_token).client
+    connection = sqlite3.connect(partial_path)
+    try:
+        connection.executescript(SNAPSHOT_SCHEMA)
+        for query in [
+            PRODUCTS_BULK_QUERY,
+            COLLECTIONS_BULK_QUERY,
+            PUBLICATIONS_BULK_QUERY,
+        ]:
+            operation_id = run_bulk_query(client, store_url, access_token, query)
+            operation = wait_for_bulk_operation(
+                client, store_url, access_token, operation_id, operation_type="QUERY"
+            )
+            written = write_snapshot_rows(
+                connection, iter_bulk_results(operation["url"])
+            )
+            connection.commit()
+            print(f"Bulk operation {operation_id}: {written} objects exported.")
+
+        connection.execute(
+            "INSERT INTO snapshot VALUES (?, ?)", (store_url, time.time())
+        )
+        connection.commit()
+    except BaseException:
+        connection.close()
+        partial_path.unlink(missing_ok=True)
+        raise
+
+    connection.close()
+    os.replace(partial_path, snapshot_path)
+    return snapshot_path
+
+
+def open_snapshot(store_url: str) -> sqlite3.Connection:
+    """
+    Opens the store's snapshot read-only, rows are returned as `sqlite3.Row`.
+    """
+    snapshot_path = get_snapshot_path(store_url)
+    if not snapshot_path.exists():
+        raise FileNotFoundError(f"No snapshot of {store_url}, export one first.")
+
+    connection = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    return connection
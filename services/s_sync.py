@@ -0,0 +1,235 @@
+import asyncio
+import html.parser
+import typing
+
+from services.graphql.admin_api import get_max_concurrency
+from services.graphql.batching import async_run_batched_mutations
+from services.graphql.client import get_store_client
+from services.graphql.pagination import fetch_connection
+from services.graphql.queries import (
+    COLLECTIONS_SNAPSHOT_QUERY,
+    PRODUCTS_SNAPSHOT_QUERY,
+    UPDATE_PRODUCT_MUTATION,
+)
+from services.product_pipeline import async_upload_and_publish_products
+from services.s_collections import async_upload_collections
+from services.s_products import UploadMode
+from services.store_state import COLLECTION, PRODUCT, replace_resources
+
+# productCreate fields compared with the store, variants and media are only
+# sent when a product is created
+SYNCED_PRODUCT_FIELDS = ["title", "descriptionHtml", "vendor", "productType"]
+
+
+async def snapshot_products(store_url: str, access_token: str) -> list[dict]:
+    """
+    Fetches the products of the store with the fields the sync compares.
+    """
+    client = get_store_client(store_url, access_token).async_client
+    return await fetch_connection(
+        client, store_url, access_token, PRODUCTS_SNAPSHOT_QUERY, "products"
+    )
+
+
+async def snapshot_collections(store_url: str, access_token: str) -> list[dict]:
+    """
+    Fetches the ID, title and handle of every collection of the store.
+    """
+    client = get_store_client(store_url, access_token).async_client
+    return await fetch_connection(
+        client, store_url, access_token, COLLECTIONS_SNAPSHOT_QUERY, "collections"
+    )
+
+
+class _HTMLTokens(html.parser.HTMLParser):
+    """
+    Flattens HTML into tags with sorted attributes and whitespace-collapsed
+    text, so markup that only differs in formatting compares equal.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tokens = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = sorted((name, " ".join((value or "").split())) for name, value in attrs)
+        self.tokens.append(("start", tag, tuple(attrs)))
+
+    def handle_startendtag(self, tag, attrs):
+        # <br/> and <br> are the same element
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self.tokens.append(("end", tag))
+
+    def handle_data(self, data):
+        if text := " ".join(data.split()):
+            if self.tokens and self.tokens[-1][0] == "text":
+                text = f"{self.tokens.pop()[1]} {text}"
+            self.tokens.append(("text", text))
+
+
+def normalize_html(content: str | None) -> list[tuple]:
+    """
+    Returns a comparable form of an HTML fragment, as Shopify reformats the
+    descriptionHtml it is sent (entities, quotes, void tags, whitespace).
+    """
+    parser = _HTMLTokens()
+    parser.feed(content or "")
+    parser.close()
+    return parser.tokens
+
+
+# fields Shopify rewrites, compared in a normalized form
+FIELD_NORMALIZERS = {"descriptionHtml": normalize_html}
+
+
+def product_changes(product: dict, current: dict) -> dict:
+    """
+    Returns the `productUpdate` fields of a compiled product that differ from
+    the store's copy, empty when the product is up to date.
+    Args:
+        product (dict): The "product" input of a compiled product.
+        current (dict): The product as returned by `snapshot_products`.
+    Returns:
+        dict: The changed fields.
+    """
+    changes = {}
+    for field in SYNCED_PRODUCT_FIELDS:
+        normalize = FIELD_NORMALIZERS.get(field, lambda value: value)
+        if normalize(product[field]) != normalize(current.get(field)):
+            changes[field] = product[field]
+    if sorted(product["tags"]) != sorted(current.get("tags") or []):
+        changes["tags"] = product["tags"]
+    return changes
+
+
+async def async_sync_collections(
+    store_url: str,
+    access_token: str,
+    collections: list[dict],
+    max_concurrency: int | None = None,
+    publication_ids: list[str] | None = None,
+) -> list[str]:
+    """
+    Creates only the collections missing from the store, matched by title.
+    The snapshot refreshes the collections recorded in `services.store_state`,
+    which `async_upload_collections` then reuses instead of creating them.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        collections (list[dict]): A list of collections to sync.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+        publication_ids (list[str] | None): Publications to publish the
+            collections to.
+    Returns:
+        list[str]: The IDs of the existing and created collections.
+    """
+    existing = {
+        collection["title"]: collection["id"]
+        for collection in await snapshot_collections(store_url, access_token)
+    }
+    replace_resources(store_url, COLLECTION, existing.items())
+
+    named = [collection for collection in collections if collection.get("name")]
+    missing = [collection for collection in named if collection["name"] not in existing]
+    print(
+        f"Collections: {len(missing)} to create, "
+        f"{len(named) - len(missing)} already in the store, "
+        f"{len(collections) - len(named)} without a title skipped."
+    )
+
+    return await async_upload_collections(
+        store_url,
+        access_token,
+        collections,
+        max_concurrency=max_concurrency,
+        publication_ids=publication_ids,
+    )
+
+
+async def async_sync_products(
+    store_url: str,
+    access_token: str,
+    products: typing.Iterable[dict],
+    max_concurrency: int | None = None,
+    mode: UploadMode = "create",
+    publication_ids: list[str] | None = None,
+) -> list[str]:
+    """
+    Brings the store's products in line with a compiled catalog.
+
+    Products are matched by handle (by title for catalogs without handles).
+    Products whose fields changed are updated with batched `productUpdate`
+    mutations, then the catalog goes through the create and publish pipeline,
+    which only creates the missing products since the snapshot refreshed the
+    products recorded in `services.store_state`.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        products (Iterable[dict]): Products compiled by `services.catalog`,
+            a streamed catalog is read in a worker thread.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+        mode (UploadMode): How missing products are created.
+        publication_ids (list[str] | None): Publications to publish the
+            products to.
+    Returns:
+        list[str]: The IDs of the catalog's products in the store.
+    """
+    if not isinstance(products, list):
+        # the whole catalog is diffed against the store, a stream is read first
+        products = await asyncio.to_thread(list, products)
+
+    snapshot = await snapshot_products(store_url, access_token)
+    by_handle = {current["handle"]: current for current in snapshot}
+    by_title = {current["title"]: current for current in snapshot}
+    resources = {handle: current["id"] for handle, current in by_handle.items()}
+
+    to_create = []
+    updates = []
+    for product in products:
+        fields = product["product"]
+        current = (
+            by_handle.get(fields["handle"])
+            if "handle" in fields
+            else by_title.get(fields["title"])
+        )
+        if current is None:
+            to_create.append(product)
+            continue
+
+        resources[product["handle"]] = current["id"]
+        if changes := product_changes(fields, current):
+            updates.append({"product": {"id": current["id"], **changes}})
+
+    print(
+        f"Products: {len(to_create)} to create, {len(updates)} to update, "
+        f"{len(products) - len(to_create) - len(updates)} up to date."
+    )
+    replace_resources(store_url, PRODUCT, resources.items())
+
+    if updates:
+        max_concurrency = max_concurrency or get_max_concurrency(store_url)
+        client = get_store_client(store_url, access_token).async_client
+        results = await async_run_batched_mutations(
+            client,
+            store_url,
+            access_token,
+            UPDATE_PRODUCT_MUTATION,
+            updates,
+            asyncio.Semaphore(max_concurrency),
+        )
+        for update, result in zip(updates, results):
+            if not result:
+                print(f"Failed to update product {update['product']['id']}.")
+
+    return await async_upload_and_publish_products(
+        store_url,
+        access_token,
+        products,
+        publication_ids or [],
+        max_concurrency=max_concurrency,
+        mode=mode,
+    )
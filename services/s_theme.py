@@ -1,60 +1,152 @@
-import json
+import asyncio
 import os
-import subprocess
 
+import httpx
 from dotenv import load_dotenv
 
+from services.graphql.client import get_store_client
+from services.graphql.pagination import fetch_connection
+from services.graphql.queries import THEMES_QUERY
+from services.shopify_cli import async_run_cli
+from services.store_state import THEME, get_resource_id, record_resources
+
 load_dotenv()
 
+# key of the theme the catalog theme is pushed to
+MAIN_THEME = "main"
+
+# seconds a theme push may take before it is killed
+THEME_PUSH_TIMEOUT = float(os.getenv("THEME_PUSH_TIMEOUT", "900"))
+
+# `theme list` results by store
+_theme_lists: dict[str, list[dict]] = {}
+
 
-def get_theme_id(store_name: str, password: str) -> str:
+async def async_cli_list_themes(store_name: str, password: str) -> list[dict] | None:
     """
-    Retrieves the theme ID from the Shopify store using the Shopify CLI.
+    Lists the themes of the store with the Shopify CLI, once per store and
+    process: later calls reuse the list.
     Args:
         store_name (str): The name of the Shopify store.
         password (str): The Theme access token.
     Returns:
-        str: The theme ID if successful, None otherwise.
+        list[dict] | None: The themes as listed by `theme list --json`,
+            None if the CLI failed.
     """
+    if store_name in _theme_lists:
+        return _theme_lists[store_name]
+
     try:
-        stdout, _ = subprocess.Popen(
-            [
-                f"{os.getenv('SHOPIFY_CLI_PATH')}",
-                "theme",
-                "list",
-                "--store",
-                store_name,
-                "--json",
-                "--password",
-                password,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            bufsize=1,
-            universal_newlines=True,
-        ).communicate()
+        result = await async_run_cli(
+            ["theme", "list", "--store", store_name, "--json", "--password", password]
+        )
+    except TimeoutError:
+        return None
+    except OSError as e:
+        print("Error listing themes:", e)
+        return None
+
+    themes = next(
+        (document for document in result.documents if isinstance(document, list)),
+        None,
+    )
+    if result.returncode != 0 or themes is None:
+        print("Failed to list themes. Ensure the store URL and password are correct.")
+        print("Output:", "\n".join(result.output))
+        return None
+
+    _theme_lists[store_name] = themes
+    return themes
 
+
+async def async_list_themes(
+    store_url: str, access_token: str, roles: list[str] | None = None
+) -> list[dict]:
+    """
+    Lists the themes of the store through the Admin API.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        roles (list[str] | None): Only themes with these roles, e.g. ["MAIN"].
+    Returns:
+        list[dict]: The ID, name and role of each theme.
+    """
+    client = get_store_client(store_url, access_token).async_client
+    return await fetch_connection(
+        client,
+        store_url,
+        access_token,
+        THEMES_QUERY,
+        "themes",
+        variables={"roles": roles},
+    )
+
+
+async def async_get_theme_id(
+    store_name: str, password: str, access_token: str | None = None
+) -> str | None:
+    """
+    Retrieves the ID of the store's main theme.
+    With an Admin API access token the themes are listed with
+    `async_list_themes`, otherwise (or when that fails) with the Shopify CLI.
+    The ID is recorded in the store state, so later runs skip the listing.
+    Args:
+        store_name (str): The name of the Shopify store.
+        password (str): The Theme access token, for the CLI.
+        access_token (str | None): The Admin API access token.
+    Returns:
+        str: The numeric theme ID if successful, None otherwise.
+    """
+    if theme_id := get_resource_id(store_name, THEME, MAIN_THEME):
+        return theme_id
+
+    theme_ids = []
+    if access_token:
         try:
-            return json.loads(stdout)[0]["id"]
-        except (json.JSONDecodeError, IndexError):
-            print(
-                "Failed to retrieve theme ID. Ensure the store URL and password are correct."
-            )
-            print("Output:", stdout)
-            return None
-    except subprocess.CalledProcessError as e:
-        print("Error retrieving theme ID:", e)
+            themes = await async_list_themes(store_name, access_token, ["MAIN"])
+        except (ValueError, httpx.HTTPError) as e:
+            print(f"Failed to list themes through the Admin API: {e}")
+            themes = []
+        # the CLI and the deploy take the numeric ID
+        theme_ids = [theme["id"].rsplit("/", 1)[-1] for theme in themes]
+    if not theme_ids:
+        themes = await async_cli_list_themes(store_name, password)
+        theme_ids = [str(theme["id"]) for theme in themes or []]
+
+    if not theme_ids:
+        print("Failed to retrieve theme ID. The store has no themes.")
         return None
 
+    theme_id = theme_ids[0]
+    record_resources(store_name, THEME, [(MAIN_THEME, theme_id)])
+    return theme_id
 
-def upload_shopify_theme(
+
+def get_theme_id(
+    store_name: str, password: str, access_token: str | None = None
+) -> str | None:
+    """
+    Synchronous counterpart of `async_get_theme_id`.
+    """
+
+    async def get_theme_id_async() -> str | None:
+        try:
+            return await async_get_theme_id(store_name, password, access_token)
+        finally:
+            # the async client is bound to this event loop
+            if access_token:
+                await get_store_client(store_name, access_token).aclose()
+
+    return asyncio.run(get_theme_id_async())
+
+
+async def async_upload_shopify_theme(
     theme_id: str, folder_path: str, store_url: str, password: str
 ) -> bool:
     """
-    Uploads a Shopify theme to the specified store.
+    Uploads a Shopify theme to the specified store with the Shopify CLI,
+    without blocking the event loop, so it can overlap the catalog upload.
+    The push is killed after THEME_PUSH_TIMEOUT seconds.
     Args:
         theme_id (str): The ID of the theme to upload.
         folder_path (str): The path to the theme folder.
@@ -68,9 +160,8 @@ def upload_shopify_theme(
         return False
 
     try:
-        subprocess.run(
+        result = await async_run_cli(
             [
-                f"{os.getenv('SHOPIFY_CLI_PATH')}",
                 "theme",
                 "push",
                 "--path",
@@ -88,12 +179,29 @@ def upload_shopify_theme(
                 "--theme",
                 f"{theme_id}",
             ],
-            encoding="utf-8",
-            errors="replace",
+            timeout=THEME_PUSH_TIMEOUT,
             input="\n",
         )
-    except subprocess.CalledProcessError as e:
-        print(e)
+    except TimeoutError:
+        return False
+    except OSError as e:
+        print("Error uploading theme:", e)
+        return False
+
+    if result.returncode != 0:
+        print(f"Theme push failed with exit code {result.returncode}.")
+        print("Output:", "\n".join(result.output[-20:]))
         return False
 
     return True
+
+
+def upload_shopify_theme(
+    theme_id: str, folder_path: str, store_url: str, password: str
+) -> bool:
+    """
+    Synchronous counterpart of `async_upload_shopify_theme`.
+    """
+    return asyncio.run(
+        async_upload_shopify_theme(theme_id, folder_path, store_url, password)
+    )
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import re
+import typing
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SHOPIFY_CLI_PATH = os.getenv("SHOPIFY_CLI_PATH")
+# seconds a CLI command may run before it is killed
+CLI_TIMEOUT = float(os.getenv("SHOPIFY_CLI_TIMEOUT", "120"))
+# longest line read from the CLI, JSON output may come as one line
+CLI_LINE_LIMIT = 16 * 1024 * 1024
+
+DOCUMENT_START_PATTERN = re.compile(r"[{\[]")
+# how a JSON document can begin, to tell it from brackets in log lines
+DOCUMENT_PATTERN = re.compile(r'[{\[]\s*(?:["{}\[\]\-\d]|true|false|null|$)')
+
+
+class CLIResult(typing.NamedTuple):
+    returncode: int
+    # JSON documents printed by the command, in order
+    documents: list
+    # every line printed by the command
+    output: list[str]
+
+
+class JSONStream:
+    """
+    Incremental parser of JSON documents interleaved with log lines, as the
+    CLI prints them with --json: documents are decoded as soon as they are
+    complete, whatever their number of lines.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        documents = []
+        while match := DOCUMENT_START_PATTERN.search(self._buffer):
+            start = match.start()
+            # a bracket in a log line, e.g. "[warning]"
+            if not DOCUMENT_PATTERN.match(self._buffer, start):
+                self._buffer = self._buffer[start + 1 :]
+                continue
+            # a document still being printed
+            if self._incomplete(start):
+                self._buffer = self._buffer[start:]
+                return documents
+
+            try:
+                document, end = self._decoder.raw_decode(self._buffer, start)
+            except json.JSONDecodeError:
+                self._buffer = self._buffer[start + 1 :]
+                continue
+            documents.append(document)
+            self._buffer = self._buffer[end:]
+
+        # nothing but log output left
+        self._buffer = ""
+        return documents
+
+    def _incomplete(self, start: int) -> bool:
+        """
+        Whether the text from `start` may still become a document: every
+        bracket opened is not closed yet.
+        """
+        depth = 0
+        in_string = False
+        escaped = False
+        for char in self._buffer[start:]:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "{[":
+                depth += 1
+            elif char in "}]":
+                depth -= 1
+                if depth == 0:
+                    return False
+        return True
+
+
+async def async_run_cli(
+    args: list[str],
+    timeout: float | None = None,
+    input: str | None = None,
+    on_document: typing.Callable[[typing.Any], None] | None = None,
+) -> CLIResult:
+    """
+    Runs a Shopify CLI command without blocking the event loop.
+
+    The output is read as it is printed and its JSON documents parsed on the
+    fly. The command is killed when it outlives its deadline.
+    Args:
+        args (list[str]): The arguments of the command, e.g. ["theme", "list"].
+        timeout (float | None): Seconds before the command is killed,
+            SHOPIFY_CLI_TIMEOUT by default.
+        input (str | None): Text written to the command's stdin, e.g. "\\n" to
+            accept a prompt.
+        on_document (Callable | None): Called with each JSON document as soon
+            as it is parsed.
+    Returns:
+        CLIResult: The exit code, JSON documents and output lines.
+    Raises:
+        TimeoutError: When the command did not finish in time.
+    """
+    process = await asyncio.create_subprocess_exec(
+        SHOPIFY_CLI_PATH,
+        *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        limit=CLI_LINE_LIMIT,
+    )
+    if input is not None:
+        process.stdin.write(input.encode("utf-8"))
+    process.stdin.close()
+
+    stream = JSONStream()
+    documents = []
+    output = []
+    try:
+        async with asyncio.timeout(timeout or CLI_TIMEOUT):
+            async for raw_line in process.stdout:
+                line = raw_line.decode("utf-8", errors="replace")
+                output.append(line.rstrip("\n"))
+                for document in stream.feed(line):
+                    documents.append(document)
+                    if on_document is not None:
+                        on_document(document)
+            returncode = await process.wait()
+    except TimeoutError:
+        print(f"Shopify CLI '{' '.join(args[:2])}' timed out, killing it.")
+        raise
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    return CLIResult(returncode, documents, output)
@@ -0,0 +1,152 @@
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import typing
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STORE_STATE_PATH = pathlib.Path(
+    os.getenv(
+        "STORE_STATE_PATH",
+        pathlib.Path(__file__).parent.parent / ".cache" / "store_state.sqlite",
+    )
+)
+
+STORE_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    store_url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (store_url, kind, key)
+);
+CREATE INDEX IF NOT EXISTS resources_gid ON resources (store_url, gid);
+CREATE TABLE IF NOT EXISTS publications (
+    store_url TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    publication_id TEXT NOT NULL,
+    published_at REAL NOT NULL,
+    PRIMARY KEY (store_url, gid, publication_id)
+);
+"""
+
+# resource kinds recorded by the services
+PRODUCT = "product"
+COLLECTION = "collection"
+THEME = "theme"
+MEDIA = "media"
+
+_connection: sqlite3.Connection | None = None
+_lock = threading.Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    global _connection
+
+    if _connection is None:
+        STORE_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _connection = sqlite3.connect(STORE_STATE_PATH, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        _connection.executescript(STORE_STATE_SCHEMA)
+    return _connection
+
+
+def get_resource_ids(store_url: str, kind: str) -> dict[str, str]:
+    """
+    Returns the GIDs of the recorded resources of a kind, by key.
+    """
+    with _lock:
+        rows = _get_connection().execute(
+            "SELECT key, gid FROM resources WHERE store_url = ? AND kind = ?",
+            (store_url, kind),
+        )
+        return dict(rows.fetchall())
+
+
+def get_resource_id(store_url: str, kind: str, key: str) -> str | None:
+    with _lock:
+        row = (
+            _get_connection()
+            .execute(
+                "SELECT gid FROM resources "
+                "WHERE store_url = ? AND kind = ? AND key = ?",
+                (store_url, kind, key),
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+
+def record_resources(
+    store_url: str, kind: str, resources: typing.Iterable[tuple[str, str]]
+):
+    """
+    Records created resources of a store.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        kind (str): The kind of the resources, e.g. `PRODUCT`.
+        resources (Iterable[tuple[str, str]]): (key, GID) pairs, the key being
+            the handle or title the resource was created from.
+    """
+    now = time.time()
+    with _lock, _get_connection() as connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?)",
+            [(store_url, kind, key, str(gid), now) for key, gid in resources],
+        )
+
+
+def replace_resources(
+    store_url: str, kind: str, resources: typing.Iterable[tuple[str, str]]
+):
+    """
+    Replaces every recorded resource of a kind with the ones actually in the
+    store, e.g. after a snapshot, forgetting resources deleted meanwhile.
+    """
+    now = time.time()
+    with _lock, _get_connection() as connection:
+        connection.execute(
+            "DELETE FROM resources WHERE store_url = ? AND kind = ?",
+            (store_url, kind),
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?)",
+            [(store_url, kind, key, str(gid), now) for key, gid in resources],
+        )
+
+
+def get_published_ids(store_url: str, publication_id: str) -> set[str]:
+    """
+    Returns the GIDs of the resources recorded as published to a publication.
+    """
+    with _lock:
+        rows = _get_connection().execute(
+            "SELECT gid FROM publications "
+            "WHERE store_url = ? AND publication_id = ?",
+            (store_url, publication_id),
+        )
+        return {gid for gid, in rows.fetchall()}
+
+
+def record_published(store_url: str, gids: typing.Iterable[str], publication_id: str):
+    now = time.time()
+    with _lock, _get_connection() as connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO publications VALUES (?, ?, ?, ?)",
+            [(store_url, str(gid), publication_id, now) for gid in gids],
+        )
+
+
+def forget_store(store_url: str):
+    """
+    Forgets everything recorded about a store, e.g. after it was reset.
+    """
+    with _lock, _get_connection() as connection:
+        connection.execute("DELETE FROM resources WHERE store_url = ?", (store_url,))
+        connection.execute("DELETE FROM publications WHERE store_url = ?", (store_url,))
@@ -0,0 +1,213 @@
+import hashlib
+import io
+import json
+import os
+import pathlib
+import re
+import shutil
+
+import rcssmin
+import rjsmin
+from dotenv import load_dotenv
+from PIL import Image
+
+from services.theme_deploy import local_theme_files
+
+load_dotenv()
+
+THEME_BUILD_DIR = pathlib.Path(
+    os.getenv(
+        "THEME_BUILD_DIR",
+        pathlib.Path(__file__).parent.parent / ".cache" / "theme_builds",
+    )
+)
+
+# bump when the build steps change, so cached builds are not reused
+THEME_BUILD_VERSION = "1"
+
+# Liquid tags closed by an "end" tag
+LIQUID_BLOCK_TAGS = {
+    "capture",
+    "case",
+    "comment",
+    "doc",
+    "for",
+    "form",
+    "if",
+    "javascript",
+    "paginate",
+    "raw",
+    "schema",
+    "style",
+    "stylesheet",
+    "tablerow",
+    "unless",
+}
+# Liquid tags whose content is not parsed
+LIQUID_RAW_TAGS = {"comment", "doc", "raw"}
+
+LIQUID_TAG_PATTERN = re.compile(r"{%-?\s*(\w+)(.*?)-?%}", re.DOTALL)
+# Shopify JSON files may start with a generated comment
+JSON_COMMENT_PATTERN = re.compile(r"^\s*/\*.*?\*/", re.DOTALL)
+SVG_COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+SVG_WHITESPACE_PATTERN = re.compile(r">\s+<")
+
+
+def theme_source_hash(files: dict[str, pathlib.Path]) -> str:
+    """
+    Returns the hash of a theme's source tree: every filename and content.
+    """
+    digest = hashlib.sha256(THEME_BUILD_VERSION.encode())
+    for filename, path in sorted(files.items()):
+        digest.update(filename.encode())
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()[:32]
+
+
+def validate_liquid(content: str) -> list[str]:
+    """
+    Checks that every Liquid block tag is closed, in order, and that the
+    `{% schema %}` of a section is valid JSON.
+    Returns:
+        list[str]: The errors found, empty when the template is valid.
+    """
+    errors = []
+    open_tags = []
+    for match in LIQUID_TAG_PATTERN.finditer(content):
+        tag = match.group(1)
+        line = content.count("\n", 0, match.start()) + 1
+
+        # the content of raw tags is not Liquid, only their end tag counts
+        if open_tags and open_tags[-1][0] in LIQUID_RAW_TAGS:
+            if tag == f"end{open_tags[-1][0]}":
+                open_tags.pop()
+            continue
+
+        if tag in LIQUID_BLOCK_TAGS:
+            open_tags.append((tag, line, match.end()))
+        elif tag.startswith("end") and tag[3:] in LIQUID_BLOCK_TAGS:
+            if not open_tags or open_tags[-1][0] != tag[3:]:
+                errors.append(f"line {line}: unexpected {{% {tag} %}}")
+                continue
+            opened, _, start = open_tags.pop()
+            if opened == "schema":
+                try:
+                    json.loads(content[start : match.start()])
+                except json.JSONDecodeError as e:
+                    errors.append(f"line {line}: invalid schema JSON: {e}")
+
+    for tag, line, _ in open_tags:
+        errors.append(f"line {line}: {{% {tag} %}} is never closed")
+    return errors
+
+
+def validate_json(content: str) -> list[str]:
+    try:
+        json.loads(JSON_COMMENT_PATTERN.sub("", content, count=1))
+    except json.JSONDecodeError as e:
+        return [str(e)]
+    return []
+
+
+def minify_svg(content: str) -> str:
+    content = SVG_COMMENT_PATTERN.sub("", content)
+    return SVG_WHITESPACE_PATTERN.sub("><", content).strip()
+
+
+def optimize_png(content: bytes) -> bytes:
+    """
+    Re-encodes a PNG losslessly at the highest compression, keeping the
+    original when it is already smaller.
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            output = io.BytesIO()
+            image.save(output, format="PNG", optimize=True)
+    except OSError:
+        return content
+    optimized = output.getvalue()
+    return optimized if len(optimized) < len(content) else content
+
+
+def build_file(filename: str, content: bytes) -> bytes:
+    """
+    Validates one theme file and returns its built content.
+    Raises:
+        ValueError: When the file is not valid Liquid or JSON.
+    """
+    name = filename.rsplit("/", 1)[-1]
+
+    if name.endswith(".liquid"):
+        errors = validate_liquid(content.decode("utf-8"))
+    elif name.endswith(".json"):
+        errors = validate_json(content.decode("utf-8"))
+    else:
+        errors = []
+    if errors:
+        raise ValueError("; ".join(errors))
+
+    # Liquid assets (e.g. theme.css.liquid) and minified files are kept as-is
+    if not filename.startswith("assets/") or ".min." in name:
+        return content
+    if name.endswith(".css"):
+        return rcssmin.cssmin(content.decode("utf-8")).encode("utf-8")
+    if name.endswith(".js"):
+        return rjsmin.jsmin(content.decode("utf-8")).encode("utf-8")
+    if name.endswith(".svg"):
+        return minify_svg(content.decode("utf-8")).encode("utf-8")
+    if name.endswith(".png"):
+        return optimize_png(content)
+    return content
+
+
+def build_theme(folder_path: str) -> pathlib.Path:
+    """
+    Builds a theme for deployment: validates its Liquid and JSON files,
+    minifies its CSS, JS and SVG assets and recompresses its PNGs.
+
+    The build is cached under `THEME_BUILD_DIR` by the hash of the source
+    tree, so each version of a theme is built once and every store deploys
+    the same build.
+    Args:
+        folder_path (str): The path to the theme folder.
+    Returns:
+        pathlib.Path: The folder of the built theme.
+    Raises:
+        ValueError: When a theme file is invalid.
+    """
+    files = local_theme_files(folder_path)
+    build_path = THEME_BUILD_DIR / theme_source_hash(files)
+    if build_path.is_dir():
+        return build_path
+
+    errors = []
+    source_bytes = 0
+    built_bytes = 0
+    partial_path = build_path.with_suffix(".partial")
+    shutil.rmtree(partial_path, ignore_errors=True)
+    for filename, path in files.items():
+        content = path.read_bytes()
+        try:
+            built = build_file(filename, content)
+        except (ValueError, UnicodeDecodeError) as e:
+            errors.append(f"{filename}: {e}")
+            continue
+
+        output_path = partial_path / filename
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(built)
+        source_bytes += len(content)
+        built_bytes += len(built)
+
+    if errors:
+        shutil.rmtree(partial_path, ignore_errors=True)
+        print("Invalid theme files:\n" + "\n".join(errors))
+        raise ValueError("Theme build failed")
+
+    try:
+        os.replace(partial_path, build_path)
+    except OSError:
+        # built concurrently by another run
+        shutil.rmtree(partial_path, ignore_errors=True)
+    print(f"Theme built: {len(files)} files, {source_bytes} -> {built_bytes} bytes.")
+    return build_path
@@ -0,0 +1,427 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import pathlib
+
+import httpx
+from dotenv import load_dotenv
+
+from services.graphql.admin_api import async_graphql_request, get_max_concurrency
+from services.graphql.client import get_store_client
+from services.graphql.pagination import fetch_connection
+from services.graphql.queries import (
+    JOB_QUERY,
+    THEME_FILES_DELETE_QUERY,
+    THEME_FILES_QUERY,
+    THEME_FILES_UPSERT_QUERY,
+    THEME_PUBLISH_QUERY,
+)
+
+load_dotenv()
+
+THEME_CACHE_DIR = pathlib.Path(
+    os.getenv(
+        "THEME_CACHE_DIR",
+        pathlib.Path(__file__).parent.parent / ".cache" / "themes",
+    )
+)
+
+# folders of a theme, anything else in the theme folder is not uploaded
+THEME_DIRECTORIES = (
+    "assets",
+    "blocks",
+    "config",
+    "layout",
+    "locales",
+    "sections",
+    "snippets",
+    "templates",
+)
+
+# themeFilesUpsert accepts at most 50 files per call
+MAX_THEME_FILES_PER_CALL = 50
+# encoded bytes sent per themeFilesUpsert call
+MAX_THEME_BATCH_BYTES = int(os.getenv("THEME_BATCH_BYTES", str(4 * 1024 * 1024)))
+# seconds between two polls of an upsert job
+JOB_POLL_INTERVAL = 1.0
+
+
+def theme_gid(theme_id: str) -> str:
+    """
+    Returns the Admin API ID of a theme, from the numeric ID the CLI lists.
+    """
+    theme_id = str(theme_id)
+    if theme_id.startswith("gid://"):
+        return theme_id
+    return f"gid://shopify/OnlineStoreTheme/{theme_id}"
+
+
+def local_theme_files(folder_path: str) -> dict[str, pathlib.Path]:
+    """
+    Returns the files of a local theme by their theme filename,
+    e.g. "sections/header.liquid". Hidden files are skipped.
+    """
+    folder = pathlib.Path(folder_path)
+    files = {}
+    for directory in THEME_DIRECTORIES:
+        for path in sorted((folder / directory).rglob("*")):
+            filename = path.relative_to(folder).as_posix()
+            if path.is_file() and not any(
+                part.startswith(".") for part in filename.split("/")
+            ):
+                files[filename] = path
+    return files
+
+
+def file_checksum(path: pathlib.Path) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "md5").hexdigest()
+
+
+def _manifest_path(store_url: str, theme_id: str) -> pathlib.Path:
+    return (
+        THEME_CACHE_DIR / store_url / f"{theme_gid(theme_id).rsplit('/', 1)[-1]}.json"
+    )
+
+
+def load_manifest(store_url: str, theme_id: str) -> dict[str, list]:
+    """
+    Returns the manifest of the last deploy of a theme: for each file, the
+    checksum of the uploaded content and the checksum the store reported for
+    it (None until a deploy reads it back).
+    """
+    try:
+        with open(_manifest_path(store_url, theme_id), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(store_url: str, theme_id: str, manifest: dict[str, list]):
+    path = _manifest_path(store_url, theme_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = path.with_suffix(".partial")
+    with open(partial_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, sort_keys=True)
+    os.replace(partial_path, path)
+
+
+async def async_get_theme_checksums(
+    store_url: str, access_token: str, theme_id: str
+) -> dict[str, str | None]:
+    """
+    Returns the MD5 checksum of every file of a theme in the store.
+    """
+    client = get_store_client(store_url, access_token).async_client
+    files = await fetch_connection(
+        client,
+        store_url,
+        access_token,
+        THEME_FILES_QUERY,
+        "theme.files",
+        variables={"id": theme_gid(theme_id)},
+    )
+    return {file["filename"]: file["checksumMd5"] for file in files}
+
+
+def _upload_phase(filename: str) -> int:
+    """
+    Templates and section groups reference sections, and settings_data.json
+    is validated against settings_schema.json, so JSON files are uploaded
+    after the files they point to.
+    """
+    if filename == "config/settings_data.json":
+        return 2
+    if filename.endswith(".json"):
+        return 1
+    return 0
+
+
+def _file_body(content: bytes) -> dict:
+    try:
+        return {"type": "TEXT", "value": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"type": "BASE64", "value": base64.b64encode(content).decode("ascii")}
+
+
+def _upsert_batches(files: dict[str, bytes]) -> list[list[dict]]:
+    """
+    Splits files into themeFilesUpsert inputs, bounded by count and size.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for filename, content in files.items():
+        body = _file_body(content)
+        size = len(body["value"])
+        if batch and (
+            len(batch) == MAX_THEME_FILES_PER_CALL
+            or batch_bytes + size > MAX_THEME_BATCH_BYTES
+        ):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append({"filename": filename, "body": body})
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _wait_for_job(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    job_id: str,
+    semaphore: asyncio.Semaphore,
+):
+    while True:
+        data = await async_graphql_request(
+            client,
+            store_url,
+            access_token,
+            JOB_QUERY,
+            {"id": job_id},
+            semaphore=semaphore,
+        )
+        job = (data.get("data") or {}).get("job")
+        if not job or job["done"]:
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+async def _upsert_files(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    theme_id: str,
+    files: list[dict],
+    semaphore: asyncio.Semaphore,
+) -> list[str]:
+    """
+    Uploads one batch of files and waits until the store has written them.
+    Returns:
+        list[str]: The filenames that were uploaded.
+    """
+    data = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        THEME_FILES_UPSERT_QUERY,
+        {"themeId": theme_gid(theme_id), "files": files},
+        semaphore=semaphore,
+    )
+    result = (data.get("data") or {}).get("themeFilesUpsert") or {}
+    for error in result.get("userErrors") or []:
+        print(f"Failed to upload {error['filename']}: {error['message']}")
+    if not result.get("upsertedThemeFiles"):
+        if not result.get("userErrors"):
+            print(f"Failed to upload theme files. Response: {data}")
+        return []
+
+    if result.get("job"):
+        await _wait_for_job(
+            client, store_url, access_token, result["job"]["id"], semaphore
+        )
+    return [file["filename"] for file in result["upsertedThemeFiles"]]
+
+
+async def _delete_files(
+    client: httpx.AsyncClient,
+    store_url: str,
+    access_token: str,
+    theme_id: str,
+    filenames: list[str],
+    semaphore: asyncio.Semaphore,
+) -> list[str]:
+    data = await async_graphql_request(
+        client,
+        store_url,
+        access_token,
+        THEME_FILES_DELETE_QUERY,
+        {"themeId": theme_gid(theme_id), "files": filenames},
+        semaphore=semaphore,
+    )
+    result = (data.get("data") or {}).get("themeFilesDelete") or {}
+    for error in result.get("userErrors") or []:
+        print(f"Failed to delete {error['filename']}: {error['message']}")
+    return [file["filename"] for file in result.get("deletedThemeFiles") or []]
+
+
+async def async_write_theme_file(
+    store_url: str, access_token: str, theme_id: str, filename: str, content: bytes
+) -> bool:
+    """
+    Writes one file of a theme with a single `themeFilesUpsert`.
+    Returns:
+        bool: True if the file was written, False otherwise.
+    """
+    client = get_store_client(store_url, access_token).async_client
+    uploaded = await _upsert_files(
+        client,
+        store_url,
+        access_token,
+        theme_id,
+        [{"filename": filename, "body": _file_body(content)}],
+        asyncio.Semaphore(1),
+    )
+    return filename in uploaded
+
+
+async def async_deploy_theme(
+    store_url: str,
+    access_token: str,
+    theme_id: str,
+    folder_path: str,
+    delete: bool = True,
+    publish: bool = True,
+    max_concurrency: int | None = None,
+    overrides: dict[str, bytes] | None = None,
+) -> bool:
+    """
+    Uploads only the files of a local theme that differ from the store's copy.
+
+    Local MD5 checksums are compared with the checksums of the theme's files
+    in the store. The store may rewrite some files (e.g. reformat JSON), so a
+    file whose store checksum differs is still skipped when it matches what
+    the last deploy uploaded, according to the manifest cached under
+    `THEME_CACHE_DIR`; the manifest alone is used when the store's files
+    cannot be listed. Changed files are sent in concurrent `themeFilesUpsert`
+    batches bounded by count and size, JSON files after the files they
+    reference. Like `shopify theme push`, files missing from the local theme
+    are deleted from the store unless `delete` is False.
+    Args:
+        store_url (str): The URL of the Shopify store.
+        access_token (str): The access token for the Shopify store.
+        theme_id (str): The ID of the theme to deploy to.
+        folder_path (str): The path to the theme folder.
+        delete (bool): Whether to delete the store files missing locally.
+        publish (bool): Whether to publish the theme afterwards.
+        max_concurrency (int | None): Maximum number of requests in flight,
+            tuned from the store's cost bucket when not given.
+        overrides (dict[str, bytes] | None): Content deployed instead of the
+            local files, by filename, e.g. a rendered settings_data.json.
+    Returns:
+        bool: True if every changed file was deployed, False otherwise.
+    """
+    if not theme_id or not folder_path or not store_url or not access_token:
+        print("Missing required parameters for deploying theme.")
+        return False
+
+    local_files = local_theme_files(folder_path)
+    if not local_files:
+        print(f"No theme files found in {folder_path}.")
+        return False
+
+    overrides = overrides or {}
+    checksums = {
+        filename: (
+            hashlib.md5(overrides[filename]).hexdigest()
+            if filename in overrides
+            else file_checksum(path)
+        )
+        for filename, path in local_files.items()
+    }
+    manifest = load_manifest(store_url, theme_id)
+    try:
+        remote = await async_get_theme_checksums(store_url, access_token, theme_id)
+    except ValueError:
+        print("Could not list the theme files, comparing with the last deploy.")
+        remote = None
+
+    changed = {}
+    new_manifest = {}
+    for filename, checksum in checksums.items():
+        recorded_checksum, recorded_remote = manifest.get(filename, (None, None))
+        if remote is None:
+            unchanged = recorded_checksum == checksum
+            remote_checksum = recorded_remote
+        elif filename not in remote:
+            unchanged = False
+        else:
+            remote_checksum = remote[filename]
+            unchanged = remote_checksum == checksum or (
+                recorded_checksum == checksum
+                and recorded_remote in (None, remote_checksum)
+            )
+
+        if unchanged:
+            new_manifest[filename] = [checksum, remote_checksum]
+        else:
+            changed[filename] = (
+                overrides[filename]
+                if filename in overrides
+                else local_files[filename].read_bytes()
+            )
+
+    stale = sorted(set(manifest if remote is None else remote) - set(local_files))
+    if not delete:
+        stale = []
+    print(
+        f"Theme: {len(changed)} to upload, {len(stale)} to delete, "
+        f"{len(local_files) - len(changed)} unchanged."
+    )
+
+    max_concurrency = max_concurrency or get_max_concurrency(store_url)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    client = get_store_client(store_url, access_token).async_client
+
+    uploaded = []
+    for phase in range(3):
+        phase_files = {
+            filename: content
+            for filename, content in changed.items()
+            if _upload_phase(filename) == phase
+        }
+        results = await asyncio.gather(
+            *(
+                _upsert_files(
+                    client, store_url, access_token, theme_id, batch, semaphore
+                )
+                for batch in _upsert_batches(phase_files)
+            )
+        )
+        uploaded.extend(filename for filenames in results for filename in filenames)
+
+    # the store's checksum of an uploaded file is read back on the next deploy
+    for filename in uploaded:
+        new_manifest[filename] = [checksums[filename], None]
+
+    deleted = []
+    if stale:
+        results = await asyncio.gather(
+            *(
+                _delete_files(
+                    client,
+                    store_url,
+                    access_token,
+                    theme_id,
+                    stale[start : start + MAX_THEME_FILES_PER_CALL],
+                    semaphore,
+                )
+                for start in range(0, len(stale), MAX_THEME_FILES_PER_CALL)
+            )
+        )
+        deleted = [filename for filenames in results for filename in filenames]
+
+    save_manifest(store_url, theme_id, new_manifest)
+    success = len(uploaded) == len(changed) and len(deleted) == len(stale)
+
+    if publish:
+        data = await async_graphql_request(
+            client,
+            store_url,
+            access_token,
+            THEME_PUBLISH_QUERY,
+            {"id": theme_gid(theme_id)},
+            semaphore=semaphore,
+        )
+        result = (data.get("data") or {}).get("themePublish") or {}
+        if not result.get("theme") or result.get("userErrors"):
+            print(f"Failed to publish theme. Response: {data}")
+            success = False
+
+    print(f"Theme: {len(uploaded)} uploaded, {len(deleted)} deleted.")
+    return success
@@ -0,0 +1,106 @@
+import functools
+import json
+import pathlib
+import re
+import string
+
+from services.theme_build import JSON_COMMENT_PATTERN
+
+SETTINGS_DATA = "config/settings_data.json"
+
+# where theme authors want the store name in settings_data.json
+STORE_NAME_MARKER = "[store_name]"
+
+HEX_COLOR_PATTERN = re.compile(r"#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})")
+
+
+def normalize_color(color: str) -> str | None:
+    """
+    Returns a color as lowercase #rrggbb, None when it is not a hex color.
+    """
+    color = color.strip()
+    if not HEX_COLOR_PATTERN.fullmatch(color):
+        return None
+    if len(color) == 4:
+        color = "#" + "".join(digit * 2 for digit in color[1:])
+    return color.lower()
+
+
+def is_gray(color: str) -> bool:
+    return color[1:3] == color[3:5] == color[5:7]
+
+
+@functools.lru_cache(maxsize=None)
+def settings_template(folder_path: str) -> tuple[string.Template, dict[str, str]]:
+    """
+    Compiles the settings_data.json of a theme into a template, once per
+    theme folder (a build folder is a theme version, see `services.theme_build`).
+
+    The theme's accent colors, every non-gray color in order of first
+    appearance, become $color_1, $color_2... and STORE_NAME_MARKER becomes
+    $store_name. Grays (backgrounds, text, borders) are kept as they are.
+    Args:
+        folder_path (str): The path to the theme folder.
+    Returns:
+        tuple[string.Template, dict[str, str]]: The template and the theme's
+            own value of each placeholder.
+    """
+    content = (pathlib.Path(folder_path) / SETTINGS_DATA).read_text(encoding="utf-8")
+    settings = json.loads(JSON_COMMENT_PATTERN.sub("", content, count=1))
+    defaults = {"store_name": ""}
+    placeholders = {}
+
+    def templated(value):
+        if isinstance(value, dict):
+            return {key: templated(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [templated(item) for item in value]
+        if not isinstance(value, str):
+            return value
+
+        color = normalize_color(value)
+        if color and not is_gray(color):
+            if color not in placeholders:
+                name = f"color_{len(placeholders) + 1}"
+                placeholders[color] = name
+                defaults[name] = color
+            return f"\0{placeholders[color]}\0"
+        return value.replace(STORE_NAME_MARKER, "\0store_name\0")
+
+    # "$" in the theme's own values must not be read as placeholders
+    text = json.dumps(templated(settings), ensure_ascii=False, indent=2)
+    text = text.replace("$", "$$").replace("\\u0000", "\0")
+    text = re.sub(r"\0(\w+)\0", r"${\1}", text)
+    return string.Template(text), defaults
+
+
+def render_settings_data(
+    folder_path: str, store_name: str | None = None, colors: list[str] | None = None
+) -> bytes | None:
+    """
+    Renders the settings_data.json of a theme for a customer.
+    Args:
+        folder_path (str): The path to the theme folder.
+        store_name (str | None): The name of the customer's store.
+        colors (list[str] | None): The customer's colors, as hex strings,
+            replacing the theme's accent colors in order.
+    Returns:
+        bytes | None: The rendered file, None when the theme has no settings.
+    """
+    try:
+        template, defaults = settings_template(str(folder_path))
+    except FileNotFoundError:
+        return None
+
+    values = dict(defaults)
+    if store_name:
+        # the values are inserted in JSON strings
+        values["store_name"] = json.dumps(store_name, ensure_ascii=False)[1:-1]
+    customer_colors = [
+        color for color in map(normalize_color, colors or []) if color is not None
+    ]
+    for index, color in enumerate(customer_colors, start=1):
+        if f"color_{index}" in values:
+            values[f"color_{index}"] = color
+
+    return template.substitute(values).encode("utf-8")
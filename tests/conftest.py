@@ -0,0 +1,36 @@
+import pytest
+
+from services import store_state
+
+
+@pytest.fixture
+def state_db(monkeypatch, tmp_path):
+    """
+    Records the store state of a test in its own temporary database.
+    """
+    monkeypatch.setattr(store_state, "STORE_STATE_PATH", tmp_path / "state.sqlite")
+    monkeypatch.setattr(store_state, "_connection", None)
+    yield
+    if store_state._connection is not None:
+        store_state._connection.close()
+
+
+@pytest.fixture
+def compiled_product():
+    """
+    Builds products the way `services.catalog` compiles them.
+    """
+
+    def compiled_product(handle: str, options: list[dict] | None = None) -> dict:
+        return {
+            "handle": handle,
+            "title": handle.title(),
+            "product": {
+                "title": handle.title(),
+                "handle": handle,
+                "productOptions": options or [],
+            },
+            "media": [],
+        }
+
+    return compiled_product
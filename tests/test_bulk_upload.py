@@ -0,0 +1,152 @@
+import json
+
+import httpx
+import pytest
+
+from services import s_products, store_state
+from services.graphql import bulk
+from services.graphql import client as graphql_client
+from services.graphql.queries import CREATE_PRODUCT_QUERY
+
+STORE_URL = "bulk-test.myshopify.com"
+ACCESS_TOKEN = "shpat_test"
+STAGED_URL = "https://staged.example.com/upload"
+RESULT_URL = "https://results.example.com/bulk.jsonl"
+
+
+class FakeShopify:
+    """
+    Answers the Admin API and the third-party hosts of a bulk import.
+    """
+
+    def __init__(self):
+        self.operations = []
+        self.staged_lines = []
+        self.polls = 0
+
+    def admin(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        query, variables = payload["query"], payload.get("variables", {})
+        operation = query.split()[1].split("(")[0]
+        self.operations.append((operation, variables))
+
+        if operation == "stagedUploadsCreate":
+            data = {
+                "stagedUploadsCreate": {
+                    "stagedTargets": [
+                        {
+                            "url": STAGED_URL,
+                            "resourceUrl": None,
+                            "parameters": [{"name": "key", "value": "tmp/bulk.jsonl"}],
+                        }
+                    ],
+                    "userErrors": [],
+                }
+            }
+        elif operation == "bulkOperationRunMutation":
+            data = {
+                "bulkOperationRunMutation": {
+                    "bulkOperation": {"id": "gid://shopify/BulkOperation/1"},
+                    "userErrors": [],
+                }
+            }
+        elif operation == "currentBulkOperation":
+            self.polls += 1
+            done = self.polls > 1
+            data = {
+                "currentBulkOperation": {
+                    "id": "gid://shopify/BulkOperation/1",
+                    "status": "COMPLETED" if done else "RUNNING",
+                    "objectCount": "2" if done else "1",
+                    "url": RESULT_URL if done else None,
+                }
+            }
+        elif operation == "productVariantsBulkCreate":
+            data = {"productVariantsBulkCreate": {"userErrors": []}}
+        else:
+            raise AssertionError(f"Unexpected operation {operation}")
+
+        return httpx.Response(200, json={"data": data})
+
+    def third_party(self, request: httpx.Request) -> httpx.Response:
+        if str(request.url) == STAGED_URL:
+            body = request.content.decode()
+            self.staged_lines = [
+                json.loads(line) for line in body.splitlines() if line.startswith("{")
+            ]
+            return httpx.Response(201)
+
+        assert str(request.url) == RESULT_URL
+        results = [
+            {
+                "data": {
+                    "productCreate": {
+                        "product": {"id": f"gid://shopify/Product/{line + 1}"},
+                        "userErrors": [],
+                    }
+                },
+                "__lineNumber": line,
+            }
+            for line in range(len(self.staged_lines))
+        ]
+        return httpx.Response(200, text="\n".join(map(json.dumps, results)) + "\n")
+
+
+@pytest.fixture
+def shopify(monkeypatch, state_db):
+    fake = FakeShopify()
+
+    monkeypatch.setattr(bulk.time, "sleep", lambda seconds: None)
+
+    store_client = graphql_client.get_store_client(STORE_URL, ACCESS_TOKEN)
+    monkeypatch.setattr(
+        store_client, "_client", httpx.Client(transport=httpx.MockTransport(fake.admin))
+    )
+    monkeypatch.setattr(
+        graphql_client,
+        "_http_client",
+        httpx.Client(transport=httpx.MockTransport(fake.third_party)),
+    )
+
+    yield fake
+
+    graphql_client.close_store_clients()
+
+
+def test_bulk_upload_runs_staged_mutation_and_reads_results(shopify, compiled_product):
+    products = [
+        compiled_product("shirt", [{"name": "Size", "values": [{"name": "M"}]}]),
+        compiled_product(
+            "mug",
+            [
+                {"name": "Color", "values": [{"name": "Red"}, {"name": "Blue"}]},
+                {"name": "Size", "values": [{"name": "S"}]},
+            ],
+        ),
+    ]
+
+    products_id = s_products.bulk_upload_products(STORE_URL, ACCESS_TOKEN, products)
+
+    assert products_id == ["gid://shopify/Product/1", "gid://shopify/Product/2"]
+    assert shopify.staged_lines == [
+        {"product": product["product"], "media": []} for product in products
+    ]
+
+    operations = [operation for operation, _ in shopify.operations]
+    assert operations == [
+        "stagedUploadsCreate",
+        "bulkOperationRunMutation",
+        "currentBulkOperation",
+        "currentBulkOperation",
+        "productVariantsBulkCreate",
+    ]
+    assert shopify.operations[1][1] == {
+        "mutation": CREATE_PRODUCT_QUERY,
+        "stagedUploadPath": "tmp/bulk.jsonl",
+    }
+    assert shopify.operations[4][1]["productId"] == "gid://shopify/Product/2"
+
+    assert store_state.get_resource_ids(STORE_URL, store_state.PRODUCT) == {
+        "shirt": "gid://shopify/Product/1",
+        "mug": "gid://shopify/Product/2",
+    }
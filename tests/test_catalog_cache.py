@@ -0,0 +1,103 @@
+import csv
+import subprocess
+import sys
+
+import pytest
+
+from services import catalog, catalog_cache
+from services.catalog import CATALOG_COLUMNS
+
+
+def write_csv(path, title: str):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=CATALOG_COLUMNS)
+        writer.writeheader()
+        row = dict.fromkeys(CATALOG_COLUMNS, "")
+        row.update(
+            {
+                "Handle": "shirt",
+                "Title": title,
+                "Option1 Name": "Size",
+                "Option1 Value": "M",
+                "Variant Price": "19.90",
+            }
+        )
+        writer.writerow(row)
+
+
+@pytest.fixture
+def compiles(monkeypatch, tmp_path):
+    """
+    Counts the catalogs compiled from their CSV, i.e. the cache misses.
+    """
+    compiled = []
+    compile_catalog = catalog.compile_catalog
+
+    def counted_compile_catalog(csv_file_path):
+        compiled.append(csv_file_path)
+        return compile_catalog(csv_file_path)
+
+    monkeypatch.setattr(catalog_cache, "CATALOG_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(catalog, "compile_catalog", counted_compile_catalog)
+    return compiled
+
+
+def test_unchanged_catalog_is_loaded_from_the_cache(compiles, tmp_path):
+    csv_file_path = tmp_path / "catalog.csv"
+    write_csv(csv_file_path, "Shirt")
+
+    first = catalog_cache.load_catalog(csv_file_path)
+    second = catalog_cache.load_catalog(csv_file_path)
+
+    assert compiles == [csv_file_path]
+    assert second == first
+    assert first.products[0]["title"] == "Shirt"
+
+
+def test_edited_catalog_is_compiled_again(compiles, tmp_path):
+    csv_file_path = tmp_path / "catalog.csv"
+    write_csv(csv_file_path, "Shirt")
+    catalog_cache.load_catalog(csv_file_path)
+
+    write_csv(csv_file_path, "Linen shirt")
+    products, _ = catalog_cache.load_catalog(csv_file_path)
+
+    assert len(compiles) == 2
+    assert products[0]["title"] == "Linen shirt"
+
+
+def test_cache_is_invalidated_by_a_new_compiler_version(
+    compiles, monkeypatch, tmp_path
+):
+    csv_file_path = tmp_path / "catalog.csv"
+    write_csv(csv_file_path, "Shirt")
+    catalog_cache.load_catalog(csv_file_path)
+
+    monkeypatch.setattr(
+        catalog_cache, "CATALOG_CACHE_VERSION", catalog_cache.CATALOG_CACHE_VERSION + 1
+    )
+    catalog_cache.load_catalog(csv_file_path)
+
+    assert len(compiles) == 2
+
+
+def test_unreadable_cache_is_compiled_again(compiles, tmp_path):
+    csv_file_path = tmp_path / "catalog.csv"
+    write_csv(csv_file_path, "Shirt")
+    catalog_cache.load_catalog(csv_file_path)
+
+    [cache_path] = (tmp_path / "cache").iterdir()
+    cache_path.write_bytes(b"not a pickle")
+    products, _ = catalog_cache.load_catalog(csv_file_path)
+
+    assert len(compiles) == 2
+    assert products[0]["title"] == "Shirt"
+
+
+def test_upload_services_do_not_import_pandas():
+    # pandas is only imported to compile a catalog missing from the cache
+    code = (
+        "import sys, services.s_products, services.product_pipeline; "
+        "sys.exit('pandas' in sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
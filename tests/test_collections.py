@@ -0,0 +1,74 @@
+import asyncio
+import json
+import types
+
+import httpx
+import pytest
+
+from services import s_collections
+from services.s_collections import build_rule_set
+
+STORE_URL = "collections-test.myshopify.com"
+ACCESS_TOKEN = "shpat_test"
+
+
+def test_shorthand_rule_with_several_columns():
+    rule_set = build_rule_set(
+        {"name": "Sale", "rules": [{"tag": "sale", "vendor": "Acme"}]}
+    )
+
+    assert rule_set == {
+        "appliedDisjunctively": False,
+        "rules": [
+            {"column": "TAG", "relation": "EQUALS", "condition": "sale"},
+            {"column": "VENDOR", "relation": "EQUALS", "condition": "Acme"},
+        ],
+    }
+
+
+def test_rule_without_condition_is_rejected():
+    with pytest.raises(ValueError, match="has no condition"):
+        build_rule_set({"name": "Mugs", "rules": [{"column": "type"}]})
+
+
+def admin(request: httpx.Request) -> httpx.Response:
+    collection = json.loads(request.content)["variables"]["input"]
+    if "ruleSet" in collection:
+        created = {
+            "collection": None,
+            "userErrors": [{"field": ["ruleSet"], "message": "Rules are invalid"}],
+        }
+    else:
+        created = {
+            "collection": {"id": f"gid://shopify/Collection/{collection['title']}"},
+            "userErrors": [],
+        }
+    return httpx.Response(200, json={"data": {"collectionCreate": created}})
+
+
+@pytest.fixture
+def store(monkeypatch, state_db):
+    monkeypatch.setattr(
+        s_collections,
+        "get_store_client",
+        lambda store_url, access_token: types.SimpleNamespace(
+            async_client=httpx.AsyncClient(transport=httpx.MockTransport(admin))
+        ),
+    )
+
+
+def test_rejected_collection_is_reported_and_skipped(store, capsys):
+    collections = [
+        {"name": "Manual"},
+        {"name": "Broken", "rules": [{"tag": "x"}]},
+        {"name": "Missing", "rules": [{"column": "tag"}]},
+    ]
+
+    collections_id = asyncio.run(
+        s_collections.async_upload_collections(STORE_URL, ACCESS_TOKEN, collections)
+    )
+
+    assert collections_id == ["gid://shopify/Collection/Manual"]
+    output = capsys.readouterr().out
+    assert "Failed to create collection 'Broken': Rules are invalid" in output
+    assert "Failed to create collection 'Missing'" in output
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import types
+
+import httpx
+import pytest
+
+from services import s_media, store_state
+
+STORE_URL = "media-test.myshopify.com"
+ACCESS_TOKEN = "shpat_test"
+READY_SOURCE = "https://cdn.example.com/ready.jpg"
+FAILED_SOURCE = "https://cdn.example.com/failed.jpg"
+
+
+class FakeFiles:
+    """
+    Creates files that Shopify reports PROCESSING once, then READY or FAILED.
+    """
+
+    def __init__(self):
+        self.status_polls = 0
+
+    def admin(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        variables = payload["variables"]
+
+        if "fileCreate" in payload["query"]:
+            files = [
+                {"id": f"gid://shopify/MediaImage/{index}", "fileStatus": "UPLOADED"}
+                for index, _ in enumerate(variables["files"])
+            ]
+            data = {"fileCreate": {"files": files, "userErrors": []}}
+            return httpx.Response(200, json={"data": data})
+
+        self.status_polls += 1
+        nodes = []
+        for file_id in variables["ids"]:
+            status = "PROCESSING"
+            if self.status_polls > 1:
+                status = "READY" if file_id.endswith("/0") else "FAILED"
+            nodes.append({"id": file_id, "fileStatus": status, "fileErrors": []})
+        return httpx.Response(200, json={"data": {"nodes": nodes}})
+
+
+@pytest.fixture
+def files(monkeypatch, state_db):
+    fake = FakeFiles()
+    monkeypatch.setattr(s_media, "FILE_POLL_MIN_INTERVAL", 0)
+    monkeypatch.setattr(
+        s_media,
+        "get_store_client",
+        lambda store_url, access_token: types.SimpleNamespace(
+            async_client=httpx.AsyncClient(transport=httpx.MockTransport(fake.admin))
+        ),
+    )
+    return fake
+
+
+def test_only_ready_files_are_attached(files):
+    file_ids = asyncio.run(
+        s_media.async_upload_media(
+            STORE_URL, ACCESS_TOKEN, [READY_SOURCE, FAILED_SOURCE], max_concurrency=1
+        )
+    )
+
+    assert files.status_polls == 2
+    assert file_ids == {READY_SOURCE: "gid://shopify/MediaImage/0"}
+    assert store_state.get_resource_ids(STORE_URL, store_state.MEDIA) == {
+        READY_SOURCE: "gid://shopify/MediaImage/0"
+    }
+
+    media = [{"originalSource": READY_SOURCE}, {"originalSource": FAILED_SOURCE}]
+    product = {
+        "set": {"files": [dict(item) for item in media], "variants": []},
+        "media": media,
+    }
+    [product] = s_media.attach_media([product], file_ids)
+
+    assert product["file_ids"] == ["gid://shopify/MediaImage/0"]
+    assert product["file_media"] == [{"originalSource": READY_SOURCE}]
+    assert product["media"] == [{"originalSource": FAILED_SOURCE}]
+    assert product["set"]["files"] == [
+        {"id": "gid://shopify/MediaImage/0"},
+        {"originalSource": FAILED_SOURCE},
+    ]
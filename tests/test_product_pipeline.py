@@ -0,0 +1,157 @@
+import asyncio
+import json
+import re
+import threading
+import types
+
+import httpx
+import pytest
+
+from services import product_pipeline
+
+STORE_URL = "pipeline-test.myshopify.com"
+ACCESS_TOKEN = "shpat_test"
+PUBLICATION_ID = "gid://shopify/Publication/1"
+
+# variables of the productCreateMedia fallbacks sent to the store
+media_requests = []
+
+
+def admin(request: httpx.Request) -> httpx.Response:
+    payload = json.loads(request.content)
+    variables = payload.get("variables", {})
+
+    if "productCreate(" in payload["query"]:
+        handle = variables["product"]["handle"]
+        if handle.startswith("taken"):
+            data = {
+                "productCreate": {
+                    "product": None,
+                    "userErrors": [
+                        {
+                            "field": ["handle"],
+                            "message": "Handle has already been taken",
+                        }
+                    ],
+                }
+            }
+        else:
+            data = {
+                "productCreate": {
+                    "product": {"id": f"gid://shopify/Product/{handle}"},
+                    "userErrors": [],
+                }
+            }
+        return httpx.Response(200, json={"data": data})
+
+    if "fileUpdate" in payload["query"]:
+        data = {
+            "fileUpdate": {
+                "files": [],
+                "userErrors": [
+                    {"field": ["files"], "message": "File not ready", "code": "x"}
+                ],
+            }
+        }
+        return httpx.Response(200, json={"data": data})
+
+    if "productCreateMedia" in payload["query"]:
+        media_requests.append(variables)
+        data = {
+            "productCreateMedia": {
+                "media": [{"status": "UPLOADED"} for _ in variables["media"]],
+                "mediaUserErrors": [],
+                "product": {"id": variables["productId"]},
+            }
+        }
+        return httpx.Response(200, json={"data": data})
+
+    # aliased publish batch, one "m<i>: productPublish(...)" per product
+    aliases = re.findall(r"\b(m\d+): productPublish", payload["query"])
+    data = {alias: {"product": {"id": alias}, "userErrors": []} for alias in aliases}
+    return httpx.Response(200, json={"data": data})
+
+
+@pytest.fixture
+def store(monkeypatch, state_db):
+    monkeypatch.setattr(
+        product_pipeline,
+        "get_store_client",
+        lambda store_url, access_token: types.SimpleNamespace(
+            async_client=httpx.AsyncClient(transport=httpx.MockTransport(admin))
+        ),
+    )
+
+
+def test_rejected_products_are_counted_and_skipped(store, compiled_product, capsys):
+    products = [
+        compiled_product(handle)
+        for handle in ["shirt", "taken-1", "mug", "taken-2", "taken-3", "cap"]
+    ]
+
+    products_id = asyncio.run(
+        product_pipeline.async_upload_and_publish_products(
+            STORE_URL,
+            ACCESS_TOKEN,
+            products,
+            [PUBLICATION_ID],
+            max_concurrency=3,
+        )
+    )
+
+    assert products_id == [
+        "gid://shopify/Product/shirt",
+        "gid://shopify/Product/mug",
+        "gid://shopify/Product/cap",
+    ]
+    output = capsys.readouterr().out
+    assert "create: 3 done, 3 failed" in output
+    assert "publish: 3 done, 0 failed" in output
+    assert "Handle has already been taken" in output
+
+
+def test_streamed_catalog_is_read_off_the_event_loop(store, compiled_product):
+    loop_threads = set()
+    read_threads = set()
+
+    def streamed_catalog():
+        for handle in ["shirt", "mug", "cap"]:
+            read_threads.add(threading.get_ident())
+            yield compiled_product(handle)
+
+    async def upload():
+        loop_threads.add(threading.get_ident())
+        return await product_pipeline.async_upload_and_publish_products(
+            STORE_URL,
+            ACCESS_TOKEN,
+            streamed_catalog(),
+            [PUBLICATION_ID],
+            max_concurrency=2,
+        )
+
+    products_id = asyncio.run(upload())
+
+    assert len(products_id) == 3
+    assert read_threads and not read_threads & loop_threads
+
+
+def test_rejected_image_references_fall_back_to_sources(
+    store, compiled_product, capsys
+):
+    media = {"originalSource": "https://cdn.example.com/shirt.jpg"}
+    product = compiled_product("shirt")
+    product["file_ids"] = ["gid://shopify/MediaImage/1"]
+    product["file_media"] = [media]
+    media_requests.clear()
+
+    products_id = asyncio.run(
+        product_pipeline.async_upload_and_publish_products(
+            STORE_URL, ACCESS_TOKEN, [product], [PUBLICATION_ID], max_concurrency=1
+        )
+    )
+
+    assert products_id == ["gid://shopify/Product/shirt"]
+    assert media_requests == [
+        {"productId": "gid://shopify/Product/shirt", "media": [media]}
+    ]
+    assert "Failed to attach images to 'Shirt'" in capsys.readouterr().out
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import threading
+import types
+
+import httpx
+import pytest
+
+from services import s_products
+
+STORE_URL = "products-test.myshopify.com"
+ACCESS_TOKEN = "shpat_test"
+
+
+def admin(request: httpx.Request) -> httpx.Response:
+    handle = json.loads(request.content)["variables"]["product"]["handle"]
+    data = {
+        "productCreate": {
+            "product": {"id": f"gid://shopify/Product/{handle}"},
+            "userErrors": [],
+        }
+    }
+    return httpx.Response(200, json={"data": data})
+
+
+@pytest.fixture
+def store(monkeypatch, state_db):
+    monkeypatch.setattr(
+        s_products,
+        "get_store_client",
+        lambda store_url, access_token: types.SimpleNamespace(
+            async_client=httpx.AsyncClient(transport=httpx.MockTransport(admin))
+        ),
+    )
+
+
+def test_streamed_catalog_is_uploaded_off_the_event_loop(store, compiled_product):
+    handles = [f"product-{index}" for index in range(50)]
+    loop_threads = set()
+    read_threads = set()
+
+    def streamed_catalog():
+        for handle in handles:
+            read_threads.add(threading.get_ident())
+            yield compiled_product(handle)
+
+    async def upload():
+        loop_threads.add(threading.get_ident())
+        return await s_products.async_upload_products(
+            STORE_URL, ACCESS_TOKEN, streamed_catalog(), max_concurrency=4
+        )
+
+    products_id = asyncio.run(upload())
+
+    assert products_id == [f"gid://shopify/Product/{handle}" for handle in handles]
+    assert read_threads and not read_threads & loop_threads
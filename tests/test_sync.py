@@ -0,0 +1,28 @@
+from services.s_sync import normalize_html, product_changes
+
+
+def compiled_fields(description: str) -> dict:
+    return {
+        "title": "Shirt",
+        "descriptionHtml": description,
+        "vendor": "Vendor",
+        "productType": "Type",
+        "tags": ["b", "a"],
+    }
+
+
+def test_reformatted_description_is_up_to_date():
+    sent = "<p class='x'  id=\"d\">Caf&eacute;\n  &amp; more<br/></p>"
+    returned = '<p id="d" class="x">Café &amp; more<br></p>'
+    current = {**compiled_fields(returned), "tags": ["a", "b"]}
+
+    assert normalize_html(sent) == normalize_html(returned)
+    assert product_changes(compiled_fields(sent), current) == {}
+
+
+def test_changed_description_is_updated():
+    current = compiled_fields("<p>Old text</p>")
+
+    assert product_changes(compiled_fields("<p>New text</p>"), current) == {
+        "descriptionHtml": "<p>New text</p>"
+    }
@@ -0,0 +1,60 @@
+import json
+
+import httpx
+import pytest
+
+from services import s_theme, store_state
+
+STORE_URL = "theme-test.myshopify.com"
+ACCESS_TOKEN = "shpat_test"
+
+
+class FakeStoreClient:
+    def __init__(self, requests: list):
+        def admin(request: httpx.Request) -> httpx.Response:
+            requests.append(json.loads(request.content)["variables"])
+            data = {
+                "themes": {
+                    "nodes": [
+                        {
+                            "id": "gid://shopify/OnlineStoreTheme/42",
+                            "name": "Dawn",
+                            "role": "MAIN",
+                        }
+                    ],
+                    "pageInfo": {"hasNextPage": False, "endCursor": None},
+                }
+            }
+            return httpx.Response(200, json={"data": data})
+
+        self.async_client = httpx.AsyncClient(transport=httpx.MockTransport(admin))
+
+    async def aclose(self):
+        await self.async_client.aclose()
+
+
+@pytest.fixture
+def requests(monkeypatch, state_db):
+    requests = []
+    store_client = FakeStoreClient(requests)
+
+    async def cli_list_themes(store_name: str, password: str):
+        raise AssertionError("The CLI must not list themes with an access token")
+
+    monkeypatch.setattr(s_theme, "async_cli_list_themes", cli_list_themes)
+    monkeypatch.setattr(
+        s_theme, "get_store_client", lambda store_url, access_token: store_client
+    )
+    return requests
+
+
+def test_theme_id_is_listed_through_the_admin_api(requests):
+    theme_id = s_theme.get_theme_id(STORE_URL, "theme-password", ACCESS_TOKEN)
+
+    assert theme_id == "42"
+    assert requests[0]["roles"] == ["MAIN"]
+    assert store_state.get_resource_id(STORE_URL, store_state.THEME, "main") == "42"
+
+    # recorded for later runs, nothing is listed again
+    assert s_theme.get_theme_id(STORE_URL, "theme-password", ACCESS_TOKEN) == "42"
+    assert len(requests) == 1
@@ -0,0 +1,40 @@
+import httpx
+import pytest
+
+from services.graphql import admin_api, throttle
+from services.graphql.throttle import ThrottledError
+
+STORE_URL = "throttle-test.myshopify.com"
+
+THROTTLED = {
+    "errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+    "extensions": {
+        "cost": {
+            "requestedQueryCost": 100,
+            "actualQueryCost": None,
+            "throttleStatus": {
+                "maximumAvailable": 1000.0,
+                "currentlyAvailable": 10,
+                "restoreRate": 50.0,
+            },
+        }
+    },
+}
+
+
+def test_exhausted_retries_raise_with_the_cost(monkeypatch):
+    attempts = []
+
+    def admin(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        return httpx.Response(200, json=THROTTLED)
+
+    monkeypatch.setattr(admin_api.time, "sleep", lambda seconds: None)
+    client = httpx.Client(transport=httpx.MockTransport(admin))
+
+    with pytest.raises(ThrottledError) as error:
+        admin_api.graphql_request(client, STORE_URL, "shpat_test", "query { shop }")
+
+    assert len(attempts) == throttle.MAX_THROTTLE_RETRIES + 1
+    assert error.value.cost["throttleStatus"]["currentlyAvailable"] == 10
+    assert "requested cost 100" in str(error.value)